@@ -58,9 +58,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'logs_collector.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'logs_collector.middleware.BasicAuthMiddleware',
+    'logs_collector.middleware.ProfilingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -103,6 +105,11 @@ DATABASES = {
     }
 }
 
+# Локальная SQLite вместо MariaDB (разработка, бенчмарки): путь к файлу базы.
+DATABASE_SQLITE_PATH = os.environ.get('DATABASE_SQLITE_PATH')
+if DATABASE_SQLITE_PATH:
+    DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': DATABASE_SQLITE_PATH}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -153,3 +160,126 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 мегабайт
 
 PLUGIN_KEY = os.environ.get('PLUGIN_KEY')
 CUSTOM_HEADER = os.environ.get('CUSTOM_HEADER')
+# Требовать ключ плагина в заголовке X-Plugin-Key (тогда запросы без него отклоняются до чтения тела).
+RECEIVER_PLUGIN_KEY_HEADER_REQUIRED = os.environ.get('RECEIVER_PLUGIN_KEY_HEADER_REQUIRED') == 'True'
+
+# Брать IP клиента из заголовка X-Real-IP, который выставляет nginx (nginx.conf), а не из REMOTE_ADDR.
+# Включайте, только если приложение доступно лишь через этот прокси: иначе клиент может подменить заголовок.
+USE_X_REAL_IP = os.environ.get('USE_X_REAL_IP') == 'True'
+
+# Ограничение частоты приёма логов с одного IP (token bucket в памяти процесса): запросов в секунду
+# и размер всплеска. 0 - без ограничения. За прокси предел действует на каждого клиента, только если
+# включён USE_X_REAL_IP; иначе все клиенты делят один предел по адресу прокси.
+RECEIVER_RATE_LIMIT = float(os.environ.get('RECEIVER_RATE_LIMIT', 0))
+RECEIVER_RATE_LIMIT_BURST = float(os.environ.get('RECEIVER_RATE_LIMIT_BURST', 50))
+RECEIVER_RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('RECEIVER_RATE_LIMIT_MAX_CLIENTS', 10000))
+
+# Неудачные логи: сколько символов тела хранить в таблице, за сколько секунд объединять повторы одного тела
+# с одной ошибкой и сколько ошибок в секунду (и размер всплеска) сохранять с одного IP (0 - без ограничения).
+# За прокси IP у всех клиентов один, пока не включён USE_X_REAL_IP, поэтому по умолчанию ограничения нет.
+FAILED_LOG_PREVIEW_SIZE = int(os.environ.get('FAILED_LOG_PREVIEW_SIZE', 1000))
+FAILED_LOG_DEDUP_WINDOW = int(os.environ.get('FAILED_LOG_DEDUP_WINDOW', 3600))
+FAILED_LOG_RATE_LIMIT = float(os.environ.get('FAILED_LOG_RATE_LIMIT', 0))
+FAILED_LOG_RATE_LIMIT_BURST = float(os.environ.get('FAILED_LOG_RATE_LIMIT_BURST', 20))
+
+# Пакетный приём логов (JSON-массив или NDJSON в одном запросе).
+RECEIVER_MAX_BATCH_SIZE = int(os.environ.get('RECEIVER_MAX_BATCH_SIZE', 1000))
+RECEIVER_BULK_CREATE_BATCH_SIZE = int(os.environ.get('RECEIVER_BULK_CREATE_BATCH_SIZE', 100))
+
+# Отложенная запись: события складываются в локальную очередь и переносятся в базу командой drain_log_spool.
+RECEIVER_SPOOL_ENABLED = os.environ.get('RECEIVER_SPOOL_ENABLED') == 'True'
+RECEIVER_SPOOL_DIR = Path(os.environ.get('RECEIVER_SPOOL_DIR', BASE_DIR / 'spool'))
+RECEIVER_SPOOL_MAX_EVENTS = int(os.environ.get('RECEIVER_SPOOL_MAX_EVENTS', 10000))
+RECEIVER_SPOOL_RETRY_AFTER = int(os.environ.get('RECEIVER_SPOOL_RETRY_AFTER', 5))
+
+# Асинхронный приём логов с потоковым разбором тела (для запуска под ASGI, например uvicorn).
+RECEIVER_ASYNC_ENABLED = os.environ.get('RECEIVER_ASYNC_ENABLED') == 'True'
+RECEIVER_STREAM_CHUNK_SIZE = int(os.environ.get('RECEIVER_STREAM_CHUNK_SIZE', 64 * 1024))
+
+# Внешнее хранилище больших полезных нагрузок (html, response, request_body) с дедупликацией по sha256.
+BLOB_STORE_ENABLED = os.environ.get('BLOB_STORE_ENABLED', 'True') == 'True'
+BLOB_STORE_DIR = Path(os.environ.get('BLOB_STORE_DIR', BASE_DIR / 'blob_store'))
+BLOB_STORE_THRESHOLD = int(os.environ.get('BLOB_STORE_THRESHOLD', 64 * 1024))
+# manage_log_partitions удаляет блобы без ссылок, не изменявшиеся дольше стольких секунд
+# (должно быть больше времени любой транзакции записи логов).
+BLOB_STORE_GC_GRACE = int(os.environ.get('BLOB_STORE_GC_GRACE', 24 * 60 * 60))
+
+# Сжатие полезных нагрузок: 'zstd', 'zlib' или пустая строка (без сжатия).
+PAYLOAD_COMPRESSION = os.environ.get('PAYLOAD_COMPRESSION', 'zstd')
+PAYLOAD_COMPRESSION_LEVEL = int(os.environ.get('PAYLOAD_COMPRESSION_LEVEL', 3))
+PAYLOAD_COMPRESSION_MIN_SIZE = int(os.environ.get('PAYLOAD_COMPRESSION_MIN_SIZE', 256))
+PAYLOAD_COMPRESSION_DICT_DIR = Path(os.environ.get('PAYLOAD_COMPRESSION_DICT_DIR', BASE_DIR / 'compression_dicts'))
+# Идентификатор словаря для html (создаётся командой train_compression_dict).
+PAYLOAD_COMPRESSION_HTML_DICT = os.environ.get('PAYLOAD_COMPRESSION_HTML_DICT', '')
+
+# Количество строк в одной выборке и одном фрагменте потоковой выгрузки CSV.
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 500))
+
+# Постраничный вывод по ключу (received_at/initiator, id) вместо OFFSET и COUNT(*) на каждой странице.
+KEYSET_PAGINATION_ENABLED = os.environ.get('KEYSET_PAGINATION_ENABLED', 'True') == 'True'
+PAGINATION_SHOW_COUNT = os.environ.get('PAGINATION_SHOW_COUNT', 'True') == 'True'
+PAGINATION_COUNT_CACHE_TIMEOUT = int(os.environ.get('PAGINATION_COUNT_CACHE_TIMEOUT', 60))
+
+# Полнотекстовый поиск по записям логов (таблица LogSearchIndex, на MariaDB - индекс FULLTEXT).
+# Миграции заполняют индекс по существующим записям, только если поиск включён; если он включается позже,
+# сначала выполните rebuild_search_index. Фильтры по html и телу запроса работают только через индекс и при
+# выключенном поиске скрыты.
+SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'True') == 'True'
+# Должно совпадать с innodb_ft_min_token_size сервера MariaDB.
+SEARCH_MIN_TOKEN_SIZE = int(os.environ.get('SEARCH_MIN_TOKEN_SIZE', 3))
+# Из html и request_body в индекс извлекается текст из первых SEARCH_MAX_PAYLOAD_SIZE байт,
+# сохраняется не больше SEARCH_MAX_TEXT_LENGTH символов.
+SEARCH_MAX_PAYLOAD_SIZE = int(os.environ.get('SEARCH_MAX_PAYLOAD_SIZE', 1024 * 1024))
+SEARCH_MAX_TEXT_LENGTH = int(os.environ.get('SEARCH_MAX_TEXT_LENGTH', 64 * 1024))
+
+# Секционирование таблиц логов по received_at ('day' или 'month') и сроки хранения в днях (0 - хранить всегда).
+# Секциями и удалением устаревших данных управляет команда manage_log_partitions.
+LOG_PARTITION_INTERVAL = os.environ.get('LOG_PARTITION_INTERVAL', 'month')
+LOG_PARTITION_AHEAD = int(os.environ.get('LOG_PARTITION_AHEAD', 2))
+LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 0))
+FAILED_LOG_RETENTION_DAYS = int(os.environ.get('FAILED_LOG_RETENTION_DAYS', LOG_RETENTION_DAYS))
+
+# Предагрегированная статистика: сколько последних минут пересчитывать при каждом запуске refresh_log_rollups.
+ROLLUP_RECOMPUTE_WINDOW = int(os.environ.get('ROLLUP_RECOMPUTE_WINDOW', 15))
+
+# Сколько секунд BasicAuthMiddleware помнит проверенные логин/пароль (0 - проверять хеш пароля на каждом запросе).
+BASIC_AUTH_CACHE_TIMEOUT = int(os.environ.get('BASIC_AUTH_CACHE_TIMEOUT', 300))
+
+# Метрики на /metrics: 'off', 'basic' (этапы обработки и счётчики, можно держать включённым под нагрузкой)
+# или 'full' (дополнительно количество и время SQL-запросов на каждый HTTP-запрос). /metrics закрыт
+# базовой аутентификацией; если задан METRICS_TOKEN, вместо неё требуется заголовок Authorization: Bearer <токен>.
+METRICS_MODE = os.environ.get('METRICS_MODE', 'basic')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Профилирование запросов (ProfilingMiddleware): доля запросов под cProfile, порог длительности в секундах,
+# начиная с которого сохраняются выборки стеков (0 - не сохранять), интервал выборки стеков в секундах,
+# каталог и количество хранимых отчётов. Отчёты доступны на /admin/profiles/.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == 'True'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SLOW_THRESHOLD = float(os.environ.get('PROFILING_SLOW_THRESHOLD', 2))
+PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL', 0.005))
+PROFILING_DIR = Path(os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', 200))
+
+# Отбрасывание повторов события (сотрудник, tabId, requestId), присланных расширением при ретраях: повтор
+# в течение RECEIVER_DEDUP_WINDOW секунд подтверждается без записи. Недавние ключи проверяются по LRU в памяти
+# процесса на RECEIVER_DEDUP_CACHE_SIZE ключей, затем по таблице LogDedupKey.
+RECEIVER_DEDUP_ENABLED = os.environ.get('RECEIVER_DEDUP_ENABLED', 'True') == 'True'
+RECEIVER_DEDUP_WINDOW = int(os.environ.get('RECEIVER_DEDUP_WINDOW', 600))
+RECEIVER_DEDUP_CACHE_SIZE = int(os.environ.get('RECEIVER_DEDUP_CACHE_SIZE', 100000))
+
+# Хранение html как двоичной разницы с базовым снимком той же страницы (url). Новый базовый снимок создаётся,
+# когда текущему больше HTML_SNAPSHOT_BASE_MAX_AGE секунд или разница больше HTML_SNAPSHOT_REBASE_RATIO
+# от размера html. Снимки лежат в HTML_SNAPSHOT_DIR; html меньше HTML_SNAPSHOT_MIN_SIZE и html при
+# PAYLOAD_COMPRESSION='' хранятся как обычно.
+HTML_SNAPSHOT_DELTA_ENABLED = os.environ.get('HTML_SNAPSHOT_DELTA_ENABLED', 'True') == 'True'
+HTML_SNAPSHOT_DIR = Path(os.environ.get('HTML_SNAPSHOT_DIR', BASE_DIR / 'html_snapshots'))
+HTML_SNAPSHOT_MIN_SIZE = int(os.environ.get('HTML_SNAPSHOT_MIN_SIZE', 4096))
+HTML_SNAPSHOT_BASE_MAX_AGE = int(os.environ.get('HTML_SNAPSHOT_BASE_MAX_AGE', 24 * 3600))
+HTML_SNAPSHOT_REBASE_RATIO = float(os.environ.get('HTML_SNAPSHOT_REBASE_RATIO', 0.1))
+
+# Колоночные архивы записей логов (Parquet/Arrow IPC, нужен пакет pyarrow): кодек сжатия колонок (zstd или lz4;
+# snappy и gzip - только для Parquet; '' - без сжатия). Если задан LOG_ARCHIVE_DIR, manage_log_partitions перед
+# удалением устаревших записей LogEntry сохраняет их в этот каталог в Parquet.
+ARCHIVE_COMPRESSION = os.environ.get('ARCHIVE_COMPRESSION', 'zstd')
+LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR', '')
@@ -15,24 +15,42 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from logs_collector.views import (
+    areceive_log,
+    download_profile,
     download_unparsed_log,
+    export_logs_archive,
     export_logs_csv,
     failed_log_list,
     log_list,
+    log_stats,
+    log_stats_api,
+    metrics,
+    profile_list,
     receive_log,
     view_log_html,
+    view_log_payload,
 )
 
 
 urlpatterns = [
     path('', log_list, name='log_list'),
+    path('admin/profiles/', profile_list, name='profile_list'),
+    path('admin/profiles/<str:name>.txt', download_profile, name='download_profile'),
+    path('admin/profiles/<str:name>.prof', download_profile, {'pstats': True}, name='download_profile_pstats'),
     path('admin/', admin.site.urls),
-    path('receiver', receive_log, name='receive_log'),
+    path('receiver', areceive_log if settings.RECEIVER_ASYNC_ENABLED else receive_log, name='receive_log'),
     path('logs/<int:pk>/html', view_log_html, name='view_log_html'),
+    path('logs/<int:pk>/request_body', view_log_payload, {'name': 'request_body'}, name='view_log_request_body'),
+    path('logs/<int:pk>/response', view_log_payload, {'name': 'response'}, name='view_log_response'),
     path('logs/export', export_logs_csv, name='export_logs_csv'),
+    path('logs/archive', export_logs_archive, name='export_logs_archive'),
+    path('stats', log_stats, name='log_stats'),
+    path('api/stats', log_stats_api, name='log_stats_api'),
     path('failed_logs', failed_log_list, name='failed_log_list'),
+    path('metrics', metrics, name='metrics'),
     path('download-unparsed-log/<int:failed_log_id>/', download_unparsed_log, name='download_unparsed_log'),
 ]
@@ -1,8 +1,11 @@
 """Admin interface for logs_collector app."""
 
 from django.contrib import admin
+from django.db.models import QuerySet
+from django.http import HttpRequest
+from django.template.defaultfilters import filesizeformat
 
-from .models import FailedLogEntry, LogEntry
+from .models import Employee, FailedLogEntry, LogEntry
 
 
 @admin.register(LogEntry)
@@ -10,11 +13,23 @@ class LogEntryAdmin(admin.ModelAdmin):
     """Admin interface for LogEntry model."""
 
     SHORT_STRING_LENGTH = 50
+    PAYLOAD_PREVIEW_LENGTH = 2000
 
-    list_display = ('time', 'short_url', 'method', 'status_code', 'received_at', 'ip_address')
+    list_display = ('time', 'short_url', 'method', 'status_code', 'received_at', 'ip_address', 'payload_sizes')
     search_fields = ('url', 'method', 'status_code', 'ip_address')
     list_filter = ('method', 'status_code')
     list_display_links = ('time', 'short_url', 'method', 'status_code', 'received_at', 'ip_address')
+    readonly_fields = ('request_body_preview', 'response_preview', 'html_preview')
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet[LogEntry]:
+        """Return entries without payloads; the change page reads them only for previews."""
+        return super().get_queryset(request).defer(*LogEntry.PAYLOAD_FIELDS)
+
+    def payload_sizes(self, obj: LogEntry) -> str:
+        """Return stored sizes of the request body, the response and the html."""
+        return ' / '.join(filesizeformat(getattr(obj, f'{name}_size')) for name in LogEntry.PAYLOAD_FIELDS)
+
+    payload_sizes.short_description = 'body / response / html'
 
     def short_url(self, obj: LogEntry) -> str:
         """Return a shortened version of the URL for display."""
@@ -26,10 +41,42 @@ class LogEntryAdmin(admin.ModelAdmin):
 
     short_url.short_description = 'url'
 
+    def _payload_preview(self, obj: LogEntry, name: str) -> str:
+        """Return the beginning of a decompressed payload."""
+        data = obj.get_payload(name, self.PAYLOAD_PREVIEW_LENGTH + 1)
+        text = data[: self.PAYLOAD_PREVIEW_LENGTH].decode('utf-8', errors='replace')
+        return f'{text}...' if len(data) > self.PAYLOAD_PREVIEW_LENGTH else text
+
+    def request_body_preview(self, obj: LogEntry) -> str:
+        """Return the beginning of the request body."""
+        return self._payload_preview(obj, 'request_body')
+
+    def response_preview(self, obj: LogEntry) -> str:
+        """Return the beginning of the response."""
+        return self._payload_preview(obj, 'response')
+
+    def html_preview(self, obj: LogEntry) -> str:
+        """Return the beginning of the html."""
+        return self._payload_preview(obj, 'html')
+
+    request_body_preview.short_description = 'request body'
+    response_preview.short_description = 'response'
+    html_preview.short_description = 'html'
+
 
 @admin.register(FailedLogEntry)
 class FailedLogEntryAdmin(admin.ModelAdmin):
     """Admin interface for FailedLogEntry model."""
 
-    list_display = ('error_message', 'received_at', 'ip_address')
+    list_display = ('error_message', 'received_at', 'ip_address', 'repeat_count', 'dropped_count', 'raw_data_size')
     search_fields = ('error_message', 'ip_address')
+    readonly_fields = ('raw_data_hash', 'raw_data_size', 'raw_data_codec', 'body_digest')
+
+
+@admin.register(Employee)
+class EmployeeAdmin(admin.ModelAdmin):
+    """Admin interface for Employee model."""
+
+    list_display = ('name', 'entries_count', 'last_seen_at')
+    search_fields = ('name',)
+    readonly_fields = ('entries_count', 'last_seen_at')
@@ -8,3 +8,11 @@ class LogsCollectorConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'logs_collector'
+
+    def ready(self) -> None:
+        """Connect the signal receivers."""
+        from django.contrib.auth.signals import user_logged_out
+
+        from logs_collector.middleware import forget_cached_credentials
+
+        user_logged_out.connect(forget_cached_credentials, dispatch_uid='logs_collector.forget_cached_credentials')
@@ -0,0 +1,270 @@
+"""
+Выгрузка записей логов в колоночные архивы Parquet или Arrow IPC и загрузка архивов обратно в базу.
+
+Записи читаются из базы пакетами и пишутся в файл по пакету (группе строк), поэтому в памяти находится
+только один пакет. Полезные нагрузки распаковываются в двоичные колонки html, response и request_body,
+и архив не зависит от внешнего хранилища и базовых снимков html; без полезных нагрузок в архиве остаются
+их размер и sha256 во внешнем хранилище. Для архивов нужен пакет pyarrow.
+"""
+
+from __future__ import annotations
+
+import io
+import itertools
+import os
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from logs_collector.models import LogEntry
+from logs_collector.rollups import mark_stale_hours
+from logs_collector.search import index_log_entries
+from logs_collector.services import fill_typed_fields, register_employees, set_entry_payloads
+
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - архивы необязательны
+    pyarrow = None
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+
+    from django.db.models import Field, QuerySet
+
+
+FORMAT_PARQUET = 'parquet'
+FORMAT_ARROW = 'arrow'
+FORMATS = (FORMAT_PARQUET, FORMAT_ARROW)
+CONTENT_TYPES = {
+    FORMAT_PARQUET: 'application/vnd.apache.parquet',
+    FORMAT_ARROW: 'application/vnd.apache.arrow.file',
+}
+FILE_EXTENSIONS = {FORMAT_PARQUET: '.parquet', FORMAT_ARROW: '.arrow'}
+# Сигнатуры в начале файлов форматов.
+MAGIC = {FORMAT_PARQUET: b'PAR1', FORMAT_ARROW: b'ARROW1'}
+# Колонки хранения, которые не выгружаются и при загрузке вычисляются заново.
+EXCLUDED_COLUMNS = ('url_hash', *LogEntry.PAYLOAD_FIELDS, *(f'{name}_codec' for name in LogEntry.PAYLOAD_FIELDS))
+ARROW_TYPES = {
+    'AutoField': 'int64',
+    'BigAutoField': 'int64',
+    'PositiveSmallIntegerField': 'uint16',
+    'PositiveIntegerField': 'uint32',
+    'FloatField': 'float64',
+    'CharField': 'string',
+    'TextField': 'string',
+    'GenericIPAddressField': 'string',
+}
+
+
+def _require_pyarrow() -> None:
+    if pyarrow is None:
+        raise ImproperlyConfigured('Для архивов Parquet/Arrow установите пакет pyarrow')
+
+
+def get_archive_fields() -> list[Field]:
+    """Возвращает поля LogEntry, которые выгружаются в архив отдельными колонками."""
+    return [field for field in LogEntry._meta.concrete_fields if field.attname not in EXCLUDED_COLUMNS]
+
+
+def get_entry_columns(payloads: bool) -> list[str]:
+    """Возвращает поля LogEntry, которые нужно загрузить из базы для записи архива."""
+    columns = [field.attname for field in get_archive_fields()]
+    if payloads:
+        columns += [f'{name}{suffix}' for name in LogEntry.PAYLOAD_FIELDS for suffix in ('', '_hash', '_codec')]
+    return columns
+
+
+def _get_arrow_type(field: Field) -> pyarrow.DataType:
+    if field.get_internal_type() == 'DateTimeField':
+        return pyarrow.timestamp('us', tz='UTC')
+    return pyarrow.type_for_alias(ARROW_TYPES[field.get_internal_type()])
+
+
+def get_archive_schema(payloads: bool) -> pyarrow.Schema:
+    """Возвращает схему архива: поля записи и, если payloads, двоичные колонки полезных нагрузок."""
+    _require_pyarrow()
+    fields = [pyarrow.field(field.attname, _get_arrow_type(field)) for field in get_archive_fields()]
+    if payloads:
+        fields += [pyarrow.field(name, pyarrow.large_binary()) for name in LogEntry.PAYLOAD_FIELDS]
+    return pyarrow.schema(fields)
+
+
+def build_record_batch(entries: list[LogEntry], schema: pyarrow.Schema) -> pyarrow.RecordBatch:
+    """Переводит пакет записей в колонки архива; полезные нагрузки распаковываются."""
+    payloads = set(LogEntry.PAYLOAD_FIELDS)
+    arrays = []
+    for field in schema:
+        if field.name in payloads:
+            values = [entry.get_payload(field.name) for entry in entries]
+        else:
+            values = [getattr(entry, field.name) for entry in entries]
+        arrays.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that keeps written bytes until they are drained, for streaming archive writers."""
+
+    def __init__(self) -> None:
+        """Initialize the empty sink."""
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        """Report that the sink is writable."""
+        return True
+
+    def write(self, data: bytes) -> int:
+        """Keep the data until the next drain()."""
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        """Return the number of bytes written so far."""
+        return self._position
+
+    def drain(self) -> bytes:
+        """Return and forget the bytes written since the previous call."""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _open_writer(sink: ChunkSink, archive_format: str, schema: pyarrow.Schema) -> pyarrow.ipc.RecordBatchFileWriter:
+    compression = settings.ARCHIVE_COMPRESSION or None
+    if archive_format == FORMAT_PARQUET:
+        return pyarrow.parquet.ParquetWriter(sink, schema, compression=compression or 'none')
+    if archive_format == FORMAT_ARROW:
+        return pyarrow.ipc.new_file(sink, schema, options=pyarrow.ipc.IpcWriteOptions(compression=compression))
+    raise ValueError(f'Unknown archive format: {archive_format}')
+
+
+def iter_archive(entries: Iterable[LogEntry], archive_format: str, payloads: bool, batch_size: int) -> Iterator[bytes]:
+    """Возвращает файл архива записей по частям: после каждого пакета из batch_size записей - готовые байты."""
+    schema = get_archive_schema(payloads)
+    sink = ChunkSink()
+    writer = _open_writer(sink, archive_format, schema)
+    entries = iter(entries)
+    while chunk := list(itertools.islice(entries, batch_size)):
+        writer.write_batch(build_record_batch(chunk, schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_entries(queryset: QuerySet[LogEntry], batch_size: int) -> Iterator[LogEntry]:
+    """Перебирает записи queryset по возрастанию id отдельными запросами по batch_size записей."""
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+        yield from chunk
+        if len(chunk) < batch_size:
+            return
+        last_id = chunk[-1].id
+
+
+def write_archive(
+    queryset: QuerySet[LogEntry], path: Path, archive_format: str, payloads: bool, batch_size: int
+) -> tuple[int, int]:
+    """
+    Записывает записи queryset в файл архива по возрастанию id, возвращает (количество записей, наибольший id).
+
+    Архив пишется во временный файл рядом и переносится на место после проверки количества строк в нём.
+    """
+    rows = 0
+    last_id = 0
+
+    def track(entries: Iterator[LogEntry]) -> Iterator[LogEntry]:
+        nonlocal rows, last_id
+        for entry in entries:
+            rows += 1
+            last_id = entry.id
+            yield entry
+
+    entries = track(iter_entries(queryset.only(*get_entry_columns(payloads)), batch_size))
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with tmp_path.open('wb') as f:
+            for data in iter_archive(entries, archive_format, payloads, batch_size):
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if (written := count_archive_rows(tmp_path)) != rows:
+            raise ValueError(f'Archive {path} has {written} rows instead of {rows}')
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return rows, last_id
+
+
+def detect_archive_format(path: Path) -> str:
+    """Определяет формат архива по сигнатуре в начале файла."""
+    with path.open('rb') as f:
+        head = f.read(max(len(magic) for magic in MAGIC.values()))
+    for archive_format, magic in MAGIC.items():
+        if head.startswith(magic):
+            return archive_format
+    raise ValueError(f'{path} is not a Parquet or Arrow IPC file')
+
+
+def count_archive_rows(path: Path) -> int:
+    """Возвращает количество строк в архиве по его метаданным."""
+    _require_pyarrow()
+    if detect_archive_format(path) == FORMAT_PARQUET:
+        return pyarrow.parquet.ParquetFile(path).metadata.num_rows
+    with pyarrow.ipc.open_file(pyarrow.memory_map(str(path))) as reader:
+        return reader.count_rows()
+
+
+def iter_archive_batches(path: Path, batch_size: int) -> Iterator[pyarrow.RecordBatch]:
+    """Читает архив пакетами строк."""
+    _require_pyarrow()
+    if detect_archive_format(path) == FORMAT_PARQUET:
+        yield from pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size)
+        return
+    with pyarrow.ipc.open_file(pyarrow.memory_map(str(path))) as reader:
+        for index in range(reader.num_record_batches):
+            yield reader.get_batch(index)
+
+
+def load_archive(path: Path, batch_size: int) -> tuple[int, int]:
+    """
+    Загружает записи из архива с полезными нагрузками, возвращает (загружено, пропущено - уже есть в базе).
+
+    Записи сохраняют свои id. Полезные нагрузки сохраняются по текущим настройкам хранилища и сжатия,
+    поисковый индекс и справочник сотрудников пополняются, часы записей помечаются для пересчёта агрегатов.
+    """
+    columns = [field.attname for field in get_archive_fields()]
+    loaded = 0
+    skipped = 0
+    for batch in iter_archive_batches(path, batch_size):
+        if missing := set(LogEntry.PAYLOAD_FIELDS) - set(batch.schema.names):
+            raise ValueError(f'Archive {path} has no payload columns: {", ".join(sorted(missing))}')
+        rows = batch.to_pylist()
+        existing = set(LogEntry.objects.filter(id__in=[row['id'] for row in rows]).values_list('id', flat=True))
+        entries = []
+        for row in rows:
+            if row['id'] in existing:
+                continue
+            entry = LogEntry(**{column: row[column] for column in columns if column in row})
+            fill_typed_fields(entry)
+            set_entry_payloads(entry, {name: row[name] or b'' for name in LogEntry.PAYLOAD_FIELDS})
+            entries.append(entry)
+
+        with transaction.atomic():
+            LogEntry.objects.bulk_create(entries)
+            index_log_entries(entries)
+            register_employees(entries)
+            mark_stale_hours(entry.received_at for entry in entries)
+        loaded += len(entries)
+        skipped += len(existing)
+    return loaded, skipped
@@ -0,0 +1,101 @@
+"""
+Контентно-адресуемое файловое хранилище больших полезных нагрузок логов.
+
+Блобы, на которые больше не ссылается ни одна запись, удаляет manage_log_partitions: сначала собираются
+хеши из записей, затем удаляются остальные блобы, не изменявшиеся дольше BLOB_STORE_GC_GRACE секунд.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from django.conf import settings
+
+
+if TYPE_CHECKING:
+    from collections.abc import Container, Iterator
+
+
+TMP_DIR_NAME = 'tmp'
+
+
+def get_blob_path(digest: str) -> Path:
+    """Возвращает путь к блобу по его sha256 (две ступени каталогов по префиксу хеша)."""
+    return Path(settings.BLOB_STORE_DIR).joinpath(digest[:2], digest[2:4], digest)
+
+
+def put_blob(data: bytes) -> str:
+    """
+    Сохраняет данные в хранилище и возвращает их sha256.
+
+    Одинаковые данные хранятся один раз: если блоб с таким хешем уже есть, запись пропускается.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = get_blob_path(digest)
+    try:
+        # Время изменения обновляется, чтобы сборка мусора не удалила блоб до фиксации ссылающейся записи.
+        os.utime(path)
+        return digest
+    except FileNotFoundError:
+        pass
+
+    tmp_dir = Path(settings.BLOB_STORE_DIR).joinpath(TMP_DIR_NAME)
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Пишем во временный файл и атомарно переносим, чтобы читатели не увидели недописанный блоб.
+    tmp_path = tmp_dir.joinpath(f'{digest}.{uuid.uuid4().hex}')
+    with tmp_path.open('wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return digest
+
+
+def open_blob(digest: str) -> BinaryIO:
+    """Открывает блоб на чтение."""
+    return get_blob_path(digest).open('rb')
+
+
+def read_blob(digest: str, limit: int | None = None) -> bytes:
+    """Читает блоб целиком или первые limit байт."""
+    with open_blob(digest) as f:
+        return f.read() if limit is None else f.read(limit)
+
+
+def iter_blob_paths() -> Iterator[Path]:
+    """Перебирает файлы блобов хранилища (без временных файлов)."""
+    yield from Path(settings.BLOB_STORE_DIR).glob('??/??/*')
+
+
+def delete_unreferenced_blobs(referenced: Container[bytes], grace: float) -> int:
+    """
+    Удаляет блобы, sha256 которых (в двоичном виде) нет в referenced, возвращает количество.
+
+    Блобы и временные файлы моложе grace секунд не удаляются: на них могут ссылаться ещё не
+    зафиксированные записи.
+    """
+    cutoff = time.time() - grace
+    deleted = 0
+    for path in iter_blob_paths():
+        try:
+            if bytes.fromhex(path.name) in referenced or path.stat().st_mtime >= cutoff:
+                continue
+        except (ValueError, FileNotFoundError):
+            continue
+        path.unlink(missing_ok=True)
+        deleted += 1
+
+    for path in Path(settings.BLOB_STORE_DIR).joinpath(TMP_DIR_NAME).glob('*'):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+        except FileNotFoundError:
+            continue
+    return deleted
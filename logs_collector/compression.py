@@ -0,0 +1,311 @@
+"""Сжатие полезных нагрузок логов (zlib или zstd, с необязательным словарём или базовым снимком html)."""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import io
+import os
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstd необязателен, zlib есть всегда
+    zstandard = None
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+CODECS = ('zlib', 'zstd')
+DICT_SEPARATOR = '+d:'
+SNAPSHOT_SEPARATOR = '+s:'
+ZLIB_MAX_DICT_SIZE = 32 * 1024
+# Наибольшее окно zstd, которое распаковщик принимает без дополнительных настроек.
+ZSTD_MAX_WINDOW_LOG = 27
+# Сколько байт распакованных базовых снимков html процесс держит в памяти.
+SNAPSHOT_BASE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def bytes_lru_cache(max_bytes: int) -> Callable[[Callable[..., bytes]], Callable[..., bytes]]:
+    """
+    Как functools.lru_cache, но для функций, возвращающих bytes, с ограничением суммарного размера значений.
+
+    Значения больше max_bytes не кешируются. У обёрнутой функции есть cache_clear().
+    """
+
+    def decorator(function: Callable[..., bytes]) -> Callable[..., bytes]:
+        cache: OrderedDict[tuple, bytes] = OrderedDict()
+        size = 0
+        lock = threading.Lock()
+
+        @functools.wraps(function)
+        def wrapper(*args: object) -> bytes:
+            nonlocal size
+            with lock:
+                if args in cache:
+                    cache.move_to_end(args)
+                    return cache[args]
+            value = function(*args)
+            if len(value) > max_bytes:
+                return value
+            with lock:
+                if args not in cache:
+                    cache[args] = value
+                    size += len(value)
+                    while size > max_bytes:
+                        size -= len(cache.popitem(last=False)[1])
+            return value
+
+        def cache_clear() -> None:
+            nonlocal size
+            with lock:
+                cache.clear()
+                size = 0
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise ImproperlyConfigured('Для сжатия zstd установите пакет zstandard')
+
+
+def get_dict_path(dict_id: str) -> Path:
+    """Возвращает путь к файлу словаря сжатия."""
+    return Path(settings.PAYLOAD_COMPRESSION_DICT_DIR).joinpath(f'{dict_id}.dict')
+
+
+def save_dict(data: bytes) -> str:
+    """Сохраняет словарь сжатия и возвращает его идентификатор (префикс sha256)."""
+    dict_id = hashlib.sha256(data).hexdigest()[:16]
+    path = get_dict_path(dict_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return dict_id
+
+
+@lru_cache(maxsize=16)
+def load_dict(dict_id: str) -> bytes:
+    """Читает словарь сжатия по идентификатору."""
+    return get_dict_path(dict_id).read_bytes()
+
+
+def get_snapshot_base_path(name: str, base_id: str) -> Path:
+    """Возвращает путь к файлу базового снимка html, сжатого кодеком name."""
+    return Path(settings.HTML_SNAPSHOT_DIR).joinpath(base_id[:2], f'{base_id}.{name}')
+
+
+def save_snapshot_base(name: str, data: bytes) -> str:
+    """
+    Сохраняет базовый снимок html, сжатый кодеком name, и возвращает его идентификатор (префикс sha256).
+
+    Одинаковые снимки хранятся одним файлом.
+    """
+    base_id = hashlib.sha256(data).hexdigest()[:16]
+    path = get_snapshot_base_path(name, base_id)
+    if path.exists():
+        return base_id
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Пишем во временный файл и атомарно переносим, чтобы читатели не увидели недописанный снимок.
+    tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    with tmp_path.open('wb') as f:
+        f.write(compress(name, data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return base_id
+
+
+@bytes_lru_cache(SNAPSHOT_BASE_CACHE_BYTES)
+def load_snapshot_base(name: str, base_id: str) -> bytes:
+    """Читает и распаковывает базовый снимок html."""
+    return decompress(name, get_snapshot_base_path(name, base_id).read_bytes())
+
+
+def delete_snapshot_base(name: str, base_id: str) -> None:
+    """Удаляет файл базового снимка html."""
+    get_snapshot_base_path(name, base_id).unlink(missing_ok=True)
+
+
+def split_codec(codec: str) -> tuple[str, str]:
+    """
+    Разбирает строку кодека вида 'zstd', 'zstd+d:<id словаря>' или 'zstd+s:<id базового снимка>'.
+
+    Возвращает имя кодека и ссылку на словарь или снимок вместе с разделителем (пустая строка - без ссылки).
+    """
+    for separator in (DICT_SEPARATOR, SNAPSHOT_SEPARATOR):
+        name, found, reference_id = codec.partition(separator)
+        if found:
+            return name, f'{separator}{reference_id}'
+    return codec, ''
+
+
+def is_snapshot_codec(codec: str) -> bool:
+    """Проверяет, что данные сохранены разницей с базовым снимком html."""
+    return SNAPSHOT_SEPARATOR in codec
+
+
+def _load_reference(name: str, reference: str) -> bytes:
+    """Возвращает содержимое словаря или базового снимка, на который ссылается кодек."""
+    if reference.startswith(SNAPSHOT_SEPARATOR):
+        return load_snapshot_base(name, reference.removeprefix(SNAPSHOT_SEPARATOR))
+    return load_dict(reference.removeprefix(DICT_SEPARATOR))
+
+
+def get_codec(name: str) -> str:
+    """Возвращает кодек для новых данных поля name по настройкам (пустая строка - без сжатия)."""
+    codec = settings.PAYLOAD_COMPRESSION
+    if not codec:
+        return ''
+    if codec not in CODECS:
+        raise ImproperlyConfigured(f'Неизвестный кодек PAYLOAD_COMPRESSION: {codec}')
+    if name == 'html' and settings.PAYLOAD_COMPRESSION_HTML_DICT:
+        return f'{codec}{DICT_SEPARATOR}{settings.PAYLOAD_COMPRESSION_HTML_DICT}'
+    return codec
+
+
+def compress(codec: str, data: bytes, level: int | None = None) -> bytes:
+    """Сжимает данные указанным кодеком."""
+    name, reference = split_codec(codec)
+    level = settings.PAYLOAD_COMPRESSION_LEVEL if level is None else level
+    if name == 'zlib':
+        if reference:
+            compressor = zlib.compressobj(level, zdict=_load_reference(name, reference)[-ZLIB_MAX_DICT_SIZE:])
+        else:
+            compressor = zlib.compressobj(level)
+        return compressor.compress(data) + compressor.flush()
+    if name == 'zstd':
+        _require_zstandard()
+        if not reference:
+            return zstandard.ZstdCompressor(level=level).compress(data)
+        reference_data = _load_reference(name, reference)
+        dict_data = zstandard.ZstdCompressionDict(reference_data)
+        if reference.startswith(SNAPSHOT_SEPARATOR):
+            params = _get_snapshot_params(level, len(reference_data), len(data))
+            return zstandard.ZstdCompressor(compression_params=params, dict_data=dict_data).compress(data)
+        return zstandard.ZstdCompressor(level=level, dict_data=dict_data).compress(data)
+    raise ValueError(f'Unknown codec: {codec}')
+
+
+def _get_snapshot_params(level: int, base_size: int, data_size: int) -> zstandard.ZstdCompressionParameters:
+    """
+    Параметры zstd для сжатия относительно базового снимка (как zstd --patch-from).
+
+    Окно и хеш-таблица должны охватывать весь снимок, иначе на его начало в больших страницах не будет ссылок.
+    """
+    params = zstandard.ZstdCompressionParameters.from_level(level, source_size=data_size, dict_size=base_size)
+    window_log = min((base_size + data_size).bit_length(), ZSTD_MAX_WINDOW_LOG)
+    if window_log <= params.window_log:
+        return params
+    # Таблицы в 16 раз меньше окна находят совпадения со снимком при умеренном расходе памяти.
+    return zstandard.ZstdCompressionParameters.from_level(
+        level,
+        source_size=data_size,
+        dict_size=base_size,
+        window_log=window_log,
+        hash_log=max(params.hash_log, window_log - 4),
+        chain_log=max(params.chain_log, window_log - 4),
+    )
+
+
+def compress_payload(name: str, data: bytes) -> tuple[str, bytes]:
+    """Сжимает полезную нагрузку поля name, возвращает (кодек, данные для хранения)."""
+    codec = get_codec(name)
+    if not codec or len(data) < settings.PAYLOAD_COMPRESSION_MIN_SIZE:
+        return '', data
+    compressed = compress(codec, data)
+    # Несжимаемые данные храним как есть.
+    if len(compressed) >= len(data):
+        return '', data
+    return codec, compressed
+
+
+def _zlib_decompressor(reference: str) -> zlib._Decompress:
+    if reference:
+        return zlib.decompressobj(zdict=_load_reference('zlib', reference)[-ZLIB_MAX_DICT_SIZE:])
+    return zlib.decompressobj()
+
+
+def _zstd_decompressor(reference: str) -> zstandard.ZstdDecompressor:
+    _require_zstandard()
+    dict_data = zstandard.ZstdCompressionDict(_load_reference('zstd', reference)) if reference else None
+    return zstandard.ZstdDecompressor(dict_data=dict_data)
+
+
+def decompress(codec: str, data: bytes, limit: int | None = None) -> bytes:
+    """Распаковывает данные; при limit распаковываются только первые limit байт."""
+    if not codec:
+        return data if limit is None else data[:limit]
+
+    name, reference = split_codec(codec)
+    if name == 'zlib':
+        return _zlib_decompressor(reference).decompress(data, limit or 0)
+    if name == 'zstd':
+        if limit is None:
+            return _zstd_decompressor(reference).decompressobj().decompress(data)
+        with _zstd_decompressor(reference).stream_reader(io.BytesIO(data)) as reader:
+            return reader.read(limit)
+    raise ValueError(f'Unknown codec: {codec}')
+
+
+class ZlibStreamReader(io.RawIOBase):
+    """Read-only file-like object that decompresses a zlib stream on the fly."""
+
+    def __init__(self, source: BinaryIO, reference: str = '', chunk_size: int = 64 * 1024) -> None:
+        """Wrap the compressed source file."""
+        self.source = source
+        self.chunk_size = chunk_size
+        self._decompressor = _zlib_decompressor(reference)
+
+    def readable(self) -> bool:
+        """Report that the stream is readable."""
+        return True
+
+    def readinto(self, buffer: memoryview) -> int:
+        """Decompress the next portion of data into buffer."""
+        data = b''
+        while not data:
+            if self._decompressor.unconsumed_tail:
+                data = self._decompressor.decompress(self._decompressor.unconsumed_tail, len(buffer))
+                continue
+            chunk = self.source.read(self.chunk_size)
+            if not chunk:
+                data = self._decompressor.flush()
+                break
+            data = self._decompressor.decompress(chunk, len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        """Close the underlying file."""
+        self.source.close()
+        super().close()
+
+
+def open_decompressed(codec: str, source: BinaryIO) -> BinaryIO:
+    """Оборачивает файл со сжатыми данными в поток распакованных данных."""
+    if not codec:
+        return source
+
+    name, reference = split_codec(codec)
+    if name == 'zlib':
+        return io.BufferedReader(ZlibStreamReader(source, reference))
+    if name == 'zstd':
+        return _zstd_decompressor(reference).stream_reader(source, closefd=True)
+    raise ValueError(f'Unknown codec: {codec}')
@@ -0,0 +1,180 @@
+"""
+Отбрасывание повторно присланных событий по ключу (сотрудник, tabId, requestId).
+
+Расширение повторяет запрос при таймауте, поэтому одно событие может прийти несколько раз. Ключ события
+сначала проверяется по LRU недавних ключей в памяти процесса, затем по таблице LogDedupKey. При сохранении
+ключ вставляется в LogDedupKey в той же транзакции, что и запись лога: параллельный повтор одиночного
+события ждёт первую транзакцию и получает конфликт уникального ключа.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from logs_collector.metrics import DEDUP_CHECKS
+from logs_collector.models import LogDedupKey
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+class RecentKeys:
+    """Bounded LRU of recently stored dedup keys with the time they were stored."""
+
+    def __init__(self, max_size: int) -> None:
+        """Initialize the LRU."""
+        self.max_size = max_size
+        self._keys: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def contains(self, key: str, window: float) -> bool:
+        """Check that the key was stored less than window seconds ago."""
+        with self._lock:
+            stored_at = self._keys.get(key)
+            if stored_at is None:
+                return False
+            if time.monotonic() - stored_at > window:
+                del self._keys[key]
+                return False
+            self._keys.move_to_end(key)
+            return True
+
+    def add(self, keys: Iterable[str]) -> None:
+        """Remember the keys as stored now, forgetting the least recently used ones."""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._keys[key] = now
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+
+
+@lru_cache(maxsize=1)
+def get_recent_keys() -> RecentKeys:
+    """Возвращает LRU недавних ключей процесса."""
+    return RecentKeys(settings.RECEIVER_DEDUP_CACHE_SIZE)
+
+
+def get_dedup_key(employee: object, tab_id: object, request_id: object) -> str:
+    """
+    Возвращает ключ события или пустую строку, если отбрасывание повторов выключено.
+
+    События без tabId или requestId не отбрасываются: их нельзя отличить от разных событий.
+    """
+    if not settings.RECEIVER_DEDUP_ENABLED or tab_id in ('', None) or request_id in ('', None):
+        return ''
+    return hashlib.sha256(f'{employee}\0{tab_id}\0{request_id}'.encode()).hexdigest()
+
+
+def _get_cutoff() -> datetime:
+    return timezone.now() - timedelta(seconds=settings.RECEIVER_DEDUP_WINDOW)
+
+
+def find_duplicates(keys: Iterable[str]) -> set[str]:
+    """Возвращает ключи уже сохранённых событий: сначала по LRU в памяти, остальные одним запросом к базе."""
+    recent = get_recent_keys()
+    duplicates = set()
+    unknown = set()
+    for key in keys:
+        if not key:
+            continue
+        if recent.contains(key, settings.RECEIVER_DEDUP_WINDOW):
+            duplicates.add(key)
+            DEDUP_CHECKS.inc(result='memory_hit')
+        else:
+            unknown.add(key)
+
+    if unknown:
+        found = set(
+            LogDedupKey.objects.filter(key__in=unknown, created_at__gte=_get_cutoff()).values_list('key', flat=True)
+        )
+        duplicates |= found
+        DEDUP_CHECKS.inc(len(found), result='db_hit')
+        DEDUP_CHECKS.inc(len(unknown) - len(found), result='miss')
+    return duplicates
+
+
+def claim_dedup_key(key: str) -> bool:
+    """
+    Вставляет ключ события в рамках текущей транзакции; возвращает False, если событие уже сохранено.
+
+    Устаревший ключ (старше RECEIVER_DEDUP_WINDOW) занимается заново.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            LogDedupKey.objects.create(key=key, created_at=now)
+    except IntegrityError:
+        if not LogDedupKey.objects.filter(key=key, created_at__lt=_get_cutoff()).update(created_at=now):
+            DEDUP_CHECKS.inc(result='race_hit')
+            return False
+    return True
+
+
+def claim_dedup_keys(keys: list[str]) -> set[int]:
+    """
+    Вставляет ключи пакета событий в рамках текущей транзакции; возвращает позиции повторов.
+
+    Повтором считается ключ, уже занятый в пределах RECEIVER_DEDUP_WINDOW, и повтор ключа внутри пакета.
+    Существующие ключи блокируются до конца транзакции; одновременная вставка одного нового ключа двумя
+    пакетами не обнаруживается (такие повторы редки и отсекаются LRU в одном процессе).
+    """
+    unique_keys = {key for key in keys if key}
+    if not unique_keys:
+        return set()
+
+    claimed = set(
+        LogDedupKey.objects.select_for_update()
+        .filter(key__in=unique_keys, created_at__gte=_get_cutoff())
+        .values_list('key', flat=True)
+    )
+    now = timezone.now()
+    duplicates = set()
+    new_keys = []
+    for position, key in enumerate(keys):
+        if not key:
+            continue
+        if key in claimed:
+            duplicates.add(position)
+            DEDUP_CHECKS.inc(result='race_hit')
+            continue
+        claimed.add(key)
+        new_keys.append(LogDedupKey(key=key, created_at=now))
+
+    connection = connections[LogDedupKey.objects.db]
+    LogDedupKey.objects.bulk_create(
+        new_keys,
+        update_conflicts=True,
+        update_fields=['created_at'],
+        # MySQL обновляет по любому уникальному ключу и не принимает список полей.
+        unique_fields=['key'] if connection.features.supports_update_conflicts_with_target else None,
+    )
+    return duplicates
+
+
+def remember_dedup_keys(keys: Iterable[str]) -> None:
+    """Запоминает ключи сохранённых событий в LRU процесса (вызывается после фиксации транзакции)."""
+    keys = [key for key in keys if key]
+    if keys:
+        get_recent_keys().add(keys)
+
+
+def delete_expired_dedup_keys(batch_size: int) -> int:
+    """Удаляет ключи старше RECEIVER_DEDUP_WINDOW пакетами, возвращает количество."""
+    deleted = 0
+    queryset = LogDedupKey.objects.filter(created_at__lt=_get_cutoff()).order_by('created_at')
+    while keys := list(queryset.values_list('key', flat=True)[:batch_size]):
+        deleted += LogDedupKey.objects.filter(key__in=keys).delete()[0]
+    return deleted
@@ -1,13 +1,43 @@
 """Формы приложения logs_collector."""
 
+from collections.abc import Iterator, Sequence
+from datetime import timedelta
 from typing import Any
 
 from django import forms
+from django.conf import settings
 from django.core.paginator import Page, Paginator
-from django.db.models import CharField, EmailField, Q, QuerySet, SlugField, TextChoices, TextField
+from django.db.models import Q, QuerySet, TextChoices
 from django.http.request import HttpRequest
+from django.utils import timezone
 
-from logs_collector.models import FailedLogEntry, LogEntry
+from logs_collector.models import Employee, FailedLogEntry, LogEntry, LogRollup
+from logs_collector.pagination import KeysetPage, KeysetPaginator, get_estimated_count, get_keyset_q
+from logs_collector.rollups import GROUP_FIELDS, get_stats
+from logs_collector.search import SEARCH_TEXT_FIELDS, filter_search
+from logs_collector.services import get_url_hash, parse_status_code
+
+
+PER_PAGE = 25
+# Фильтры по полезным нагрузкам и поля поискового индекса, через которые они работают; при выключенном
+# SEARCH_INDEX_ENABLED этих фильтров в форме нет.
+PAYLOAD_FILTER_FIELDS = {'request_body': 'request_body_text', 'html': 'html_text'}
+
+
+def get_keyset_page(form: forms.Form, queryset: QuerySet, sort_field: str, descending: bool) -> KeysetPage:
+    """Возвращает страницу по курсору формы и заполняет оценку количества записей и страниц."""
+    paginator = KeysetPaginator(queryset, sort_field, descending, PER_PAGE)
+    form.per_page = PER_PAGE
+    if settings.PAGINATION_SHOW_COUNT:
+        form.items_count = get_estimated_count(queryset)
+        form.items_count_is_estimate = True
+        form.total_pages = max(-(-form.items_count // PER_PAGE), 1)
+    return paginator.get_page(form.cursor)
+
+
+def get_employee_choices() -> list[tuple[str, str]]:
+    """Возвращает варианты фильтра по сотруднику из справочника вместе с количеством записей."""
+    return [(name, f'{name} ({count})') for name, count in Employee.objects.values_list('name', 'entries_count')]
 
 
 class FailedLogEntryForm(forms.Form):
@@ -25,7 +55,9 @@ class FailedLogEntryForm(forms.Form):
         """Initialize the form with request data and set sort field and order."""
         super().__init__(*args, **kwargs)
         self.page_number = request.GET.get('page')
+        self.cursor = request.GET.get('cursor')
         self.items_count = None
+        self.items_count_is_estimate = False
         self.total_pages = None
         self.per_page = None
 
@@ -48,14 +80,17 @@ class FailedLogEntryForm(forms.Form):
 
     def get_items(self) -> QuerySet[LogEntry]:
         """Get filtered and sorted log entries based on form data."""
-        queryset = self.get_initial_queryset().order_by('-received_at')
+        queryset = self.get_initial_queryset().order_by('-received_at', '-id')
         if not self.is_valid():
             return queryset
         return self.filter_queryset(queryset)
 
-    def get_page(self) -> Page:
+    def get_page(self) -> Page | KeysetPage:
         """Get a page of log entries based on the form data."""
-        paginator = Paginator(self.get_items(), 25)
+        if settings.KEYSET_PAGINATION_ENABLED:
+            return get_keyset_page(self, self.get_items(), 'received_at', descending=True)
+
+        paginator = Paginator(self.get_items(), PER_PAGE)
         self.items_count = paginator.count
         self.total_pages = paginator.num_pages
         self.per_page = paginator.per_page
@@ -82,6 +117,9 @@ class LogFilterForm(forms.Form):
         required=False, label='To date', widget=forms.DateTimeInput(attrs={'type': 'datetime-local'})
     )
     url = forms.CharField(required=False, label='URL')
+    url_exact = forms.BooleanField(required=False, label='Exact URL')
+    status_code = forms.CharField(required=False, label='Status', help_text='404 or 4xx')
+    min_response_time = forms.FloatField(required=False, min_value=0, label='Response time from, ms')
     initiator = forms.CharField(required=False, label='Initiator')
     request_body = forms.CharField(required=False, label='Request body')
     html = forms.CharField(required=False, label='HTML')
@@ -94,32 +132,49 @@ class LogFilterForm(forms.Form):
         self.sort_order = request.GET.get('order', 'desc')
         self.sort_prefix = '' if self.sort_order == 'asc' else '-'
         self.page_number = request.GET.get('page')
+        self.cursor = request.GET.get('cursor')
         self.items_count = None
+        self.items_count_is_estimate = False
         self.total_pages = None
         self.per_page = None
 
-        # Set choices for employee.
-        self.fields['employee'].queryset = (
-            LogEntry.objects.values_list('employee', flat=True).distinct().order_by('employee')
-        )
-        self.fields['employee'].choices = [(e, e) for e in self.fields['employee'].queryset if e]
+        # Set choices for employee (evaluated lazily, only when the field is rendered or validated).
+        self.fields['employee'].choices = get_employee_choices
+        # Полезные нагрузки хранятся сжатыми или во внешнем хранилище, искать по ним можно только через индекс.
+        if not settings.SEARCH_INDEX_ENABLED:
+            for name in PAYLOAD_FILTER_FIELDS:
+                del self.fields[name]
+
+    def clean_status_code(self) -> tuple[int, int] | None:
+        """Parse the status filter into an inclusive (min, max) range: '404' or a class like '4xx'."""
+        value = self.cleaned_data['status_code'].strip().lower()
+        if not value:
+            return None
+        if len(value) == 3 and value[0].isdigit() and value[1:] == 'xx':
+            return int(value[0]) * 100, int(value[0]) * 100 + 99
+        status = parse_status_code(value)
+        if status is None:
+            raise forms.ValidationError('Enter a status code like 404 or a class like 4xx.')
+        return status, status
 
     def _get_text_search_q(self, value: str) -> Q:
-        """Возвращает выражение Q для поиска по всем полям, поддерживающим текстовый поиск модели LogEntry."""
-        text_field_types = (CharField, TextField, EmailField, SlugField)
-        q = Q()
-
-        for field in LogEntry._meta.get_fields():
-            if field.concrete and isinstance(field, text_field_types):
-                q |= Q(**{f'{field.name}__icontains': value})
+        """
+        Возвращает выражение Q для поиска по текстовым полям записи, которые попадают и в поисковый индекс.
 
+        Служебные поля (хеши, кодеки, хост URL) в поиск не входят.
+        """
+        q = Q()
+        for name in SEARCH_TEXT_FIELDS:
+            q |= Q(**{f'{name}__icontains': value})
         return q
 
     def filter_queryset(self, queryset: QuerySet) -> QuerySet:
         """Filter the queryset based on form data."""
         cleaned_data = self.cleaned_data
 
-        if cleaned_data['search']:
+        if cleaned_data['search'] and settings.SEARCH_INDEX_ENABLED:
+            queryset = filter_search(queryset, cleaned_data['search'])
+        elif cleaned_data['search']:
             queryset = queryset.filter(self._get_text_search_q(cleaned_data['search']))
 
         if cleaned_data['ip_address']:
@@ -130,14 +185,24 @@ class LogFilterForm(forms.Form):
         if cleaned_data['date_to']:
             queryset = queryset.filter(received_at__lte=cleaned_data['date_to'])
 
-        if cleaned_data['url']:
+        if cleaned_data['url'] and cleaned_data['url_exact']:
+            queryset = queryset.filter(url_hash=get_url_hash(cleaned_data['url']))
+        elif cleaned_data['url']:
             queryset = queryset.filter(url__icontains=cleaned_data['url'])
+        if cleaned_data['status_code']:
+            status_from, status_to = cleaned_data['status_code']
+            if status_from == status_to:
+                # Равенство позволяет читать индекс (http_status, received_at) сразу в порядке сортировки.
+                queryset = queryset.filter(http_status=status_from)
+            else:
+                queryset = queryset.filter(http_status__range=(status_from, status_to))
+        if cleaned_data['min_response_time'] is not None:
+            queryset = queryset.filter(response_time_ms__gte=cleaned_data['min_response_time'])
         if cleaned_data['initiator']:
             queryset = queryset.filter(initiator__icontains=cleaned_data['initiator'])
-        if cleaned_data['request_body']:
-            queryset = queryset.filter(requestBody__icontains=cleaned_data['request_body'])
-        if cleaned_data['html']:
-            queryset = queryset.filter(html__icontains=cleaned_data['html'])
+        for name, index_field in PAYLOAD_FILTER_FIELDS.items():
+            if cleaned_data.get(name):
+                queryset = filter_search(queryset, cleaned_data[name], index_field)
         if cleaned_data.get('employee'):
             queryset = queryset.filter(employee__in=cleaned_data['employee'])
 
@@ -145,11 +210,16 @@ class LogFilterForm(forms.Form):
 
     def order_queryset(self, queryset: QuerySet[LogEntry]) -> QuerySet[LogEntry]:
         """Order the queryset based on the selected sort field and order."""
-        return queryset.order_by(f'{self.sort_prefix}{self.sort_field}')
+        # id как второй ключ делает порядок однозначным для постраничной выборки по ключу.
+        return queryset.order_by(f'{self.sort_prefix}{self.sort_field}', f'{self.sort_prefix}id')
+
+    def _get_keyset_q(self, last: LogEntry) -> Q:
+        """Возвращает условие для записей, идущих после last в текущем порядке сортировки."""
+        return get_keyset_q(self.sort_field, getattr(last, self.sort_field), last.id, self.sort_order != 'asc')
 
     def get_initial_queryset(self) -> QuerySet[LogEntry]:
-        """Get the initial queryset of log entries."""
-        return LogEntry.objects.all()
+        """Get the initial queryset of log entries without payloads (the list shows only their sizes)."""
+        return LogEntry.objects.defer(*LogEntry.PAYLOAD_FIELDS)
 
     def get_items(self) -> QuerySet[LogEntry]:
         """Get filtered and sorted log entries based on form data."""
@@ -160,10 +230,77 @@ class LogFilterForm(forms.Form):
         queryset = self.filter_queryset(queryset)
         return self.order_queryset(queryset)
 
-    def get_page(self) -> Page:
+    def get_page(self) -> Page | KeysetPage:
         """Get a page of log entries based on the form data."""
-        paginator = Paginator(self.get_items(), 25)
+        if settings.KEYSET_PAGINATION_ENABLED:
+            return get_keyset_page(self, self.get_items(), self.sort_field, descending=self.sort_order != 'asc')
+
+        paginator = Paginator(self.get_items(), PER_PAGE)
         self.items_count = paginator.count
         self.total_pages = paginator.num_pages
         self.per_page = paginator.per_page
         return paginator.get_page(self.page_number)
+
+    def iter_items(self, chunk_size: int, fields: Sequence[str] = ()) -> Iterator[LogEntry]:
+        """
+        Iterate over filtered and sorted log entries chunk by chunk.
+
+        Each chunk is a separate keyset query on (sort field, id), so only one chunk is held in memory
+        regardless of the database driver and the total number of rows.
+        """
+        queryset = self.order_queryset(self.get_items())
+        if fields:
+            # only() не отменяет defer() из get_initial_queryset, поэтому отложенные поля сбрасываются.
+            queryset = queryset.defer(None).only(self.sort_field, *fields)
+
+        last = None
+        while True:
+            chunk = list((queryset if last is None else queryset.filter(self._get_keyset_q(last)))[:chunk_size])
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            last = chunk[-1]
+
+
+class StatsForm(forms.Form):
+    """Form for selecting the range, granularity and grouping of pre-aggregated log statistics."""
+
+    # Интервал по умолчанию и диапазон, начиная с которого по умолчанию берутся часовые агрегаты.
+    DEFAULT_RANGE = timedelta(hours=24)
+    HOURLY_RANGE = timedelta(hours=6)
+
+    date_from = forms.DateTimeField(
+        required=False, label='From date', widget=forms.DateTimeInput(attrs={'type': 'datetime-local'})
+    )
+    date_to = forms.DateTimeField(
+        required=False, label='To date', widget=forms.DateTimeInput(attrs={'type': 'datetime-local'})
+    )
+    period = forms.ChoiceField(choices=[('', 'Auto'), *LogRollup.Period.choices], required=False, label='Period')
+    group_by = forms.ChoiceField(
+        choices=[('', 'None'), *((name, name.capitalize()) for name in GROUP_FIELDS)], required=False, label='Group by'
+    )
+    employee = forms.CharField(required=False, label='Employee')
+    host = forms.CharField(required=False, label='Host')
+    method = forms.CharField(required=False, label='Method')
+
+    def get_stats(self) -> dict[str, Any]:
+        """Return statistics read from LogRollup only, together with the effective range and period."""
+        cleaned_data = self.cleaned_data if self.is_valid() else {}
+        date_to = cleaned_data.get('date_to') or timezone.now()
+        date_from = cleaned_data.get('date_from') or date_to - self.DEFAULT_RANGE
+        period = cleaned_data.get('period') or (
+            LogRollup.Period.HOUR if date_to - date_from > self.HOURLY_RANGE else LogRollup.Period.MINUTE
+        )
+
+        queryset = LogRollup.objects.filter(period=period, bucket__gte=date_from, bucket__lt=date_to)
+        for name in GROUP_FIELDS:
+            if cleaned_data.get(name):
+                queryset = queryset.filter(**{name: cleaned_data[name]})
+
+        return {
+            'date_from': date_from,
+            'date_to': date_to,
+            'period': period,
+            'group_by': cleaned_data.get('group_by', ''),
+            **get_stats(queryset, cleaned_data.get('group_by', '')),
+        }
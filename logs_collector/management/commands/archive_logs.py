@@ -0,0 +1,114 @@
+"""Команда для выгрузки записей логов в колоночный архив Parquet или Arrow IPC."""
+
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from logs_collector.archive import FORMAT_PARQUET, FORMATS, write_archive
+from logs_collector.models import LogEntry
+from logs_collector.partitions import (
+    MAX_PARTITION,
+    delete_rows,
+    drop_partitions,
+    get_partition_bounds,
+    supports_partitioning,
+)
+
+
+class Command(BaseCommand):
+    """
+    Write LogEntry rows received in a range (or stored in one partition) to a Parquet or Arrow IPC file.
+
+    Rows are read by primary key in --batch-size chunks and every chunk becomes one row group, so memory
+    use does not depend on the size of the range. With --delete the archived rows are removed from the
+    database after the file has been written and its row count checked; load them back with
+    load_logs_archive.
+    """
+
+    help = 'Выгружает записи логов за период или секцию в файл Parquet/Arrow и при --delete удаляет их из базы.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--output', required=True, help='Путь к файлу архива.')
+        parser.add_argument('--format', choices=FORMATS, default=FORMAT_PARQUET, help='Формат архива.')
+        parser.add_argument('--date-from', help='Записи, полученные начиная с этого времени (ISO 8601).')
+        parser.add_argument('--date-to', help='Записи, полученные раньше этого времени (ISO 8601).')
+        parser.add_argument('--partition', help='Выгрузить секцию LogEntry целиком (MySQL/MariaDB).')
+        parser.add_argument('--employee', help='Только записи сотрудника.')
+        parser.add_argument(
+            '--no-payloads', action='store_true', help='Без html, response и request_body (только размеры и ссылки).'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей в группе строк архива.')
+        parser.add_argument('--delete', action='store_true', help='Удалить выгруженные записи из базы.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Archive the selected rows and optionally delete them."""
+        if options['partition'] and (options['date_from'] or options['date_to']):
+            raise CommandError('--partition cannot be combined with --date-from/--date-to')
+        if options['delete'] and options['no_payloads']:
+            raise CommandError('--delete requires payloads in the archive, remove --no-payloads')
+
+        queryset = self.get_queryset(options)
+        path = Path(options['output'])
+        started = time.monotonic()
+        rows, last_id = write_archive(
+            queryset, path, options['format'], not options['no_payloads'], options['batch_size']
+        )
+        took = time.monotonic() - started
+        self.stdout.write(f'archived={rows} size={path.stat().st_size} path={path} took={took:.2f}s')
+
+        if options['delete'] and rows:
+            self.delete(queryset, rows, last_id, options)
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def get_queryset(self, options: dict[str, Any]) -> QuerySet[LogEntry]:
+        """Return the rows selected by the range, partition and employee options."""
+        queryset = LogEntry.objects.all()
+        if options['partition']:
+            if not supports_partitioning(LogEntry):
+                raise CommandError('--partition is supported on MySQL/MariaDB only')
+            bounds = get_partition_bounds(LogEntry, options['partition'])
+            if bounds is None:
+                raise CommandError(f'Partition {options["partition"]} does not exist')
+            lower, upper = bounds
+            if lower is not None:
+                queryset = queryset.filter(received_at__gte=lower)
+            if upper is not None:
+                queryset = queryset.filter(received_at__lt=upper)
+        if options['date_from']:
+            queryset = queryset.filter(received_at__gte=self.parse_moment(options['date_from'], '--date-from'))
+        if options['date_to']:
+            queryset = queryset.filter(received_at__lt=self.parse_moment(options['date_to'], '--date-to'))
+        if options['employee']:
+            queryset = queryset.filter(employee=options['employee'])
+        return queryset
+
+    def parse_moment(self, value: str, option: str) -> datetime:
+        """Parse an ISO 8601 option value, treating naive values as the current time zone."""
+        moment = parse_datetime(value)
+        if moment is None:
+            raise CommandError(f'Invalid {option} value: {value}')
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+    def delete(self, queryset: QuerySet[LogEntry], rows: int, last_id: int, options: dict[str, Any]) -> None:
+        """Delete the archived rows, refusing if the range changed after it was archived."""
+        partition = options['partition']
+        # Секция удаляется целиком, поэтому в ней не должно появиться записей после выгрузки.
+        archived = queryset if partition else queryset.filter(id__lte=last_id)
+        if (count := archived.count()) != rows:
+            raise CommandError(f'{count} rows in the range, {rows} archived: not deleting, archive again')
+
+        if partition and not options['employee']:
+            if partition == MAX_PARTITION:
+                raise CommandError(f'Partition {MAX_PARTITION} cannot be dropped')
+            drop_partitions(LogEntry, [partition], options['batch_size'])
+            self.stdout.write(f'dropped partition {partition}')
+        else:
+            deleted = delete_rows(archived, options['batch_size'])
+            self.stdout.write(f'deleted={deleted}')
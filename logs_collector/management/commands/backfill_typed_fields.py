@@ -0,0 +1,39 @@
+"""Команда для заполнения типизированных полей существующих логов."""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from logs_collector.models import LogEntry
+from logs_collector.services import TYPED_FIELDS, fill_typed_fields
+
+
+class Command(BaseCommand):
+    """
+    Fill the typed fields (http_status, response_time_ms, client_time, url_hash, url_host) of existing entries.
+
+    Works online in small batches ordered by primary key; an interrupted run is resumed with --min-id.
+    """
+
+    help = 'Заполняет типизированные поля (http_status, response_time_ms, client_time, url_hash, url_host) пакетами.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей за одну итерацию.')
+        parser.add_argument('--min-id', type=int, default=0, help='Начать с записей с id больше указанного.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Update entries batch by batch."""
+        queryset = LogEntry.objects.only('time', 'url', 'status_code', 'response_time').order_by('id')
+
+        processed = 0
+        last_id = options['min_id']
+        while batch := list(queryset.filter(id__gt=last_id)[: options['batch_size']]):
+            for entry in batch:
+                fill_typed_fields(entry)
+            LogEntry.objects.bulk_update(batch, TYPED_FIELDS)
+            processed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'updated={processed} last_id={last_id}')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {processed} entries updated'))
@@ -0,0 +1,113 @@
+"""Бенчмарк разбора тела события и декодирования base64-полей: время и пиковые выделения памяти."""
+
+import base64
+import json
+import random
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from logs_collector.services import decode_base64
+from logs_collector.streaming import BASE64_FIELDS, parse_log_body
+from logs_collector.synthetic import generate_html
+
+
+def legacy_decode_base64(field: str) -> bytes:
+    """Прежняя реализация decode_base64 для сравнения: strip, два replace и дополнение padding."""
+    if field and isinstance(field, str):
+        field = field.strip().replace('\n', '').replace('\r', '')
+        missing_padding = len(field) % 4
+        if missing_padding:
+            field += '=' * (4 - missing_padding)
+        return base64.b64decode(field)
+    return b''
+
+
+def parse_legacy(body: bytes) -> dict:
+    """Прежний путь приёма: json.loads по декодированной строке и legacy_decode_base64 для каждого поля."""
+    data = json.loads(body.decode())
+    return {name: legacy_decode_base64(data.get(name, '')) for name in BASE64_FIELDS}
+
+
+def parse_json(body: bytes) -> dict:
+    """json.loads и текущая decode_base64 (путь пакетов событий)."""
+    data = json.loads(body)
+    return {name: decode_base64(data.get(name, '')) for name in BASE64_FIELDS}
+
+
+def parse_stream(body: bytes) -> dict:
+    """Текущий путь приёма одного события: base64 декодируется из байтов тела."""
+    data = parse_log_body(body)
+    return {name: decode_base64(data.get(name, '')) for name in BASE64_FIELDS}
+
+
+PATHS: tuple[tuple[str, Callable[[bytes], dict]], ...] = (
+    ('legacy', parse_legacy),
+    ('json + decode_base64', parse_json),
+    ('parse_log_body', parse_stream),
+)
+
+
+class Command(BaseCommand):
+    """
+    Compare the event body decoding paths on synthetic events with large html.
+
+    For every path and html size the command reports CPU time per event and the peak of memory
+    allocated while one event is parsed (tracemalloc, measured in a separate run). The body itself
+    is not counted, so the peak shows the intermediate copies on top of the decoded payloads.
+    """
+
+    help = 'Сравнивает время и пиковую память разбора события с base64-полями (прежний и текущий путь).'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument(
+            '--sizes', default='1,5,10', help='Размеры html в мегабайтах через запятую (до кодирования base64).'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Количество разборов каждого события.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Parse synthetic events with every path and print a table."""
+        rng = random.Random(0)
+        self.stdout.write(f'{"path":<22} {"html MB":>8} {"ms/event":>9} {"MB/s":>8} {"peak MiB":>9} {"x payload":>10}')
+
+        for size in (float(value) for value in options['sizes'].split(',')):
+            body, payload_size = self.build_event(int(size * 2**20), rng)
+            expected = parse_legacy(body)
+            for name, parse in PATHS:
+                if parse(body) != expected:
+                    self.stderr.write(f'{name}: decoded payloads differ from the legacy path')
+
+                started = time.process_time()
+                for _ in range(options['repeat']):
+                    parse(body)
+                elapsed = (time.process_time() - started) / options['repeat']
+
+                tracemalloc.start()
+                parse(body)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                self.stdout.write(
+                    f'{name:<22} {size:>8.1f} {elapsed * 1000:>9.2f} {len(body) / 2**20 / max(elapsed, 1e-9):>8.1f} '
+                    f'{peak / 2**20:>9.2f} {peak / payload_size:>10.2f}'
+                )
+
+    def build_event(self, html_size: int, rng: random.Random) -> tuple[bytes, int]:
+        """Build a JSON event with base64 html, response and request body; return the body and the payload size."""
+        payloads = {
+            'html': generate_html(html_size, rng),
+            'response': generate_html(html_size // 10, rng),
+            'requestBody': generate_html(html_size // 100, rng),
+        }
+        event = {
+            'pluginKey': 'benchmark',
+            'url': 'https://example.com/orders',
+            'method': 'POST',
+            'employee': 'benchmark',
+            **{name: base64.b64encode(data).decode() for name, data in payloads.items()},
+        }
+        return json.dumps(event).encode(), sum(len(data) for data in payloads.values())
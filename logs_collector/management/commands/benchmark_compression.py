@@ -0,0 +1,65 @@
+"""Бенчмарк степени сжатия и стоимости сжатия полезных нагрузок."""
+
+import random
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from logs_collector.compression import DICT_SEPARATOR, compress, decompress, zstandard
+from logs_collector.models import LogEntry
+from logs_collector.synthetic import generate_html
+
+
+class Command(BaseCommand):
+    """Report compression ratio and CPU cost for every available codec."""
+
+    help = 'Сравнивает кодеки сжатия на html из базы или на синтетических страницах.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--samples', type=int, default=200, help='Количество html для замера.')
+        parser.add_argument('--synthetic-size', type=int, default=0, help='Размер синтетического html вместо базы.')
+        parser.add_argument('--dict', default='', help='Идентификатор словаря для дополнительных замеров.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Compress the samples with every codec and print a table."""
+        samples = self.get_samples(options['samples'], options['synthetic_size'])
+        if not samples:
+            raise CommandError('Нет html для замера, используйте --synthetic-size')
+
+        codecs = [('zlib', level) for level in (1, 3, 6, 9)]
+        if zstandard is not None:
+            codecs += [('zstd', level) for level in (1, 3, 9, 19)]
+        if options['dict']:
+            codecs += [(f'{codec}{DICT_SEPARATOR}{options["dict"]}', level) for codec, level in list(codecs)]
+
+        raw_size = sum(len(sample) for sample in samples)
+        self.stdout.write(f'samples={len(samples)} raw={raw_size / 2**20:.2f} MiB')
+        self.stdout.write(f'{"codec":<40} {"level":>5} {"ratio":>7} {"ms/event":>9} {"MB/s":>8} {"unpack MB/s":>12}')
+
+        for codec, level in codecs:
+            started = time.process_time()
+            compressed = [compress(codec, sample, level) for sample in samples]
+            compress_time = time.process_time() - started
+
+            started = time.process_time()
+            for data in compressed:
+                decompress(codec, data)
+            decompress_time = time.process_time() - started
+
+            stored_size = sum(len(data) for data in compressed)
+            self.stdout.write(
+                f'{codec:<40} {level:>5} {raw_size / stored_size:>7.2f} '
+                f'{compress_time * 1000 / len(samples):>9.3f} '
+                f'{raw_size / 2**20 / max(compress_time, 1e-9):>8.1f} '
+                f'{raw_size / 2**20 / max(decompress_time, 1e-9):>12.1f}'
+            )
+
+    def get_samples(self, count: int, synthetic_size: int) -> list[bytes]:
+        """Take html samples from the database or generate synthetic pages."""
+        if synthetic_size:
+            rng = random.Random(0)
+            return [generate_html(synthetic_size, rng) for _ in range(count)]
+        entries = LogEntry.objects.filter(html_size__gt=0).order_by('-id').only('id', 'html', 'html_hash', 'html_codec')
+        return [entry.get_payload('html') for entry in entries[:count].iterator()]
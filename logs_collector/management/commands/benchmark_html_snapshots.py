@@ -0,0 +1,145 @@
+"""Бенчмарк хранения html разницей с базовым снимком: экономия места и время восстановления при чтении."""
+
+import random
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+from django.test import override_settings
+
+from logs_collector.compression import compress_payload, decompress, is_snapshot_codec, load_snapshot_base
+from logs_collector.management.commands.benchmark_ingestion import get_directory_size, get_percentile
+from logs_collector.models import LogEntry
+from logs_collector.services import get_url_hash
+from logs_collector.snapshots import compress_html_snapshot
+from logs_collector.synthetic import generate_html, mutate_html
+
+
+class Command(BaseCommand):
+    """
+    Compare storing html in full with storing it as deltas against per-url base snapshots.
+
+    Synthetic mode reloads --urls pages --versions times each with --changes small edits per reload;
+    every --rewrite-every-th reload generates the page anew, which forces a new base snapshot. With
+    --from-db the latest html payloads of the log table are replayed in the order they were received.
+
+    Base snapshots are written to a temporary directory and the snapshot rows are rolled back, so the
+    command leaves nothing behind. Reconstruction is timed with the base snapshot cached in memory (warm)
+    and read from disk for every payload (cold).
+    """
+
+    help = 'Сравнивает размер и время чтения html, хранимого целиком и разницей с базовым снимком страницы.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--urls', type=int, default=20, help='Количество страниц.')
+        parser.add_argument('--versions', type=int, default=50, help='Перезагрузок каждой страницы.')
+        parser.add_argument('--html-size', type=int, default=64 * 1024, help='Размер html, байт.')
+        parser.add_argument('--changes', type=int, default=5, help='Мелких правок html на перезагрузку.')
+        parser.add_argument('--rewrite-every', type=int, default=20, help='Перезагрузок до полной смены страницы.')
+        parser.add_argument('--from-db', action='store_true', help='Взять html последних записей из базы.')
+        parser.add_argument('--samples', type=int, default=1000, help='Количество html из базы.')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Store the snapshots both ways, check the round trip and print sizes and timings."""
+        snapshots = self.get_db_snapshots(options['samples']) if options['from_db'] else self.generate(options)
+        if not snapshots:
+            raise CommandError('Нет html для замера')
+        raw_size = sum(len(html) for _, html in snapshots)
+        self.stdout.write(
+            f'snapshots={len(snapshots)} urls={len({url_hash for url_hash, _ in snapshots})} '
+            f'raw={raw_size / 2**20:.2f} MiB'
+        )
+
+        full, full_times = self.store(snapshots, lambda url_hash, html: compress_payload('html', html))
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            HTML_SNAPSHOT_DIR=directory, HTML_SNAPSHOT_DELTA_ENABLED=True
+        ), transaction.atomic():
+            load_snapshot_base.cache_clear()
+            deltas, delta_times = self.store(
+                snapshots,
+                lambda url_hash, html: compress_html_snapshot(url_hash, html) or compress_payload('html', html),
+            )
+            bases_size = get_directory_size(Path(directory))
+            decode_warm = self.decode(snapshots, deltas, cold=False)
+            decode_cold = self.decode(snapshots, deltas, cold=True)
+            transaction.set_rollback(True)
+        load_snapshot_base.cache_clear()
+        decode_full = self.decode(snapshots, full, cold=False)
+
+        full_size = sum(len(stored) for _, stored in full)
+        rows_size = sum(len(stored) for _, stored in deltas)
+        bases = len({codec for codec, _ in deltas if is_snapshot_codec(codec)})
+        delta_size = rows_size + bases_size
+        self.stdout.write(f'full:  {full_size / 2**20:.2f} MiB ({raw_size / full_size:.1f}x)')
+        self.stdout.write(
+            f'delta: {delta_size / 2**20:.2f} MiB ({raw_size / delta_size:.1f}x) = rows {rows_size / 2**20:.2f} MiB '
+            f'+ {bases} bases {bases_size / 2**20:.2f} MiB, saved {(1 - delta_size / full_size) * 100:.1f}% '
+            'against full'
+        )
+        for name, timings in (
+            ('store full', full_times),
+            ('store delta', delta_times),
+            ('read full', decode_full),
+            ('read delta, base cached', decode_warm),
+            ('read delta, base from disk', decode_cold),
+        ):
+            timings.sort()
+            self.stdout.write(
+                f'{name:<28} p50={get_percentile(timings, 50) * 1000:.3f}ms '
+                f'p99={get_percentile(timings, 99) * 1000:.3f}ms'
+            )
+
+    def generate(self, options: dict[str, Any]) -> list[tuple[str, bytes]]:
+        """Generate page reloads of all urls interleaved in random order."""
+        rng = random.Random(options['seed'])
+        pages = {}
+        snapshots = []
+        reloads = [number for number in range(options['urls']) for _ in range(options['versions'])]
+        rng.shuffle(reloads)
+        for reload, number in enumerate(reloads):
+            if number not in pages or (options['rewrite_every'] and reload % options['rewrite_every'] == 0):
+                pages[number] = generate_html(options['html_size'], rng)
+            url_hash = get_url_hash(f'https://crm.example.com/page/{number}')
+            snapshots.append((url_hash, mutate_html(pages[number], rng, options['changes'])))
+        return snapshots
+
+    def get_db_snapshots(self, samples: int) -> list[tuple[str, bytes]]:
+        """Take the latest html payloads from the log table in the order they were received."""
+        entries = (
+            LogEntry.objects.filter(html_size__gt=0)
+            .exclude(url_hash='')
+            .order_by('-received_at')
+            .only('id', 'url_hash', 'html', 'html_hash', 'html_codec')[:samples]
+        )
+        return [(entry.url_hash, entry.get_payload('html')) for entry in reversed(list(entries))]
+
+    def store(
+        self, snapshots: list[tuple[str, bytes]], store: Callable[[str, bytes], tuple[str, bytes]]
+    ) -> tuple[list[tuple[str, bytes]], list[float]]:
+        """Compress every snapshot with the store callable, returning (codec, data) and the timings."""
+        stored = []
+        timings = []
+        for url_hash, html in snapshots:
+            started = time.perf_counter()
+            stored.append(store(url_hash, html))
+            timings.append(time.perf_counter() - started)
+        return stored, timings
+
+    def decode(self, snapshots: list[tuple[str, bytes]], stored: list[tuple[str, bytes]], cold: bool) -> list[float]:
+        """Decompress every stored snapshot, check it against the original and return the timings."""
+        timings = []
+        for (_, html), (codec, data) in zip(snapshots, stored, strict=True):
+            if cold:
+                load_snapshot_base.cache_clear()
+            started = time.perf_counter()
+            restored = decompress(codec, data)
+            timings.append(time.perf_counter() - started)
+            if restored != html:
+                raise CommandError(f'Restored html differs from the original ({codec})')
+        return timings
@@ -0,0 +1,319 @@
+"""Нагрузочный бенчмарк приёма логов через /receiver: пропускная способность, задержки, память, объём записи."""
+
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection
+from django.db.models import Max
+from django.test import Client
+
+from logs_collector.models import Employee, FailedLogEntry, LogEntry, LogSearchIndex
+from logs_collector.synthetic import SIZE_PROFILES, generate_event, generate_html, sample_size
+
+
+BENCHMARK_EMPLOYEE = 'benchmark'
+SERVER_START_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    """
+    Send synthetic extension events to /receiver and report ingestion metrics.
+
+    In the client mode events go through the Django test client in this process; in the http mode
+    they are posted to a real server: the one given by --url or a runserver started on a free local
+    port. Both modes write to the configured database (MariaDB, or SQLite with DATABASE_SQLITE_PATH),
+    created entries are deleted afterwards unless --keep is given.
+
+    Reported: events/s, p50/p99 request latency, peak RSS of the process that handled the requests
+    and write amplification - growth of the database and the blob store per byte of request body.
+    """
+
+    help = 'Нагрузочный бенчмарк приёма логов: события/с, задержки p50/p99, пиковая память, объём записи.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--events', type=int, default=200, help='Количество событий.')
+        parser.add_argument('--mode', choices=('client', 'http'), default='client', help='Тестовый клиент или HTTP.')
+        parser.add_argument('--url', default='', help='URL /receiver запущенного сервера (режим http).')
+        parser.add_argument('--server-pid', type=int, default=0, help='PID сервера для замера памяти (с --url).')
+        parser.add_argument('--concurrency', type=int, default=4, help='Параллельных запросов (режим http).')
+        parser.add_argument('--batch', type=int, default=1, help='Событий в одном запросе (больше 1 - JSON-массив).')
+        parser.add_argument('--profile', choices=sorted(SIZE_PROFILES), default='mixed', help='Распределение html.')
+        parser.add_argument('--html-median', type=int, default=0, help='Медиана размера html, байт (вместо профиля).')
+        parser.add_argument('--html-sigma', type=float, default=0.0, help='Sigma логнормального размера html.')
+        parser.add_argument('--max-html-size', type=int, default=10 * 1024 * 1024, help='Предел размера html, байт.')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора.')
+        parser.add_argument('--keep', action='store_true', help='Не удалять созданные записи.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Run the benchmark and print the report."""
+        if options['events'] <= 0 or options['batch'] <= 0:
+            raise CommandError('--events and --batch must be positive')
+
+        min_id = LogEntry.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        min_failed_id = FailedLogEntry.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        storage_before = get_storage_size()
+        bodies = self.iter_bodies(options)
+
+        started = time.perf_counter()
+        if options['mode'] == 'client':
+            latencies, statuses, statements = self.run_client(bodies)
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            rss_source = 'benchmark process'
+        elif options['url']:
+            latencies, statuses = self.run_http(bodies, options['url'], options['concurrency'])
+            peak_rss = get_peak_rss(options['server_pid']) if options['server_pid'] else None
+            rss_source = f'server pid {options["server_pid"]}'
+            statements = None
+        else:
+            with run_local_server() as (url, pid):
+                latencies, statuses = self.run_http(bodies, url, options['concurrency'])
+                peak_rss = get_peak_rss(pid)
+            rss_source = 'local runserver'
+            statements = None
+        took = time.perf_counter() - started
+
+        storage_after = get_storage_size()
+        self.report(options, latencies, statuses, statements, took, peak_rss, rss_source, storage_before, storage_after)
+
+        if not options['keep']:
+            cleanup(min_id, min_failed_id)
+
+    def iter_bodies(self, options: dict[str, Any]) -> Iterator[bytes]:
+        """Yield request bodies with --batch events each until --events events are generated."""
+        rng = random.Random(options['seed'])
+        median, sigma = SIZE_PROFILES[options['profile']]
+        median = options['html_median'] or median
+        sigma = options['html_sigma'] or sigma
+
+        # Страницы вырезаются из одного большого html со случайным смещением: генерация html на каждое событие
+        # заняла бы больше времени, чем его приём.
+        source = generate_html(min(options['max_html_size'], int(median * 8)) * 2, rng)
+        self.sent_bytes = 0
+        sequence = 0
+        # requestId уникален для запуска: иначе повторный запуск в пределах RECEIVER_DEDUP_WINDOW
+        # замерил бы отбрасывание повторов, а не приём.
+        run_id = f'{time.time_ns():x}'
+        while sequence < options['events']:
+            events = []
+            for _ in range(min(options['batch'], options['events'] - sequence)):
+                size = min(sample_size(rng, median, sigma, options['max_html_size']), len(source))
+                offset = rng.randint(0, len(source) - size)
+                event = generate_event(rng, source[offset : offset + size], sequence, BENCHMARK_EMPLOYEE)
+                event['requestId'] = f'{run_id}-{sequence}'
+                events.append(event)
+                sequence += 1
+            body = json.dumps(events if options['batch'] > 1 else events[0]).encode()
+            self.sent_bytes += len(body)
+            yield body
+
+    def run_client(self, bodies: Iterator[bytes]) -> tuple[list[float], Counter, Counter]:
+        """Post bodies through the test client, counting SQL statements by type."""
+        client = Client()
+        headers = get_receiver_headers()
+        latencies = []
+        statuses = Counter()
+        statements = Counter()
+
+        def count_statements(execute: Any, sql: str, params: Any, many: bool, context: dict) -> Any:
+            statements[sql.lstrip().split(' ', 1)[0].upper()] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_statements):
+            for body in bodies:
+                started = time.perf_counter()
+                response = client.post('/receiver', body, content_type='application/json', headers=headers)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] += 1
+        return latencies, statuses, statements
+
+    def run_http(self, bodies: Iterator[bytes], url: str, concurrency: int) -> tuple[list[float], Counter]:
+        """Post bodies to the server from concurrency threads."""
+        headers = {'Content-Type': 'application/json', **get_receiver_headers()}
+        latencies = []
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def worker() -> None:
+            while True:
+                with lock:
+                    body = next(bodies, None)
+                if body is None:
+                    return
+                request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+                started = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        response.read()
+                        status = response.status
+                except urllib.error.HTTPError as e:
+                    status = e.code
+                except OSError:
+                    status = 'connection error'
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] += 1
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, statuses
+
+    def report(
+        self,
+        options: dict[str, Any],
+        latencies: list[float],
+        statuses: Counter,
+        statements: Counter | None,
+        took: float,
+        peak_rss: int | None,
+        rss_source: str,
+        storage_before: tuple[int | None, int],
+        storage_after: tuple[int | None, int],
+    ) -> None:
+        """Print the collected metrics."""
+        events = options['events']
+        latencies = sorted(latencies)
+        sent_mib = self.sent_bytes / 2**20
+        self.stdout.write(
+            f'database={connection.vendor} mode={options["mode"]} profile={options["profile"]} '
+            f'events={events} requests={len(latencies)} sent={sent_mib:.1f} MiB '
+            f'statuses={dict(statuses)} took={took:.2f}s'
+        )
+        self.stdout.write(f'events/s={events / took:.1f} MiB/s={sent_mib / took:.1f}')
+        self.stdout.write(
+            f'latency p50={get_percentile(latencies, 50) * 1000:.1f}ms '
+            f'p99={get_percentile(latencies, 99) * 1000:.1f}ms max={latencies[-1] * 1000:.1f}ms'
+        )
+        if peak_rss is not None:
+            self.stdout.write(f'peak RSS={peak_rss / 2**20:.1f} MiB ({rss_source})')
+
+        db_before, blobs_before = storage_before
+        db_after, blobs_after = storage_after
+        db_growth = db_after - db_before if db_before is not None and db_after is not None else None
+        blob_growth = blobs_after - blobs_before
+        stored = (db_growth or 0) + blob_growth
+        self.stdout.write(
+            f'db growth={f"{db_growth / 2**20:.1f} MiB" if db_growth is not None else "n/a"} '
+            f'blob growth={blob_growth / 2**20:.1f} MiB '
+            f'write amplification={stored / max(self.sent_bytes, 1):.3f} (stored bytes / request body bytes)'
+        )
+        if statements is not None:
+            per_event = ' '.join(f'{name.lower()}={count / events:.2f}' for name, count in sorted(statements.items()))
+            self.stdout.write(f'statements/event: {per_event}')
+
+
+def get_receiver_headers() -> dict[str, str]:
+    """Возвращает заголовки запроса к /receiver с ключами из настроек."""
+    return {'X-Custom-Header': settings.CUSTOM_HEADER or '', 'X-Plugin-Key': settings.PLUGIN_KEY or ''}
+
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    """Возвращает перцентиль отсортированного списка (ближайший ранг)."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(len(values) * percentile / 100) - 1))]
+
+
+def get_directory_size(path: Path) -> int:
+    """Возвращает суммарный размер файлов каталога."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def get_database_size() -> int | None:
+    """
+    Возвращает размер базы в байтах: файлы SQLite или данные и индексы таблиц MySQL/MariaDB.
+
+    На MySQL статистика таблиц обновляется командой ANALYZE TABLE, без неё размер отстаёт.
+    """
+    if connection.vendor == 'sqlite':
+        name = str(connection.settings_dict['NAME'])
+        return sum(os.path.getsize(path) for path in (name, f'{name}-wal') if os.path.exists(path))
+    if connection.vendor == 'mysql':
+        tables = [model._meta.db_table for model in (LogEntry, LogSearchIndex, Employee, FailedLogEntry)]
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE TABLE {", ".join(tables)}')
+            cursor.fetchall()
+            cursor.execute(
+                'SELECT SUM(DATA_LENGTH + INDEX_LENGTH) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()'
+            )
+            return int(cursor.fetchone()[0] or 0)
+    return None
+
+
+def get_storage_size() -> tuple[int | None, int]:
+    """Возвращает размер базы и хранилища блобов."""
+    return get_database_size(), get_directory_size(Path(settings.BLOB_STORE_DIR))
+
+
+def get_peak_rss(pid: int) -> int | None:
+    """Возвращает пиковый RSS процесса (VmHWM из /proc, только Linux)."""
+    try:
+        status = Path(f'/proc/{pid}/status').read_text()
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith('VmHWM:'):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+@contextmanager
+def run_local_server() -> Iterator[tuple[str, int]]:
+    """Запускает manage.py runserver на свободном локальном порту и возвращает URL /receiver и PID сервера."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload', '--skip-checks'],
+        cwd=settings.BASE_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise CommandError('Local server did not start') from None
+                time.sleep(0.2)
+        yield f'http://127.0.0.1:{port}/receiver', process.pid
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def cleanup(min_id: int, min_failed_id: int) -> None:
+    """Удаляет записи, созданные бенчмарком (блобы остаются: хранилище общее для всех записей)."""
+    LogEntry.objects.filter(id__gt=min_id, employee=BENCHMARK_EMPLOYEE).delete()
+    Employee.objects.filter(name=BENCHMARK_EMPLOYEE).delete()
+    FailedLogEntry.objects.filter(id__gt=min_failed_id).delete()
@@ -0,0 +1,222 @@
+"""Бенчмарк запросов страницы логов: фильтры, сортировки, глубокие страницы и экспорт CSV с базовой линией."""
+
+import itertools
+import json
+import statistics
+import time
+from collections.abc import Callable, Iterator
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+from django.db.models import Max, QuerySet
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from logs_collector.forms import PER_PAGE, LogFilterForm
+from logs_collector.models import Employee, LogEntry
+from logs_collector.pagination import CURSOR_AFTER, encode_cursor
+from logs_collector.query_plans import explain, find_plan_problems
+from logs_collector.views import export_logs_csv
+
+
+# Фильтры LogFilterForm и значения для них; 'employee' и даты подставляются по данным таблицы.
+FILTERS = {
+    'search': {'search': 'invoice'},
+    'ip_address': {'ip_address': '10.1.'},
+    'url': {'url': 'report'},
+    'initiator': {'initiator': 'crm'},
+    'html': {'html': 'payment'},
+    'employee': {'employee': 'employee'},
+    'date range': {'date_from': 'date_from', 'date_to': 'date_to'},
+}
+SORTS = (('received_at', 'desc'), ('initiator', 'asc'))
+
+
+class Command(BaseCommand):
+    """
+    Time the log list queries for LogFilterForm filter combinations, sort fields, deep pages and CSV export.
+
+    Every scenario is run --repeat times after a warm-up; the median time, the number of SQL statements
+    and the EXPLAIN problems (see logs_collector.query_plans) are reported. With --save-baseline the results are
+    written to a JSON file; with --baseline they are compared with it and the command fails when a scenario
+    became slower by more than --tolerance, issues more statements or gets a new plan problem.
+
+    Use seed_logs to fill the table with a production-like volume first.
+    """
+
+    help = 'Замеряет запросы страницы логов (фильтры, сортировки, глубокие страницы, экспорт CSV) и сравнивает с базой.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--repeat', type=int, default=5, help='Количество замеров каждого сценария.')
+        parser.add_argument('--max-filters', type=int, default=2, help='Наибольшее число фильтров в сочетании.')
+        parser.add_argument('--deep-page', type=int, default=1000, help='Номер глубокой страницы.')
+        parser.add_argument('--export-rows', type=int, default=5000, help='Строк экспорта CSV для замера.')
+        parser.add_argument('--only', default='', help='Только сценарии, название которых содержит строку.')
+        parser.add_argument('--baseline', default='', help='JSON-файл базовой линии для сравнения.')
+        parser.add_argument('--save-baseline', default='', help='Записать результаты в JSON-файл базовой линии.')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Допустимое замедление, доля (0.5 = 50%%).')
+        parser.add_argument('--min-delta-ms', type=float, default=5.0, help='Замедление меньше этого не считается.')
+        parser.add_argument('--show-sql', action='store_true', help='Вывести SQL и планы запросов.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Run the scenarios, print the table and compare the results with the baseline."""
+        if not LogEntry.objects.exists():
+            raise CommandError('The log table is empty, fill it with seed_logs first')
+
+        self.factory = RequestFactory()
+        self.values = self.get_filter_values()
+        connection = connections[LogEntry.objects.db]
+        self.stdout.write(f'database={connection.vendor} rows~{LogEntry.objects.aggregate(Max("id"))["id__max"]}')
+        self.stdout.write(f'{"scenario":<60} {"median ms":>10} {"min ms":>8} {"queries":>8}  plan')
+
+        results = {}
+        for name, run, queryset in self.iter_scenarios(options):
+            if options['only'] and options['only'] not in name:
+                continue
+            results[name] = self.measure(name, run, queryset, connection.vendor, options)
+
+        if options['save_baseline']:
+            baseline = {'database': connection.vendor, 'scenarios': results}
+            Path(options['save_baseline']).write_text(json.dumps(baseline, indent=2, sort_keys=True))
+            self.stdout.write(f'Baseline saved to {options["save_baseline"]}')
+        if options['baseline']:
+            self.compare(results, json.loads(Path(options['baseline']).read_text()), options)
+
+    def get_filter_values(self) -> dict[str, str]:
+        """Pick the employee and the date range from the data so that filters select a realistic share of rows."""
+        employee = Employee.objects.order_by('-entries_count').values_list('name', flat=True).first()
+        if employee is None:
+            employee = LogEntry.objects.values_list('employee', flat=True).first()
+        last = LogEntry.objects.aggregate(last=Max('received_at'))['last']
+        return {
+            'employee': employee,
+            'date_from': (last - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M'),
+            'date_to': last.strftime('%Y-%m-%dT%H:%M'),
+        }
+
+    def get_form(self, params: dict[str, Any]) -> LogFilterForm:
+        """Build a bound LogFilterForm as the log list view does."""
+        params = {key: self.values.get(value, value) for key, value in params.items()}
+        request = self.factory.get('/', params)
+        form = LogFilterForm(request, request.GET or None)
+        if params and not form.is_valid():
+            raise CommandError(f'Invalid scenario parameters {params}: {form.errors.as_json()}')
+        return form
+
+    def iter_scenarios(self, options: dict[str, Any]) -> Iterator[tuple[str, Callable[[], None], QuerySet | None]]:
+        """Yield (name, callable running the scenario, queryset to explain or None)."""
+        for size in range(options['max_filters'] + 1):
+            for names in itertools.combinations(FILTERS, size):
+                filters = {key: value for name in names for key, value in FILTERS[name].items()}
+                for sort, order in SORTS:
+                    form = self.get_form({**filters, 'sort': sort, 'order': order})
+                    name = f'{" + ".join(names) or "no filters"}, sort {sort} {order}'
+                    yield name, self.page_runner(form), form.get_items()[: PER_PAGE + 1]
+
+        for sort, order in SORTS:
+            params = {'sort': sort, 'order': order}
+            offset = options['deep_page'] * PER_PAGE
+            form = self.get_form({**params, 'page': options['deep_page']})
+            yield (
+                f'page {options["deep_page"]} by offset, sort {sort} {order}',
+                override_settings(KEYSET_PAGINATION_ENABLED=False)(self.page_runner(form)),
+                form.get_items()[offset : offset + PER_PAGE],
+            )
+
+            last = self.get_form(params).get_items().values_list(sort, 'id')[offset : offset + 1].first()
+            if last is not None:
+                form = self.get_form({**params, 'cursor': encode_cursor(CURSOR_AFTER, *last)})
+                yield f'page {options["deep_page"]} by cursor, sort {sort} {order}', self.page_runner(form), None
+
+        for names in ((), ('employee',), ('date range',)):
+            params = {key: value for name in names for key, value in FILTERS[name].items()}
+            yield (
+                f'csv export {options["export_rows"]} rows, {" + ".join(names) or "no filters"}',
+                self.export_runner(params, options['export_rows']),
+                self.get_form(params).get_items()[: options['export_rows']],
+            )
+
+    def page_runner(self, form: LogFilterForm) -> Callable[[], None]:
+        """Return a callable that fetches the form page as the log list view does."""
+
+        def run() -> None:
+            list(form.get_page())
+
+        return run
+
+    def export_runner(self, params: dict[str, Any], rows: int) -> Callable[[], None]:
+        """Return a callable that streams the first rows of the CSV export view."""
+        params = {key: self.values.get(value, value) for key, value in params.items()}
+
+        def run() -> None:
+            request = self.factory.get('/', params)
+            # Вызываем представление без login_required: замеряется выборка и формирование CSV.
+            response = export_logs_csv.__wrapped__(request)
+            read = 0
+            for chunk in response.streaming_content:
+                read += chunk.count(b'\n')
+                if read > rows:
+                    break
+
+        return run
+
+    def measure(
+        self, name: str, run: Callable[[], None], queryset: QuerySet | None, vendor: str, options: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Run the scenario, print and return its median time, statement count and plan problems."""
+        connection = connections[LogEntry.objects.db]
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        plan = explain(queryset) if queryset is not None else []
+        problems = find_plan_problems(plan, vendor, ordered=False) if plan else []
+        result = {
+            'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'queries': len(captured),
+            'plan_problems': problems,
+        }
+        self.stdout.write(
+            f'{name:<60} {result["median_ms"]:>10.2f} {result["min_ms"]:>8.2f} {result["queries"]:>8}  '
+            + ('; '.join(problems) or 'ok')
+        )
+        if options['show_sql']:
+            for query in captured:
+                self.stdout.write(f'    SQL: {query["sql"]}')
+            for row in plan:
+                self.stdout.write(f'    PLAN: {row}')
+        return result
+
+    def compare(self, results: dict[str, dict], baseline: dict[str, Any], options: dict[str, Any]) -> None:
+        """Print regressions against the baseline and raise CommandError if there are any."""
+        if baseline.get('database') != connections[LogEntry.objects.db].vendor:
+            self.stderr.write(f'Baseline was recorded on {baseline.get("database")}, timings are not comparable')
+
+        regressions = []
+        for name, result in results.items():
+            before = baseline['scenarios'].get(name)
+            if before is None:
+                continue
+            slower = result['median_ms'] - before['median_ms']
+            limit = before['median_ms'] * (1 + options['tolerance'])
+            if slower > options['min_delta_ms'] and result['median_ms'] > limit:
+                regressions.append(f'{name}: {before["median_ms"]:.2f} -> {result["median_ms"]:.2f} ms')
+            if result['queries'] > before['queries']:
+                regressions.append(f'{name}: {before["queries"]} -> {result["queries"]} queries')
+            if new_problems := set(result['plan_problems']) - set(before['plan_problems']):
+                regressions.append(f'{name}: new plan problems {", ".join(sorted(new_problems))}')
+
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(f'REGRESSION {regression}'))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
@@ -0,0 +1,95 @@
+"""Команда для переноса событий из локальной очереди в базу данных."""
+
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from logs_collector.rollups import mark_stale_hours
+from logs_collector.services import bulk_save_log_entries, iter_body_items, prepare_log_batch
+from logs_collector.spool import (
+    get_oldest_event_age,
+    get_spool_depth,
+    list_spool_files,
+    quarantine_spool_file,
+    read_spool_file,
+)
+
+
+class Command(BaseCommand):
+    """
+    Drain the write-behind spool into LogEntry in large batches.
+
+    Event files that cannot be read (truncated, corrupt metadata) are moved to the quarantine
+    subdirectory of the spool and counted as rejected, so they do not stop the consumer.
+    """
+
+    help = 'Переносит события из очереди RECEIVER_SPOOL_DIR в базу данных. Запускайте один процесс на очередь.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--batch-size', type=int, default=500, help='Событий из очереди за одну вставку.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза в секундах, когда очередь пуста.')
+        parser.add_argument('--once', action='store_true', help='Обработать очередь один раз и выйти.')
+        parser.add_argument('--stats', action='store_true', help='Показать состояние очереди и выйти.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Run the consumer loop."""
+        if options['stats']:
+            paths = list_spool_files(1)
+            self.stdout.write(f'depth={get_spool_depth()} oldest_age={get_oldest_event_age(paths):.1f}s')
+            return
+
+        while True:
+            paths = list_spool_files(options['batch_size'])
+            if paths:
+                self.drain(paths)
+            if options['once'] and len(paths) < options['batch_size']:
+                return
+            if not paths:
+                time.sleep(options['interval'])
+
+    def drain(self, paths: list) -> None:
+        """Insert a batch of spooled events and remove them from the spool."""
+        started = time.monotonic()
+        lag = get_oldest_event_age(paths)
+        entries = []
+        rejected = 0
+        duplicates = 0
+
+        for path in paths:
+            try:
+                meta, body = read_spool_file(path)
+                content_type, ip = meta['content_type'], meta['ip']
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                target = quarantine_spool_file(path)
+                self.stderr.write(f'quarantined {target}: {e!r}')
+                rejected += 1
+                continue
+            results, pending = prepare_log_batch(
+                iter_body_items(body, content_type),
+                ip,
+                meta['received_at'],
+                # События, записанные в очередь до появления ключа в заголовке, проверяются по телу.
+                key_verified=meta.get('key_verified', False),
+            )
+            # Повторы уже сохранённых событий подтверждаются без записи.
+            replayed = sum(1 for result in results if result.get('duplicate'))
+            duplicates += replayed
+            rejected += len(results) - len(pending) - replayed
+            entries.extend((raw_data, entry) for _, raw_data, entry in pending)
+
+        errors, replayed = bulk_save_log_entries(entries)
+        duplicates += len(replayed)
+        # События, пролежавшие в очереди дольше окна пересчёта агрегатов, пересчитываются отдельно.
+        mark_stale_hours(entry.received_at for _, entry in entries)
+
+        # Удаляем события только после записи в базу: при падении они будут обработаны повторно.
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+        self.stdout.write(
+            f'drained_files={len(paths)} inserted={len(entries) - len(errors) - len(replayed)} '
+            f'duplicates={duplicates} rejected={rejected + len(errors)} lag={lag:.1f}s depth={get_spool_depth()} '
+            f'took={time.monotonic() - started:.2f}s'
+        )
@@ -0,0 +1,40 @@
+"""Команда для загрузки записей логов из архива Parquet или Arrow IPC обратно в базу."""
+
+import time
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from logs_collector.archive import load_archive
+
+
+class Command(BaseCommand):
+    """
+    Load LogEntry rows from an archive written by archive_logs with payloads.
+
+    Rows keep their ids, rows already in the database are skipped, so an interrupted load can be repeated.
+    Loaded rows are subject to LOG_RETENTION_DAYS again and are deleted by the next manage_log_partitions
+    run if they are older than the retention period.
+    """
+
+    help = 'Загружает записи логов из файла Parquet/Arrow, выгруженного archive_logs.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('path', help='Путь к файлу архива.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей за одну транзакцию.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Load the archive batch by batch."""
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'{path} does not exist')
+
+        started = time.monotonic()
+        try:
+            loaded, skipped = load_archive(path, options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+        took = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Done, loaded={loaded} skipped={skipped} took={took:.2f}s'))
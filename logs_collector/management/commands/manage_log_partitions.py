@@ -0,0 +1,146 @@
+"""Команда для обслуживания секций таблиц логов и удаления устаревших данных."""
+
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+from django.db.models import Model, QuerySet
+from django.utils import timezone
+
+from logs_collector.archive import FILE_EXTENSIONS, FORMAT_PARQUET, write_archive
+from logs_collector.dedup import delete_expired_dedup_keys
+from logs_collector.models import LogEntry
+from logs_collector.partitions import (
+    PARTITION_KEY,
+    PARTITIONED_MODELS,
+    build_add_partitions_sql,
+    build_partition_table_sql,
+    collect_blob_garbage,
+    delete_expired_rows,
+    delete_rows,
+    drop_partitions,
+    get_expired_partitions,
+    get_partition_bounds,
+    get_retention_days,
+    list_partitions,
+    supports_partitioning,
+)
+from logs_collector.snapshots import delete_expired_snapshot_bases
+
+
+class Command(BaseCommand):
+    """
+    Maintain received_at range partitions of LogEntry and FailedLogEntry and apply the retention policy.
+
+    Run it daily (e.g. from cron): it premakes partitions for the coming periods and drops partitions
+    older than LOG_RETENTION_DAYS / FAILED_LOG_RETENTION_DAYS. With LOG_ARCHIVE_DIR set, expired LogEntry
+    partitions and rows are written to Parquet files there before they are dropped. Expired dedup keys,
+    unused html snapshot bases and blobs no longer referenced by any entry are purged as well.
+    """
+
+    help = (
+        'Создаёт секции таблиц логов по received_at на ближайшие периоды и удаляет устаревшие данные. '
+        'Запускайте ежедневно.'
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument(
+            '--init', action='store_true', help='Перевести несекционированные таблицы в секционированные.'
+        )
+        parser.add_argument('--ahead', type=int, default=None, help='Сколько периодов вперёд создавать секции.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей за одну итерацию очистки.')
+        parser.add_argument('--dry-run', action='store_true', help='Показать действия, ничего не меняя.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Partition tables, premake partitions and apply retention for every partitioned model."""
+        ahead = settings.LOG_PARTITION_AHEAD if options['ahead'] is None else options['ahead']
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if supports_partitioning(model):
+                partitioned = bool(list_partitions(model))
+                if not partitioned and options['init']:
+                    self.execute_sql(model, build_partition_table_sql(model, ahead), options['dry_run'])
+                elif partitioned:
+                    self.execute_sql(model, build_add_partitions_sql(model, ahead), options['dry_run'])
+                else:
+                    self.stdout.write(f'{table}: not partitioned, run with --init')
+
+            retention_days = get_retention_days(model)
+            if not retention_days:
+                continue
+            cutoff = timezone.now() - timedelta(days=retention_days)
+
+            if supports_partitioning(model) and list_partitions(model):
+                names = get_expired_partitions(model, cutoff)
+                self.stdout.write(f'{table}: dropping partitions {", ".join(names) or "-"}')
+                if not options['dry_run']:
+                    if self.should_archive(model):
+                        for name in names:
+                            lower, upper = get_partition_bounds(model, name)
+                            queryset = model.objects.filter(**{f'{PARTITION_KEY}__lt': upper})
+                            if lower is not None:
+                                queryset = queryset.filter(**{f'{PARTITION_KEY}__gte': lower})
+                            self.archive(queryset, name, options['batch_size'])
+                    drop_partitions(model, names, options['batch_size'])
+            elif options['dry_run']:
+                self.stdout.write(f'{table}: would delete rows received before {cutoff:%Y-%m-%d %H:%M}')
+            elif self.should_archive(model):
+                queryset = model.objects.filter(**{f'{PARTITION_KEY}__lt': cutoff})
+                last_id = self.archive(queryset, f'{cutoff:%Y%m%d%H%M}', options['batch_size'])
+                deleted = delete_rows(queryset.filter(id__lte=last_id), options['batch_size'])
+                self.stdout.write(f'{table}: deleted {deleted} rows received before {cutoff:%Y-%m-%d %H:%M}')
+            else:
+                deleted = delete_expired_rows(model, cutoff, options['batch_size'])
+                self.stdout.write(f'{table}: deleted {deleted} rows received before {cutoff:%Y-%m-%d %H:%M}')
+
+        # Ключи отбрасывания повторов нужны только в пределах окна RECEIVER_DEDUP_WINDOW.
+        if settings.RECEIVER_DEDUP_ENABLED:
+            if options['dry_run']:
+                self.stdout.write('dedup keys: would delete keys older than RECEIVER_DEDUP_WINDOW')
+            else:
+                deleted = delete_expired_dedup_keys(options['batch_size'])
+                self.stdout.write(f'dedup keys: deleted {deleted} expired keys')
+
+        # Базовые снимки html удаляются после всех записей, которые могут на них ссылаться.
+        if options['dry_run']:
+            self.stdout.write('html snapshots: would delete bases unused by remaining log entries')
+        else:
+            deleted = delete_expired_snapshot_bases(options['batch_size'])
+            self.stdout.write(f'html snapshots: deleted {deleted} unused bases')
+
+        # Блобы удаляются после записей, которые на них ссылались.
+        if options['dry_run']:
+            self.stdout.write('blob store: would delete unreferenced blobs older than BLOB_STORE_GC_GRACE')
+        else:
+            deleted = collect_blob_garbage(options['batch_size'])
+            self.stdout.write(f'blob store: deleted {deleted} unreferenced blobs')
+
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def should_archive(self, model: type[Model]) -> bool:
+        """Check whether expired rows of the model are archived before deletion."""
+        return model is LogEntry and bool(settings.LOG_ARCHIVE_DIR)
+
+    def archive(self, queryset: QuerySet, name: str, batch_size: int) -> int:
+        """Write the rows to <LOG_ARCHIVE_DIR>/<table>-<name>.parquet and return the largest archived id."""
+        if not queryset.exists():
+            return 0
+        table = queryset.model._meta.db_table
+        path = Path(settings.LOG_ARCHIVE_DIR) / f'{table}-{name}{FILE_EXTENSIONS[FORMAT_PARQUET]}'
+        if path.exists():
+            raise CommandError(f'{path} already exists, not overwriting an archive')
+        rows, last_id = write_archive(queryset, path, FORMAT_PARQUET, True, batch_size)
+        self.stdout.write(f'{table}: archived {rows} rows to {path}')
+        return last_id
+
+    def execute_sql(self, model: type[Model], statements: list[str], dry_run: bool) -> None:
+        """Print and, unless dry_run, execute DDL statements for the model table."""
+        for sql in statements:
+            self.stdout.write(sql)
+            if not dry_run:
+                with connections[model.objects.db].cursor() as cursor:
+                    cursor.execute(sql)
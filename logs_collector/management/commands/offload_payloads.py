@@ -0,0 +1,36 @@
+"""Команда для переноса больших полезных нагрузок существующих логов во внешнее хранилище."""
+
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Q
+
+from logs_collector.compression import SNAPSHOT_SEPARATOR
+from logs_collector.models import LogEntry
+from logs_collector.services import rewrite_payloads
+
+
+class Command(BaseCommand):
+    """Move inline payloads above BLOB_STORE_THRESHOLD into the blob store in batches."""
+
+    help = 'Переносит html/response/request_body больше BLOB_STORE_THRESHOLD во внешнее хранилище.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--batch-size', type=int, default=200, help='Записей за одну итерацию.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Offload payloads batch by batch, ordered by primary key."""
+        candidates = Q()
+        for name in LogEntry.PAYLOAD_FIELDS:
+            # Разница html с базовым снимком мала и остаётся в таблице, каким бы большим ни был html.
+            candidates |= Q(**{f'{name}_hash': '', f'{name}_size__gte': settings.BLOB_STORE_THRESHOLD}) & ~Q(
+                **{f'{name}_codec__contains': SNAPSHOT_SEPARATOR}
+            )
+
+        processed = 0
+        for processed, last_id in rewrite_payloads(LogEntry.objects.filter(candidates), options['batch_size']):
+            self.stdout.write(f'offloaded={processed} last_id={last_id}')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {processed} entries processed'))
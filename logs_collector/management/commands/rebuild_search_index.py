@@ -0,0 +1,40 @@
+"""Команда для заполнения поискового индекса по существующим логам."""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from logs_collector.models import LogEntry
+from logs_collector.search import SEARCH_TEXT_FIELDS, index_log_entries
+
+
+class Command(BaseCommand):
+    """Build LogSearchIndex rows for existing log entries in batches ordered by primary key."""
+
+    help = 'Заполняет поисковый индекс (поля записи и текст html/request_body) по существующим записям логов.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--batch-size', type=int, default=200, help='Записей за одну итерацию.')
+        parser.add_argument('--missing', action='store_true', help='Только записи, которых ещё нет в индексе.')
+        parser.add_argument('--min-id', type=int, default=0, help='Начать с записей с id больше указанного.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Index entries batch by batch."""
+        payload_fields = [f'{name}{suffix}' for name in ('html', 'request_body') for suffix in ('', '_hash', '_codec')]
+        queryset = LogEntry.objects.only(*SEARCH_TEXT_FIELDS, *payload_fields).order_by('id')
+        if options['missing']:
+            queryset = queryset.filter(search_index__isnull=True)
+
+        processed = 0
+        last_id = options['min_id']
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[: options['batch_size']])
+            if not batch:
+                break
+            index_log_entries(batch)
+            processed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'indexed={processed} last_id={last_id}')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {processed} entries indexed'))
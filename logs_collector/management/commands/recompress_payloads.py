@@ -0,0 +1,40 @@
+"""Команда для пересжатия полезных нагрузок существующих логов."""
+
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Q
+
+from logs_collector.compression import SNAPSHOT_SEPARATOR, get_codec
+from logs_collector.models import LogEntry
+from logs_collector.services import rewrite_payloads
+
+
+class Command(BaseCommand):
+    """Recompress stored payloads with the current PAYLOAD_COMPRESSION settings in batches."""
+
+    help = 'Пересжимает html/response/request_body записей, сохранённых другим кодеком или без сжатия.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--batch-size', type=int, default=200, help='Записей за одну итерацию.')
+        parser.add_argument('--min-id', type=int, default=0, help='Начать с записей с id больше указанного.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Rewrite payloads whose codec differs from the configured one."""
+        candidates = Q()
+        for name in LogEntry.PAYLOAD_FIELDS:
+            candidates |= (
+                Q(**{f'{name}_size__gte': settings.PAYLOAD_COMPRESSION_MIN_SIZE})
+                & ~Q(**{f'{name}_codec': get_codec(name)})
+                # Разница html с базовым снимком не пересжимается.
+                & ~Q(**{f'{name}_codec__contains': SNAPSHOT_SEPARATOR})
+            )
+
+        queryset = LogEntry.objects.filter(candidates, id__gt=options['min_id'])
+        processed = 0
+        for processed, last_id in rewrite_payloads(queryset, options['batch_size']):
+            self.stdout.write(f'recompressed={processed} last_id={last_id}')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {processed} entries processed'))
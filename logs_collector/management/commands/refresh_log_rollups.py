@@ -0,0 +1,66 @@
+"""Команда для пересчёта минутных и часовых агрегатов логов."""
+
+import time
+from datetime import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from logs_collector.rollups import get_refresh_start, refresh_rollups, refresh_stale_hours
+
+
+class Command(BaseCommand):
+    """
+    Refresh LogRollup from LogEntry.
+
+    Every run recomputes the last ROLLUP_RECOMPUTE_WINDOW minutes before the latest rollup up to the current
+    minute, so it is safe to run repeatedly (e.g. every minute from cron, or with --loop). Hours marked stale
+    by late inserts (drain_log_spool, load_logs_archive) are recomputed as well.
+    """
+
+    help = 'Пересчитывает минутные и часовые агрегаты логов для статистики.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--since', help='Пересчитать агрегаты начиная с указанного времени (ISO 8601).')
+        parser.add_argument('--loop', action='store_true', help='Пересчитывать постоянно с паузой --interval.')
+        parser.add_argument('--interval', type=float, default=60.0, help='Пауза между пересчётами, секунд.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Refresh rollups once or in a loop."""
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f'Invalid --since value: {options["since"]}')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        while True:
+            self.refresh(since)
+            if not options['loop']:
+                return
+            since = None
+            time.sleep(options['interval'])
+
+    def refresh(self, since: datetime | None) -> None:
+        """Recompute rollups from since (or the watermark) up to the current minute."""
+        start = since or get_refresh_start()
+        if start is None:
+            self.stdout.write('No log entries yet')
+            return
+
+        started = time.monotonic()
+        total = 0
+        for step_end, count in refresh_rollups(start, timezone.now()):
+            total += count
+            self.stdout.write(f'refreshed until {step_end:%Y-%m-%d %H:%M} minute_rollups={count}')
+        for step_end, count in refresh_stale_hours():
+            total += count
+            self.stdout.write(f'refreshed stale hour until {step_end:%Y-%m-%d %H:%M} minute_rollups={count}')
+        took = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Done, {total} minute rollups since {start:%Y-%m-%d %H:%M}, took={took:.2f}s')
+        )
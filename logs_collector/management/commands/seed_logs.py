@@ -0,0 +1,87 @@
+"""Команда для заполнения таблицы логов синтетическими записями (для бенчмарков запросов)."""
+
+import random
+import time
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections, transaction
+from django.utils import timezone
+
+from logs_collector.models import LogEntry
+from logs_collector.search import index_log_entries
+from logs_collector.services import build_log_entry
+from logs_collector.synthetic import generate_event, generate_html, sample_size
+
+
+SEED_EMPLOYEE_PREFIX = 'seed-'
+
+
+class Command(BaseCommand):
+    """
+    Insert synthetic log entries with realistic distributions for query benchmarks.
+
+    Employees follow a Zipf-like distribution (a few employees produce most of the logs), URLs are
+    built from a small vocabulary over a handful of hosts, status codes are mostly 2xx/3xx and
+    received_at is spread uniformly over the last --days days. Entries go through build_log_entry,
+    so typed fields, payload storage and the search index are filled the same way as on ingestion.
+
+    On partitioned MySQL tables the partitions for the seeded range must exist (manage_log_partitions).
+    """
+
+    help = 'Заполняет таблицу логов синтетическими записями с реалистичными распределениями.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--count', type=int, default=100_000, help='Количество записей.')
+        parser.add_argument('--employees', type=int, default=200, help='Количество сотрудников.')
+        parser.add_argument('--days', type=int, default=30, help='Период received_at в днях до текущего момента.')
+        parser.add_argument('--html-median', type=int, default=2048, help='Медиана размера html, байт (0 - без html).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей в одной вставке.')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора.')
+        parser.add_argument('--delete', action='store_true', help='Удалить ранее созданные синтетические записи.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Insert entries batch by batch, then sync the employee dimension."""
+        if options['delete']:
+            deleted, _ = LogEntry.objects.filter(employee__startswith=SEED_EMPLOYEE_PREFIX).delete()
+            call_command('sync_employees', stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f'Done, {deleted} rows deleted'))
+            return
+        if options['count'] <= 0 or options['employees'] <= 0 or options['days'] <= 0:
+            raise CommandError('--count, --employees and --days must be positive')
+
+        rng = random.Random(options['seed'])
+        employees = [f'{SEED_EMPLOYEE_PREFIX}{number:04d}' for number in range(options['employees'])]
+        weights = [1 / (rank + 1) for rank in range(len(employees))]
+        median = options['html_median']
+        source = generate_html(median * 8, rng) if median else b''
+        now = timezone.now()
+        period = timedelta(days=options['days']).total_seconds()
+
+        created = 0
+        started = time.monotonic()
+        while created < options['count']:
+            entries = []
+            for sequence in range(created, min(created + options['batch_size'], options['count'])):
+                size = min(sample_size(rng, median, 1.0, len(source)), len(source))
+                offset = rng.randint(0, len(source) - size)
+                data = generate_event(rng, source[offset : offset + size], sequence, rng.choices(employees, weights)[0])
+                data['ip'] = f'10.{rng.randint(0, 3)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+                entries.append(build_log_entry(data, now - timedelta(seconds=rng.uniform(0, period))))
+
+            with transaction.atomic():
+                index_log_entries(LogEntry.objects.bulk_create(entries))
+            created += len(entries)
+            rate = created / max(time.monotonic() - started, 1e-9)
+            self.stdout.write(f'created={created} rows/s={rate:.0f}')
+
+        # На MySQL bulk_create не возвращает id, такие записи индексируются отдельно.
+        connection = connections[LogEntry.objects.db]
+        if settings.SEARCH_INDEX_ENABLED and not connection.features.can_return_rows_from_bulk_insert:
+            call_command('rebuild_search_index', missing=True, stdout=self.stdout)
+        call_command('sync_employees', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Done, {created} entries created'))
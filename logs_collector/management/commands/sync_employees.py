@@ -0,0 +1,42 @@
+"""Команда для пересчёта справочника сотрудников по таблице логов."""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count, Max
+
+from logs_collector.models import Employee, LogEntry
+
+
+class Command(BaseCommand):
+    """Recalculate Employee rows and entry counters from LogEntry, e.g. after old logs are deleted."""
+
+    help = 'Пересчитывает справочник сотрудников и количество их записей по таблице логов.'
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Upsert counters for every employee found in the logs and remove employees without logs."""
+        rows = (
+            LogEntry.objects.exclude(employee='')
+            .order_by()
+            .values('employee')
+            .annotate(entries_count=Count('id'), last_seen_at=Max('received_at'))
+        )
+        employees = [
+            Employee(name=row['employee'], entries_count=row['entries_count'], last_seen_at=row['last_seen_at'])
+            for row in rows
+        ]
+
+        connection = connections[Employee.objects.db]
+        with transaction.atomic():
+            Employee.objects.bulk_create(
+                employees,
+                batch_size=1000,
+                update_conflicts=True,
+                update_fields=['entries_count', 'last_seen_at'],
+                # MySQL обновляет по любому уникальному ключу и не принимает список полей.
+                unique_fields=['name'] if connection.features.supports_update_conflicts_with_target else None,
+            )
+            deleted, _ = Employee.objects.exclude(name__in=[employee.name for employee in employees]).delete()
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {len(employees)} employees synced, {deleted} removed'))
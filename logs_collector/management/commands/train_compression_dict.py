@@ -0,0 +1,48 @@
+"""Команда для обучения словаря сжатия html."""
+
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from logs_collector.compression import ZLIB_MAX_DICT_SIZE, save_dict, zstandard
+from logs_collector.models import LogEntry
+
+
+class Command(BaseCommand):
+    """Train an html compression dictionary from recent log entries."""
+
+    help = 'Обучает словарь сжатия html по последним записям и выводит его идентификатор.'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument('--samples', type=int, default=2000, help='Количество html для обучения.')
+        parser.add_argument('--size', type=int, default=112 * 1024, help='Размер словаря zstd в байтах.')
+        parser.add_argument('--sample-bytes', type=int, default=64 * 1024, help='Байт, берущихся из каждого html.')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Collect samples and write the dictionary into PAYLOAD_COMPRESSION_DICT_DIR."""
+        entries = (
+            LogEntry.objects.filter(html_size__gt=0)
+            .order_by('-id')
+            .only('id', 'html', 'html_hash', 'html_codec')[: options['samples']]
+        )
+        samples = [entry.get_payload('html', options['sample_bytes']) for entry in entries.iterator()]
+        if not samples:
+            raise CommandError('Нет записей с html для обучения словаря')
+
+        if settings.PAYLOAD_COMPRESSION == 'zstd':
+            if zstandard is None:
+                raise CommandError('Для словаря zstd установите пакет zstandard')
+            dict_data = zstandard.train_dictionary(options['size'], samples).as_bytes()
+        else:
+            # zlib использует последние 32 КБ словаря: кладём туда начала страниц с общей разметкой.
+            dict_data = b''.join(sample[:1024] for sample in samples)[-ZLIB_MAX_DICT_SIZE:]
+
+        dict_id = save_dict(dict_data)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Dictionary {dict_id} ({len(dict_data)} bytes, {len(samples)} samples). '
+                f'Set PAYLOAD_COMPRESSION_HTML_DICT={dict_id} to use it.'
+            )
+        )
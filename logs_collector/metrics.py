@@ -0,0 +1,265 @@
+"""
+Метрики приёма и просмотра логов в текстовом формате Prometheus.
+
+Счётчики и гистограммы хранятся в памяти процесса: при нескольких рабочих процессах каждый отдаёт
+на /metrics свои значения. METRICS_MODE: 'off' - ничего не записывается, 'basic' - этапы обработки,
+размеры полезных нагрузок, счётчики запросов и логов (несколько вызовов perf_counter и захватов
+блокировки на запрос, можно держать включённым под нагрузкой), 'full' - дополнительно количество
+и время запросов к базе на каждый HTTP-запрос (каждый SQL-запрос проходит через обёртку).
+Глубина очереди RECEIVER_SPOOL_DIR общая для всех процессов и считывается при выдаче метрик.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+
+from logs_collector.spool import get_cached_spool_depth
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+
+MODE_OFF = 'off'
+MODE_BASIC = 'basic'
+MODE_FULL = 'full'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы гистограмм: длительности в секундах, размеры в байтах, количество запросов к базе.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(4**power * 256 for power in range(10))
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+MODE_LEVELS = {MODE_OFF: 0, MODE_BASIC: 1, MODE_FULL: 2}
+
+
+def is_enabled(mode: str = MODE_BASIC) -> bool:
+    """Проверяет, что метрики включены в режиме mode или более подробном."""
+    return MODE_LEVELS.get(settings.METRICS_MODE, 0) >= MODE_LEVELS[mode]
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """Base class for a metric family with a fixed set of label names."""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        """Initialize the metric and register it."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        """Return the metric family in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple[str, ...], value: Any) -> list[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}']
+
+    def clear(self) -> None:
+        """Reset all values."""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """Increase the counter for the labels."""
+        if not is_enabled():
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """Histogram with cumulative buckets, sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = ()
+    ) -> None:
+        """Initialize the histogram with upper bounds of the buckets (+Inf is added)."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets or LATENCY_BUCKETS)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Record one observation for the labels."""
+        if not is_enabled():
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            # [счётчики по корзинам (последняя - +Inf), сумма, количество]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the duration of the with block in seconds."""
+        if not is_enabled():
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key: tuple[str, ...], value: Any) -> list[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, '+Inf'), counts, strict=True):
+            cumulative += bucket_count
+            le = bound if isinstance(bound, str) else _format_number(bound)
+            labels = _format_labels(self.labelnames, key, f'le="{le}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_number(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Gauge(Metric):
+    """Gauge without labels whose value is read from a callback when the metrics are rendered."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]) -> None:
+        """Initialize the gauge with the callback returning its current value."""
+        super().__init__(name, documentation)
+        self.function = function
+
+    def render(self) -> list[str]:
+        """Return the gauge with the current value of the callback."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        if is_enabled():
+            lines.extend(self._render_value((), self.function()))
+        return lines
+
+
+REGISTRY: list[Metric] = []
+
+STAGE_SECONDS = Histogram(
+    'logs_collector_stage_seconds',
+    'Duration of request processing stages: body_read, json_parse, base64_decode, html_delta, db_insert, '
+    'list_query, template_render, csv_export, archive_export.',
+    ('stage',),
+)
+PAYLOAD_BYTES = Histogram(
+    'logs_collector_payload_bytes', 'Decoded payload size of received logs.', ('field',), SIZE_BUCKETS
+)
+BODY_BYTES = Histogram('logs_collector_request_body_bytes', 'Size of /receiver request bodies.', (), SIZE_BUCKETS)
+INGESTED_ENTRIES = Counter('logs_collector_ingested_entries_total', 'Log entries stored.', ('employee',))
+FAILED_LOGS = Counter(
+    'logs_collector_failed_logs_total', 'Failed log bodies by outcome: stored, repeated, dropped.', ('outcome',)
+)
+DEDUP_CHECKS = Counter(
+    'logs_collector_dedup_total',
+    'Dedup checks of received events by result: memory_hit, db_hit, race_hit (duplicates) and miss.',
+    ('result',),
+)
+HTML_SNAPSHOTS = Counter(
+    'logs_collector_html_snapshots_total',
+    'Html payloads stored against a base snapshot of the same url by result: delta, new_base.',
+    ('result',),
+)
+REQUESTS = Counter('logs_collector_requests_total', 'HTTP requests by view and status code.', ('view', 'status'))
+REQUEST_SECONDS = Histogram('logs_collector_request_seconds', 'HTTP request duration by view.', ('view',))
+DB_QUERIES = Histogram(
+    'logs_collector_db_queries_per_request', 'SQL queries per HTTP request (full mode).', ('view',), COUNT_BUCKETS
+)
+DB_SECONDS = Histogram(
+    'logs_collector_db_seconds_per_request', 'Time spent in SQL queries per HTTP request (full mode).', ('view',)
+)
+SPOOL_DEPTH = Gauge('logs_collector_spool_depth', 'Events waiting in the write-behind spool.', get_cached_spool_depth)
+
+
+def observe_stage(stage: str) -> Any:
+    """Возвращает контекстный менеджер, замеряющий длительность этапа stage."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def timed_iterator(iterator: Iterator[Any], stage: str) -> Iterator[Any]:
+    """Оборачивает итератор, записывая время получения всех его элементов как один этап."""
+    if not is_enabled():
+        yield from iterator
+        return
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        # Записываем и при обрыве выгрузки (клиент закрыл соединение).
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries and their total duration."""
+
+    def __init__(self) -> None:
+        """Initialize the counters."""
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:
+        """Execute the query and account for it."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def render_metrics() -> str:
+    """Возвращает все метрики в текстовом формате Prometheus."""
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
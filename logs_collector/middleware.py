@@ -1,48 +1,386 @@
-"""Middleware for basic authentication in Django."""
+"""Middleware for basic authentication, request metrics and profiling."""
 
 import base64
+import cProfile
+import random
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import AbstractContextManager, asynccontextmanager, nullcontext
 
-from django.contrib.auth import authenticate, login
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, authenticate, get_user_model, login
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.core.cache import cache
+from django.db import connection
 from django.http import HttpResponse
 from django.http.request import HttpRequest
+from django.utils.crypto import salted_hmac
+
+from logs_collector.metrics import (
+    DB_QUERIES,
+    DB_SECONDS,
+    MODE_FULL,
+    REQUEST_SECONDS,
+    REQUESTS,
+    QueryCounter,
+    is_enabled,
+)
+from logs_collector.profiling import QueryLog, get_stack_sampler, save_profile
+
+
+CREDENTIALS_CACHE_PREFIX = 'basic-auth:'
+# Эндпоинты без базовой аутентификации: приём логов от расширения.
+AUTH_EXEMPT_PATHS = ('/receiver',)
+# Метрики без базовой аутентификации, только если задан METRICS_TOKEN (проверяется представлением).
+METRICS_PATH = '/metrics'
+# Страницы самих отчётов профилирования и метрики не профилируются.
+PROFILING_EXEMPT_PATHS = ('/admin/profiles', '/metrics')
+
+
+def _enter_execute_wrapper(wrapper: Callable) -> AbstractContextManager:
+    """Install a database execute wrapper on the connection of the current thread and return its context."""
+    context = connection.execute_wrapper(wrapper)
+    context.__enter__()
+    return context
+
+
+@asynccontextmanager
+async def _sync_execute_wrapper(wrapper: Callable) -> AsyncIterator[None]:
+    """
+    Install a database execute wrapper for the sync code an async request runs through sync_to_async.
+
+    Connections are per thread, so the wrapper is installed on the connection of the thread-sensitive
+    executor of the request rather than of the event loop thread.
+    """
+    context = await sync_to_async(_enter_execute_wrapper)(wrapper)
+    try:
+        yield
+    finally:
+        await sync_to_async(context.__exit__)(None, None, None)
 
 
 class BasicAuthMiddleware:
-    """Middleware for basic authentication in Django."""
+    """
+    Middleware for basic authentication in Django.
+
+    Verified credentials are cached under a salted digest of the Authorization header for
+    BASIC_AUTH_CACHE_TIMEOUT seconds, so the password hash is checked once per timeout instead of
+    on every request, and the user is logged in only when the session does not already hold them.
+    Failed attempts are never cached, and logging out drops the cached credentials. /metrics is exempt
+    only when METRICS_TOKEN is set, so metrics are never exposed without a credential. In the async
+    handler chain exempt endpoints (the async receiver) are passed on without leaving the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response: callable) -> None:
         """Initialize the middleware."""
         self.get_response = get_response
         self.realm = 'Restricted Area'
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
         """Process the request and apply basic authentication."""
-        # Пропускаем аутентификацию для эндпоинта /receiver.
-        if request.path.startswith('/receiver'):
-            return self.get_response(request)
+        if self.async_mode:
+            return self.__acall__(request)
+        if (rejection := self._authenticate(request)) is not None:
+            return rejection
+        return self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        """Process the request in the async handler chain; exempt endpoints stay on the event loop."""
+        if self._is_exempt(request):
+            return await self.get_response(request)
+        # Проверка обращается к кешу, сессии и базе, поэтому выполняется в потоке.
+        if (rejection := await sync_to_async(self._authenticate)(request)) is not None:
+            return rejection
+        return await self.get_response(request)
+
+    def _authenticate(self, request: HttpRequest) -> HttpResponse | None:
+        """Apply basic authentication, return an unauthorized response or None if the request may proceed."""
+        if self._is_exempt(request):
+            return None
 
         auth = request.META.get('HTTP_AUTHORIZATION')
         if auth is None or not auth.startswith('Basic '):
             return self._unauthorized_response()
+
+        cache_key = self._get_cache_key(auth)
+        if not self._login_cached(request, cache_key) and not self._login(request, auth, cache_key):
+            return self._unauthorized_response()
+        return None
+
+    @staticmethod
+    def _is_exempt(request: HttpRequest) -> bool:
+        """Check if the endpoint is not behind basic auth: /receiver, and /metrics when METRICS_TOKEN is set."""
+        if request.path.startswith(METRICS_PATH):
+            return bool(settings.METRICS_TOKEN)
+        return request.path.startswith(AUTH_EXEMPT_PATHS)
+
+    @staticmethod
+    def _get_cache_key(auth: str) -> str:
+        """Return the cache key for the Authorization header (the header itself is never stored)."""
+        return CREDENTIALS_CACHE_PREFIX + salted_hmac(CREDENTIALS_CACHE_PREFIX, auth).hexdigest()
+
+    def _login_cached(self, request: HttpRequest, cache_key: str) -> bool:
+        """Accept credentials verified earlier; log the user in only if the session is not theirs yet."""
+        if not settings.BASIC_AUTH_CACHE_TIMEOUT:
+            return False
+        cached = cache.get(cache_key)
+        if cached is None:
+            return False
+
+        user_id, backend, session_hash = cached
+        if self._is_logged_in(request, user_id, session_hash):
+            return True
+
+        user = get_user_model()._default_manager.filter(pk=user_id).first()
+        # Пароль сменили или пользователя отключили - проверяем учётные данные заново.
+        if user is None or not user.is_active or user.get_session_auth_hash() != session_hash:
+            cache.delete(cache_key)
+            return False
+        login(request, user, backend)
+        return True
+
+    def _login(self, request: HttpRequest, auth: str, cache_key: str) -> bool:
+        """Verify credentials from the Authorization header and log the user in."""
         # Декодируем и проверяем логин/пароль.
         encoded_credentials = auth.split(' ')[1]
         try:
             decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
         except Exception:
-            return self._unauthorized_response()
+            return False
         username, sep, password = decoded_credentials.partition(':')
         if not sep:
-            return self._unauthorized_response()
+            return False
         user = authenticate(request, username=username, password=password)
         if user is None:
-            return self._unauthorized_response()
+            return False
+
+        user_id, session_hash = self._get_user_id(user), user.get_session_auth_hash()
         # Логиним пользователя в сессии, чтобы Django понимал, что он авторизован
-        login(request, user)
+        if not self._is_logged_in(request, user_id, session_hash):
+            login(request, user)
+        if settings.BASIC_AUTH_CACHE_TIMEOUT:
+            cache.set(cache_key, (user_id, user.backend, session_hash), settings.BASIC_AUTH_CACHE_TIMEOUT)
+        return True
 
-        return self.get_response(request)
+    @staticmethod
+    def _get_user_id(user: AbstractBaseUser) -> str:
+        """Return the user id the way login() stores it in the session."""
+        return user._meta.pk.value_to_string(user)
+
+    @staticmethod
+    def _is_logged_in(request: HttpRequest, user_id: str, session_hash: str) -> bool:
+        """Check that the session already belongs to the user with the same password."""
+        session = request.session
+        return session.get(SESSION_KEY) == user_id and session.get(HASH_SESSION_KEY) == session_hash
 
     def _unauthorized_response(self) -> HttpResponse:
         """Return an unauthorized response with a WWW-Authenticate header."""
         response = HttpResponse('Unauthorized', status=401)
         response['WWW-Authenticate'] = f'Basic realm="{self.realm}"'
         return response
+
+
+def forget_cached_credentials(sender: type, request: HttpRequest | None = None, **kwargs: object) -> None:
+    """Drop the credentials of the request's Authorization header from the cache when the user logs out."""
+    auth = request.META.get('HTTP_AUTHORIZATION', '') if request is not None else ''
+    if auth.startswith('Basic '):
+        cache.delete(BasicAuthMiddleware._get_cache_key(auth))
+
+
+class MetricsMiddleware:
+    """
+    Middleware that records request counts and durations per view.
+
+    In the full metrics mode it also counts SQL queries and their total time per request.
+    Streaming responses are timed until the response object is returned, not until the body is sent.
+    The middleware runs in the mode of the handler chain, so async views are not moved to a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: callable) -> None:
+        """Initialize the middleware."""
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        """Process the request and record its metrics."""
+        if self.async_mode:
+            return self.__acall__(request)
+        if not is_enabled():
+            return self.get_response(request)
+
+        queries = QueryCounter() if is_enabled(MODE_FULL) else None
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries) if queries is not None else nullcontext():
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        """Process the request in the async handler chain and record its metrics."""
+        if not is_enabled():
+            return await self.get_response(request)
+
+        queries = QueryCounter() if is_enabled(MODE_FULL) else None
+        started = time.perf_counter()
+        async with _sync_execute_wrapper(queries) if queries is not None else nullcontext():
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def _record(request: HttpRequest, response: HttpResponse, elapsed: float, queries: QueryCounter | None) -> None:
+        """Record the request count, duration and SQL statistics under the view name."""
+        # Запросы, отклонённые до разбора URL (например, без аутентификации), учитываются отдельно.
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'unresolved'
+        REQUESTS.inc(view=view, status=response.status_code)
+        REQUEST_SECONDS.observe(elapsed, view=view)
+        if queries is not None:
+            DB_QUERIES.observe(queries.count, view=view)
+            DB_SECONDS.observe(queries.duration, view=view)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in middleware that captures profiles of slow or randomly sampled requests.
+
+    A PROFILING_SAMPLE_RATE fraction of requests runs under cProfile and is always saved. Other requests
+    are stack-sampled by a background thread when PROFILING_SLOW_THRESHOLD is set, and saved only if they
+    took longer than the threshold. The SQL executed by the request is saved with the profile.
+    For synchronous streaming responses (the CSV export) profiling continues until the content is sent.
+    In the async handler chain the event loop thread is shared by concurrent requests, so only the
+    duration and the SQL of the request are saved, without cProfile statistics or stack samples.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: callable) -> None:
+        """Initialize the middleware."""
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        """Process the request under the profiler or the stack sampler."""
+        if self.async_mode:
+            return self.__acall__(request)
+        capture = self._get_capture(request, threaded=True)
+        if capture is None:
+            return self.get_response(request)
+
+        with capture:
+            response = self.get_response(request)
+        capture.status = response.status_code
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = capture.wrap(response.streaming_content)
+        else:
+            capture.finish()
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        """Process the request in the async handler chain, recording its duration and SQL."""
+        capture = self._get_capture(request, threaded=False)
+        if capture is None:
+            return await self.get_response(request)
+
+        async with capture:
+            response = await self.get_response(request)
+        capture.status = response.status_code
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = capture.wrap(response.streaming_content)
+        else:
+            await sync_to_async(capture.finish)()
+        return response
+
+    @staticmethod
+    def _get_capture(request: HttpRequest, threaded: bool) -> '_ProfileCapture | None':
+        """Return the capture for a sampled request or for slow request detection, None if not profiled."""
+        if not settings.PROFILING_ENABLED or request.path.startswith(PROFILING_EXEMPT_PATHS):
+            return None
+        sampled = random.random() < settings.PROFILING_SAMPLE_RATE
+        if not sampled and settings.PROFILING_SLOW_THRESHOLD <= 0:
+            return None
+        return _ProfileCapture(request, sampled, threaded)
+
+
+class _ProfileCapture:
+    """Profiler or stack sampler and SQL log of one request, resumable while streaming the response."""
+
+    def __init__(self, request: HttpRequest, sampled: bool, threaded: bool) -> None:
+        """Initialize the capture; cProfile and the stack sampler are used only if the request owns its thread."""
+        self.request_line = f'{request.method} {request.get_full_path()}'
+        self.sampled = sampled
+        self.profiler = cProfile.Profile() if sampled and threaded else None
+        self.sample_stacks = threaded and not sampled
+        self.queries = QueryLog()
+        self.stacks = None
+        self.status = 0
+        self.elapsed = 0.0
+        self._wrapper = None
+
+    def __enter__(self) -> None:
+        """Start capturing in the current thread."""
+        self._started = time.perf_counter()
+        self._wrapper = _enter_execute_wrapper(self.queries)
+        if self.profiler is not None:
+            self.profiler.enable()
+        elif self.sample_stacks:
+            # При возобновлении во время отдачи потока выборки продолжают тот же счётчик.
+            self.stacks = get_stack_sampler().start(self.stacks)
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Pause capturing."""
+        if self.profiler is not None:
+            self.profiler.disable()
+        elif self.sample_stacks:
+            get_stack_sampler().stop()
+        self._wrapper.__exit__(*exc_info)
+        self.elapsed += time.perf_counter() - self._started
+
+    async def __aenter__(self) -> None:
+        """Start recording the duration and the SQL of an async request."""
+        self._started = time.perf_counter()
+        self._wrapper = await sync_to_async(_enter_execute_wrapper)(self.queries)
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Pause recording the async request."""
+        await sync_to_async(self._wrapper.__exit__)(*exc_info)
+        self.elapsed += time.perf_counter() - self._started
+
+    def wrap(self, content: Iterator[bytes]) -> Iterator[bytes]:
+        """Capture the generation of streaming content and finish when it is exhausted or closed."""
+        try:
+            while True:
+                with self:
+                    chunk = next(content, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.finish()
+
+    def finish(self) -> None:
+        """Save the capture if the request was sampled or slow."""
+        if self.sampled:
+            reason = 'sampled'
+        elif self.elapsed >= settings.PROFILING_SLOW_THRESHOLD:
+            reason = 'slow'
+        else:
+            return
+        save_profile(self.request_line, self.status, self.elapsed, reason, self.queries, self.profiler, self.stacks)
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:01
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Length
+
+
+def fill_payload_sizes(apps, schema_editor):
+    """Заполняет размеры полезных нагрузок для существующих записей."""
+    LogEntry = apps.get_model('logs_collector', 'LogEntry')
+    LogEntry.objects.update(
+        request_body_size=Coalesce(Length('request_body'), 0),
+        response_size=Coalesce(Length('response'), 0),
+        html_size=Coalesce(Length('html'), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0002_logentry_employee'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logentry',
+            name='html_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='html_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='request_body_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='request_body_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='response_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='response_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_payload_sizes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0003_logentry_payload_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logentry',
+            name='html_codec',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='request_body_codec',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='response_codec',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Поля записи на момент миграции, текст которых попадает в индекс (как logs_collector.search.SEARCH_TEXT_FIELDS).
+SEARCH_TEXT_FIELDS = (
+    'url',
+    'initiator',
+    'source',
+    'employee',
+    'method',
+    'type',
+    'status_code',
+    'time',
+    'tab_id',
+    'request_id',
+    'response_time',
+)
+BATCH_SIZE = 1000
+
+
+def fill_search_index(apps, schema_editor):
+    """
+    Заполняет индекс по существующим записям пакетами по BATCH_SIZE записей в порядке id.
+
+    При выключенном SEARCH_INDEX_ENABLED индекс не заполняется: перед включением нужно
+    выполнить rebuild_search_index.
+    """
+    if not settings.SEARCH_INDEX_ENABLED:
+        return
+    LogEntry = apps.get_model('logs_collector', 'LogEntry')
+    LogSearchIndex = apps.get_model('logs_collector', 'LogSearchIndex')
+    db_alias = schema_editor.connection.alias
+    entries = LogEntry.objects.using(db_alias).order_by('id').values_list('id', *SEARCH_TEXT_FIELDS)
+    last_id = 0
+    while batch := list(entries.filter(id__gt=last_id)[:BATCH_SIZE]):
+        LogSearchIndex.objects.using(db_alias).bulk_create(
+            LogSearchIndex(entry_id=entry_id, text=' '.join(str(value) for value in values if value))
+            for entry_id, *values in batch
+        )
+        last_id = batch[-1][0]
+
+
+def create_fulltext_index(apps, schema_editor):
+    """Создаёт индекс FULLTEXT по тексту поискового индекса на MySQL/MariaDB."""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    # Без стоп-слов: иначе в индекс не попадают части URL вроде www и com.
+    schema_editor.execute('SET SESSION innodb_ft_enable_stopword = 0')
+    schema_editor.execute(
+        'CREATE FULLTEXT INDEX logs_collector_logsearchindex_text_ft ON logs_collector_logsearchindex (text)'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    """Удаляет индекс FULLTEXT."""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('DROP INDEX logs_collector_logsearchindex_text_ft ON logs_collector_logsearchindex')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0004_logentry_payload_codecs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogSearchIndex',
+            fields=[
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='logs_collector.logentry')),
+                ('text', models.TextField(blank=True, default='')),
+            ],
+        ),
+        # Индекс FULLTEXT строится после заполнения таблицы, а не обновляется на каждую вставку.
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+from logs_collector.blob_store import read_blob
+from logs_collector.compression import decompress
+from logs_collector.search import extract_body_text, extract_html_text
+
+
+FULLTEXT_FIELDS = ('html_text', 'request_body_text')
+PAYLOAD_COLUMNS = tuple(f'{name}{suffix}' for name in ('html', 'request_body') for suffix in ('', '_hash', '_codec'))
+BATCH_SIZE = 200
+
+
+def read_payload(data, digest, codec):
+    """Возвращает первые SEARCH_MAX_PAYLOAD_SIZE байт полезной нагрузки, как LogEntry.get_payload."""
+    limit = settings.SEARCH_MAX_PAYLOAD_SIZE
+    if digest:
+        return decompress(codec, read_blob(digest, None if codec else limit), limit)
+    return decompress(codec, bytes(data or b''), limit)
+
+
+def fill_payload_text(apps, schema_editor):
+    """
+    Заполняет текст html и request_body у строк индекса пакетами по BATCH_SIZE записей в порядке id.
+
+    При выключенном SEARCH_INDEX_ENABLED индекс не заполняется: перед включением нужно
+    выполнить rebuild_search_index.
+    """
+    if not settings.SEARCH_INDEX_ENABLED:
+        return
+    LogEntry = apps.get_model('logs_collector', 'LogEntry')
+    LogSearchIndex = apps.get_model('logs_collector', 'LogSearchIndex')
+    db_alias = schema_editor.connection.alias
+    entries = LogEntry.objects.using(db_alias).order_by('id').values_list('id', *PAYLOAD_COLUMNS)
+    last_id = 0
+    while batch := list(entries.filter(id__gt=last_id)[:BATCH_SIZE]):
+        rows = [
+            LogSearchIndex(
+                entry_id=entry_id,
+                html_text=extract_html_text(read_payload(html, html_hash, html_codec)),
+                request_body_text=extract_body_text(read_payload(body, body_hash, body_codec)),
+            )
+            for entry_id, html, html_hash, html_codec, body, body_hash, body_codec in batch
+        ]
+        LogSearchIndex.objects.using(db_alias).bulk_update(rows, FULLTEXT_FIELDS)
+        last_id = batch[-1][0]
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    """Создаёт индексы FULLTEXT по извлечённому тексту на MySQL/MariaDB."""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('SET SESSION innodb_ft_enable_stopword = 0')
+    for field in FULLTEXT_FIELDS:
+        schema_editor.execute(
+            f'CREATE FULLTEXT INDEX logs_collector_logsearchindex_{field}_ft ON logs_collector_logsearchindex ({field})'
+        )
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    """Удаляет индексы FULLTEXT."""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for field in FULLTEXT_FIELDS:
+        schema_editor.execute(f'DROP INDEX logs_collector_logsearchindex_{field}_ft ON logs_collector_logsearchindex')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0005_logsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logsearchindex',
+            name='html_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='logsearchindex',
+            name='request_body_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunPython(fill_payload_text, migrations.RunPython.noop),
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+    ]
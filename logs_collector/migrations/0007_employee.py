@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:13
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def fill_employees(apps, schema_editor):
+    """Заполняет справочник сотрудников по существующим логам."""
+    Employee = apps.get_model('logs_collector', 'Employee')
+    LogEntry = apps.get_model('logs_collector', 'LogEntry')
+    rows = (
+        LogEntry.objects.exclude(employee='')
+        .order_by()
+        .values('employee')
+        .annotate(entries_count=Count('id'), last_seen_at=Max('received_at'))
+    )
+    Employee.objects.bulk_create(
+        [Employee(name=row['employee'], entries_count=row['entries_count'], last_seen_at=row['last_seen_at']) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0006_logsearchindex_payload_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('entries_count', models.PositiveBigIntegerField(default=0)),
+                ('last_seen_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ('name',),
+            },
+        ),
+        migrations.RunPython(fill_employees, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0007_employee'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logsearchindex',
+            name='entry',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='logs_collector.logentry'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0008_logsearchindex_no_fk'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='logentry',
+            name='logs_collec_ip_addr_5cb65e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='logentry',
+            name='logs_collec_receive_9b2eff_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='logentry',
+            name='logs_collec_url_6ffbe4_idx',
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='client_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='http_status',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='response_time_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='url_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['employee', 'received_at'], name='logs_collec_employe_3aa99f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['initiator'], name='logs_collec_initiat_4d75ac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['employee', 'initiator'], name='logs_collec_employe_646805_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['http_status', 'received_at'], name='logs_collec_http_st_900280_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['url_hash', 'received_at'], name='logs_collec_url_has_c65e49_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0009_logentry_typed_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logentry',
+            name='url_host',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='LogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], max_length=6)),
+                ('bucket', models.DateTimeField()),
+                ('employee', models.CharField(blank=True, default='', max_length=255)),
+                ('host', models.CharField(blank=True, default='', max_length=255)),
+                ('method', models.CharField(blank=True, default='', max_length=10)),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('status_2xx', models.PositiveIntegerField(default=0)),
+                ('status_3xx', models.PositiveIntegerField(default=0)),
+                ('status_4xx', models.PositiveIntegerField(default=0)),
+                ('status_5xx', models.PositiveIntegerField(default=0)),
+                ('status_other', models.PositiveIntegerField(default=0)),
+                ('payload_bytes', models.PositiveBigIntegerField(default=0)),
+                ('response_time_count', models.PositiveIntegerField(default=0)),
+                ('response_time_sum', models.FloatField(default=0)),
+                ('response_time_le_10', models.PositiveIntegerField(default=0)),
+                ('response_time_le_25', models.PositiveIntegerField(default=0)),
+                ('response_time_le_50', models.PositiveIntegerField(default=0)),
+                ('response_time_le_100', models.PositiveIntegerField(default=0)),
+                ('response_time_le_250', models.PositiveIntegerField(default=0)),
+                ('response_time_le_500', models.PositiveIntegerField(default=0)),
+                ('response_time_le_1000', models.PositiveIntegerField(default=0)),
+                ('response_time_le_2500', models.PositiveIntegerField(default=0)),
+                ('response_time_le_5000', models.PositiveIntegerField(default=0)),
+                ('response_time_le_10000', models.PositiveIntegerField(default=0)),
+                ('response_time_le_inf', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('period', 'bucket'),
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'employee', 'host', 'method'), name='logs_collector_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:26
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_last_seen_at(apps, schema_editor):
+    """Существующие записи последний раз встречались при получении."""
+    FailedLogEntry = apps.get_model('logs_collector', 'FailedLogEntry')
+    FailedLogEntry.objects.update(last_seen_at=F('received_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0010_logrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='failedlogentry',
+            name='body_digest',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='failedlogentry',
+            name='dropped_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='failedlogentry',
+            name='last_seen_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='failedlogentry',
+            name='raw_data_codec',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='failedlogentry',
+            name='raw_data_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='failedlogentry',
+            name='raw_data_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='failedlogentry',
+            name='repeat_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='failedlogentry',
+            index=models.Index(fields=['body_digest', 'received_at'], name='logs_collec_body_di_a5e435_idx'),
+        ),
+        migrations.RunPython(fill_last_seen_at, migrations.RunPython.noop),
+    ]
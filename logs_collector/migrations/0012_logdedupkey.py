@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0011_failedlogentry_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogDedupKey',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0012_logdedupkey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HtmlSnapshotBase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=64)),
+                ('base_id', models.CharField(db_index=True, max_length=16)),
+                ('codec', models.CharField(max_length=32)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['url_hash', 'created_at'], name='logs_collec_url_has_c95db5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs_collector', '0013_htmlsnapshotbase'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogRollupStaleHour',
+            fields=[
+                ('bucket', models.DateTimeField(primary_key=True, serialize=False)),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
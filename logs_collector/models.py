@@ -1,8 +1,15 @@
 """Модели приложения logs_collector."""
 
+import io
+from typing import BinaryIO
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from logs_collector.blob_store import open_blob, put_blob, read_blob
+from logs_collector.compression import SNAPSHOT_SEPARATOR, compress_payload, decompress, open_decompressed
+
 
 class LogEntry(models.Model):
     """Модель для хранения записей логов."""
@@ -23,40 +30,293 @@ class LogEntry(models.Model):
     response_time = models.CharField(max_length=255, default='', blank=True)
     employee = models.CharField(max_length=255)
 
+    # Типизированные значения полей лога для фильтров по диапазону и агрегатов (None - не удалось разобрать).
+    http_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_time_ms = models.FloatField(null=True, blank=True)
+    client_time = models.DateTimeField(null=True, blank=True)
+    # sha256 от url для поиска по точному совпадению (по самому url индекс не строится).
+    url_hash = models.CharField(max_length=64, default='', blank=True)
+    url_host = models.CharField(max_length=255, default='', blank=True)
+
+    # Большие полезные нагрузки хранятся во внешнем хранилище, в таблице остаются хеш и размер.
+    # Кодек описывает сжатие сохранённых данных (пустая строка - без сжатия).
+    request_body_hash = models.CharField(max_length=64, default='', blank=True)
+    request_body_size = models.PositiveIntegerField(default=0)
+    request_body_codec = models.CharField(max_length=32, default='', blank=True)
+    response_hash = models.CharField(max_length=64, default='', blank=True)
+    response_size = models.PositiveIntegerField(default=0)
+    response_codec = models.CharField(max_length=32, default='', blank=True)
+    html_hash = models.CharField(max_length=64, default='', blank=True)
+    html_size = models.PositiveIntegerField(default=0)
+    html_codec = models.CharField(max_length=32, default='', blank=True)
+
     # Дополнительная информация.
     received_at = models.DateTimeField(default=timezone.now, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True, db_index=True)
 
+    PAYLOAD_FIELDS = ('request_body', 'response', 'html')
+
     class Meta:
         """Meta class for LogEntry model."""
 
         ordering = ('-received_at',)
+        # Индексы под сочетания фильтров и сортировок LogFilterForm (id в конец добавляет InnoDB).
         indexes = [
-            models.Index(fields=['ip_address']),
-            models.Index(fields=['received_at']),
-            models.Index(fields=['url']),
+            models.Index(fields=['employee', 'received_at']),
+            models.Index(fields=['initiator']),
+            models.Index(fields=['employee', 'initiator']),
+            models.Index(fields=['http_status', 'received_at']),
+            models.Index(fields=['url_hash', 'received_at']),
         ]
 
     def __str__(self) -> str:
         """Строковое представление для LogEntry."""
         return f'{self.ip_address} | {self.url} | {self.received_at:%Y-%m-%d %H:%M:%S}'
 
+    def set_payload(self, name: str, data: bytes, compressed: tuple[str, bytes] | None = None) -> None:
+        """
+        Сохраняет полезную нагрузку в таблицу или, если она больше порога, во внешнее хранилище.
+
+        Данные сжимаются по настройкам PAYLOAD_COMPRESSION, размер хранится несжатый. Уже сжатые данные
+        (кодек, данные) - например, разница html с базовым снимком - передаются в compressed; порог
+        внешнего хранилища для них сравнивается с размером сжатых данных.
+        """
+        setattr(self, f'{name}_size', len(data))
+        codec, stored = compressed or compress_payload(name, data)
+        setattr(self, f'{name}_codec', codec)
+        if settings.BLOB_STORE_ENABLED and len(data if compressed is None else stored) >= settings.BLOB_STORE_THRESHOLD:
+            setattr(self, f'{name}_hash', put_blob(stored))
+            setattr(self, name, None)
+        else:
+            setattr(self, f'{name}_hash', '')
+            setattr(self, name, stored)
+
+    def get_payload(self, name: str, limit: int | None = None) -> bytes:
+        """Возвращает распакованную полезную нагрузку целиком или первые limit байт."""
+        codec = getattr(self, f'{name}_codec')
+        digest = getattr(self, f'{name}_hash')
+        if digest:
+            # Несжатый блоб можно прочитать частично, сжатый читаем целиком и распаковываем начало.
+            return decompress(codec, read_blob(digest, None if codec else limit), limit)
+        return decompress(codec, bytes(getattr(self, name) or b''), limit)
+
+    def open_payload(self, name: str) -> BinaryIO:
+        """Открывает распакованную полезную нагрузку на чтение для потоковой отдачи."""
+        digest = getattr(self, f'{name}_hash')
+        if digest:
+            source = open_blob(digest)
+        else:
+            source = io.BytesIO(bytes(getattr(self, name) or b''))
+        return open_decompressed(getattr(self, f'{name}_codec'), source)
+
+
+class Employee(models.Model):
+    """
+    Справочник сотрудников, от которых приходят логи.
+
+    Пополняется при приёме логов и используется для фильтра по сотруднику вместо DISTINCT по всей таблице логов.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    entries_count = models.PositiveBigIntegerField(default=0)
+    last_seen_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        """Meta class for Employee model."""
+
+        ordering = ('name',)
+
+    def __str__(self) -> str:
+        """Строковое представление для Employee."""
+        return self.name
+
+
+class LogDedupKey(models.Model):
+    """
+    Ключ события (сотрудник, tabId, requestId) для отбрасывания повторов, присланных расширением при ретраях.
+
+    Таблица не секционируется: уникальный ключ секционированной таблицы логов должен включать received_at,
+    а у повтора он другой. Ключи старше RECEIVER_DEDUP_WINDOW не учитываются и удаляются командой
+    manage_log_partitions.
+    """
+
+    # sha256 от сотрудника, tabId и requestId.
+    key = models.CharField(max_length=64, primary_key=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self) -> str:
+        """Строковое представление для LogDedupKey."""
+        return f'{self.key} | {self.created_at:%Y-%m-%d %H:%M:%S}'
+
+
+class HtmlSnapshotBase(models.Model):
+    """
+    Базовый снимок html страницы, относительно которого хранятся следующие снимки html того же url.
+
+    Содержимое снимка хранится в файле HTML_SNAPSHOT_DIR, сжатом кодеком codec. Записи лога ссылаются
+    на снимок кодеком html_codec вида 'zstd+s:<base_id>', без внешнего ключа. Снимки, на которые
+    не может ссылаться ни одна запись, удаляются командой manage_log_partitions.
+    """
+
+    # sha256 от url, как LogEntry.url_hash.
+    url_hash = models.CharField(max_length=64)
+    # Идентификатор содержимого снимка (префикс sha256): одинаковые снимки разных url хранятся одним файлом.
+    base_id = models.CharField(max_length=16, db_index=True)
+    codec = models.CharField(max_length=32)
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        """Meta class for HtmlSnapshotBase model."""
+
+        indexes = [
+            models.Index(fields=['url_hash', 'created_at']),
+        ]
+
+    def __str__(self) -> str:
+        """Строковое представление для HtmlSnapshotBase."""
+        return f'{self.url_hash[:16]} | {self.base_id} | {self.created_at:%Y-%m-%d %H:%M:%S}'
+
+    @property
+    def delta_codec(self) -> str:
+        """Кодек html записей, сохранённых разницей с этим снимком."""
+        return f'{self.codec}{SNAPSHOT_SEPARATOR}{self.base_id}'
+
+
+class LogRollup(models.Model):
+    """
+    Агрегаты логов за минуту или час по сотруднику, хосту URL и методу.
+
+    Строятся командой refresh_log_rollups; статистика читает только эту таблицу.
+    Гистограмма времени ответа хранится счётчиками по интервалам rollups.RESPONSE_TIME_BOUNDS.
+    """
+
+    class Period(models.TextChoices):
+        """Rollup bucket sizes."""
+
+        MINUTE = 'minute'
+        HOUR = 'hour'
+
+    period = models.CharField(max_length=6, choices=Period.choices)
+    bucket = models.DateTimeField()
+    employee = models.CharField(max_length=255, default='', blank=True)
+    host = models.CharField(max_length=255, default='', blank=True)
+    method = models.CharField(max_length=10, default='', blank=True)
+
+    requests = models.PositiveIntegerField(default=0)
+    status_2xx = models.PositiveIntegerField(default=0)
+    status_3xx = models.PositiveIntegerField(default=0)
+    status_4xx = models.PositiveIntegerField(default=0)
+    status_5xx = models.PositiveIntegerField(default=0)
+    status_other = models.PositiveIntegerField(default=0)
+    payload_bytes = models.PositiveBigIntegerField(default=0)
+    response_time_count = models.PositiveIntegerField(default=0)
+    response_time_sum = models.FloatField(default=0)
+    # Количество ответов со временем не больше границы (и больше предыдущей границы), мс.
+    response_time_le_10 = models.PositiveIntegerField(default=0)
+    response_time_le_25 = models.PositiveIntegerField(default=0)
+    response_time_le_50 = models.PositiveIntegerField(default=0)
+    response_time_le_100 = models.PositiveIntegerField(default=0)
+    response_time_le_250 = models.PositiveIntegerField(default=0)
+    response_time_le_500 = models.PositiveIntegerField(default=0)
+    response_time_le_1000 = models.PositiveIntegerField(default=0)
+    response_time_le_2500 = models.PositiveIntegerField(default=0)
+    response_time_le_5000 = models.PositiveIntegerField(default=0)
+    response_time_le_10000 = models.PositiveIntegerField(default=0)
+    response_time_le_inf = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Meta class for LogRollup model."""
+
+        ordering = ('period', 'bucket')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'bucket', 'employee', 'host', 'method'], name='logs_collector_rollup_unique'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """Строковое представление для LogRollup."""
+        return f'{self.period} {self.bucket:%Y-%m-%d %H:%M} | {self.employee} | {self.host} | {self.requests}'
+
+
+class LogRollupStaleHour(models.Model):
+    """
+    Час, агрегаты которого нужно пересчитать: в него вставлены записи позже окна ROLLUP_RECOMPUTE_WINDOW.
+
+    Записи из очереди drain_log_spool и из архивов сохраняют исходный received_at и могут попасть в часы,
+    которые refresh_log_rollups уже не пересчитывает. Такие часы помечаются при вставке и пересчитываются
+    отдельно; пометка снимается, только если её не обновили во время пересчёта (marked_at).
+    """
+
+    bucket = models.DateTimeField(primary_key=True)
+    marked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        """Строковое представление для LogRollupStaleHour."""
+        return f'{self.bucket:%Y-%m-%d %H:%M} | {self.marked_at:%Y-%m-%d %H:%M:%S}'
+
+
+class LogSearchIndex(models.Model):
+    """
+    Текст записи лога для полнотекстового поиска.
+
+    Заполняется при приёме лога. На MySQL/MariaDB по каждому текстовому полю построен индекс FULLTEXT.
+    """
+
+    # Без внешнего ключа в базе: секционированные таблицы InnoDB их не поддерживают, строки удаляет Django
+    # или команда manage_log_partitions при удалении секций.
+    entry = models.OneToOneField(
+        LogEntry, on_delete=models.CASCADE, primary_key=True, related_name='search_index', db_constraint=False
+    )
+    text = models.TextField(default='', blank=True)
+    # Текст, извлечённый из полезных нагрузок (без разметки, нормализованные пробелы).
+    html_text = models.TextField(default='', blank=True)
+    request_body_text = models.TextField(default='', blank=True)
+
+    def __str__(self) -> str:
+        """Строковое представление для LogSearchIndex."""
+        return f'{self.entry_id} | {self.text[:80]}'
+
 
 class FailedLogEntry(models.Model):
-    """Модель для хранения неудачных попыток записи логов."""
+    """
+    Модель для хранения неудачных попыток записи логов.
 
+    Тело запроса целиком сжимается и хранится во внешнем хранилище, в таблице - начало тела и метаданные.
+    """
+
+    # Каталог файлов с телами записей, сохранённых до перехода на внешнее хранилище.
     FOLDER_NAME = 'unparsed_logs'
 
-    raw_data = models.TextField()  # если будет ошибка \"Data too long\", заменить на max_length=16777215
+    # Начало тела запроса для просмотра (у старых записей - тело целиком).
+    raw_data = models.TextField()
+    raw_data_hash = models.CharField(max_length=64, default='', blank=True)
+    raw_data_size = models.PositiveIntegerField(default=0)
+    raw_data_codec = models.CharField(max_length=32, default='', blank=True)
+    # sha256 несжатого тела для объединения повторов одной и той же ошибки.
+    body_digest = models.CharField(max_length=64, default='', blank=True)
     error_message = models.TextField()
     received_at = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
+    # Сколько раз тело с той же ошибкой приходило с того же IP и когда последний раз.
+    repeat_count = models.PositiveIntegerField(default=1)
+    last_seen_at = models.DateTimeField(default=timezone.now)
+    # Сколько ошибок с того же IP перед этой записью не сохранено из-за ограничения частоты.
+    dropped_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         """Meta class for FailedLogEntry model."""
 
         ordering = ('-received_at',)
+        indexes = [
+            models.Index(fields=['body_digest', 'received_at']),
+        ]
 
     def __str__(self) -> str:
         """Строковое представление для FailedLogEntry."""
         return f'FAILED {self.received_at:%Y-%m-%d %H:%M:%S} | {self.error_message[:80]}'
+
+    def open_raw_data(self) -> BinaryIO:
+        """Открывает распакованное тело запроса из внешнего хранилища на чтение."""
+        return open_decompressed(self.raw_data_codec, open_blob(self.raw_data_hash))
@@ -0,0 +1,166 @@
+"""Постраничная выборка по ключу (keyset) и оценка количества записей."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import json
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Model, Q
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from django.db.models import QuerySet
+
+
+CURSOR_AFTER = 'n'
+CURSOR_BEFORE = 'p'
+CURSOR_LAST = 'last'
+
+
+def get_keyset_q(field: str, value: Any, pk: int, descending: bool, after: bool = True) -> Q:
+    """
+    Возвращает условие для записей после (или до) записи (value, pk) при сортировке по (field, id).
+
+    Для убывающей сортировки «после» означает меньшие значения.
+    """
+    lookup = 'lt' if descending == after else 'gt'
+    return Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk})
+
+
+def encode_cursor(direction: str, value: Any = None, pk: int | None = None) -> str:
+    """Кодирует курсор страницы в строку для URL."""
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    raw = json.dumps([direction, value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list | None:
+    """Декодирует курсор, для повреждённого курсора возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, value, pk = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    return [direction, value, pk]
+
+
+def get_estimated_count(queryset: QuerySet) -> int:
+    """
+    Возвращает количество записей без COUNT(*) на каждый просмотр страницы.
+
+    Для выборки без фильтров на MySQL/MariaDB берётся оценка InnoDB из information_schema,
+    иначе точный COUNT(*) кешируется на PAGINATION_COUNT_CACHE_TIMEOUT секунд.
+    """
+    connection = connections[queryset.db]
+    if not queryset.query.where and connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None:
+            return row[0]
+
+    key = 'pagination-count:' + hashlib.sha256(str(queryset.query).encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+
+
+class KeysetPage:
+    """Page of keyset paginated entries with the attributes used by _paginator.html."""
+
+    is_keyset = True
+
+    def __init__(self, items: list[Model], next_cursor: str | None, previous_cursor: str | None) -> None:
+        """Store the page entries and the cursors of the neighbouring pages."""
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self) -> Iterator[Model]:
+        """Iterate over the page entries."""
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        """Return the number of entries on the page."""
+        return len(self.object_list)
+
+    @property
+    def last_cursor(self) -> str:
+        """Return the cursor of the last page."""
+        return encode_cursor(CURSOR_LAST)
+
+    def has_next(self) -> bool:
+        """Return True if there is a next page."""
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        """Return True if there is a previous page."""
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Paginator that seeks by (sort field, id) instead of OFFSET.
+
+    The cost of a page does not depend on its depth: every page is one indexed range query
+    of per_page + 1 rows.
+    """
+
+    def __init__(self, queryset: QuerySet, sort_field: str, descending: bool, per_page: int) -> None:
+        """Initialize the paginator with an unordered queryset and the sort order."""
+        self.queryset = queryset
+        self.sort_field = sort_field
+        self.descending = descending
+        self.per_page = per_page
+
+    def _order(self, reverse: bool = False) -> QuerySet:
+        prefix = '-' if self.descending != reverse else ''
+        return self.queryset.order_by(f'{prefix}{self.sort_field}', f'{prefix}id')
+
+    def _cursor(self, direction: str, entry: Model) -> str:
+        return encode_cursor(direction, getattr(entry, self.sort_field), entry.pk)
+
+    def get_page(self, cursor: str | None) -> KeysetPage:
+        """Return the page addressed by the cursor, the first page for an empty or invalid cursor."""
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is not None:
+            direction, value, pk = decoded
+            try:
+                value = self.queryset.model._meta.get_field(self.sort_field).to_python(value)
+            except ValidationError:
+                decoded = None
+
+        if decoded is None:
+            items = list(self._order()[: self.per_page + 1])
+            has_next, has_previous = len(items) > self.per_page, False
+        elif direction == CURSOR_AFTER:
+            keyset_q = get_keyset_q(self.sort_field, value, pk, self.descending, after=True)
+            items = list(self._order().filter(keyset_q)[: self.per_page + 1])
+            has_next, has_previous = len(items) > self.per_page, True
+        elif direction == CURSOR_BEFORE:
+            keyset_q = get_keyset_q(self.sort_field, value, pk, self.descending, after=False)
+            items = list(self._order(reverse=True).filter(keyset_q)[: self.per_page + 1])
+            has_next, has_previous = True, len(items) > self.per_page
+            items = items[: self.per_page][::-1]
+        else:
+            items = list(self._order(reverse=True)[: self.per_page + 1])
+            has_next, has_previous = False, len(items) > self.per_page
+            items = items[: self.per_page][::-1]
+
+        items = items[: self.per_page]
+        return KeysetPage(
+            items,
+            self._cursor(CURSOR_AFTER, items[-1]) if has_next and items else None,
+            self._cursor(CURSOR_BEFORE, items[0]) if has_previous and items else None,
+        )
@@ -0,0 +1,266 @@
+"""
+Секционирование таблиц логов по received_at и удаление устаревших данных.
+
+На MySQL/MariaDB таблицы LogEntry и FailedLogEntry делятся на секции RANGE COLUMNS(received_at)
+по дням или месяцам. Фильтры по received_at читают только подходящие секции, а устаревшие данные
+удаляются целыми секциями (DROP PARTITION) вместо долгого DELETE.
+На остальных базах устаревшие строки удаляются пакетами. После удаления записей из внешнего хранилища
+удаляются блобы, на которые они ссылались.
+"""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, Min, When
+from django.utils import timezone
+
+from logs_collector.blob_store import delete_unreferenced_blobs
+from logs_collector.models import Employee, FailedLogEntry, LogEntry, LogSearchIndex
+from logs_collector.services import get_failed_log_file_path
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from django.db.backends.base.base import BaseDatabaseWrapper
+    from django.db.models import Model, QuerySet
+
+
+PARTITIONED_MODELS = (LogEntry, FailedLogEntry)
+# Поля со ссылками (sha256) на блобы внешнего хранилища.
+BLOB_REFERENCE_FIELDS = (
+    (LogEntry, tuple(f'{name}_hash' for name in LogEntry.PAYLOAD_FIELDS)),
+    (FailedLogEntry, ('raw_data_hash',)),
+)
+PARTITION_INTERVALS = ('day', 'month')
+PARTITION_KEY = 'received_at'
+MAX_PARTITION = 'pmax'
+
+
+def _get_connection(model: type[Model]) -> BaseDatabaseWrapper:
+    return connections[model.objects.db]
+
+
+def supports_partitioning(model: type[Model]) -> bool:
+    """Проверяет, что база модели поддерживает секционирование (MySQL/MariaDB)."""
+    return _get_connection(model).vendor == 'mysql'
+
+
+def get_interval() -> str:
+    """Возвращает шаг секционирования из настройки LOG_PARTITION_INTERVAL."""
+    interval = settings.LOG_PARTITION_INTERVAL
+    if interval not in PARTITION_INTERVALS:
+        raise ImproperlyConfigured(f'Неизвестный шаг LOG_PARTITION_INTERVAL: {interval}')
+    return interval
+
+
+def get_period_start(moment: datetime, interval: str) -> datetime:
+    """Возвращает начало периода (дня или месяца) по UTC без часового пояса."""
+    if timezone.is_aware(moment):
+        moment = timezone.make_naive(moment, UTC)
+    if interval == 'day':
+        return datetime(moment.year, moment.month, moment.day)
+    return datetime(moment.year, moment.month, 1)
+
+
+def get_next_period(start: datetime, interval: str) -> datetime:
+    """Возвращает начало следующего периода."""
+    if interval == 'day':
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def get_partition_name(start: datetime, interval: str) -> str:
+    """Возвращает имя секции по началу её периода: p20261018 или p202610."""
+    return 'p' + start.strftime('%Y%m%d' if interval == 'day' else '%Y%m')
+
+
+def iter_periods(start: datetime, until: datetime, interval: str) -> Iterator[tuple[datetime, datetime]]:
+    """Перебирает периоды (начало, конец) от start, пока начало периода меньше until."""
+    while start < until:
+        end = get_next_period(start, interval)
+        yield start, end
+        start = end
+
+
+def _get_premake_until(ahead: int, interval: str) -> datetime:
+    """Возвращает конец периода, отстоящего от текущего на ahead периодов вперёд."""
+    until = get_period_start(timezone.now(), interval)
+    for _ in range(ahead + 1):
+        until = get_next_period(until, interval)
+    return until
+
+
+def _partition_sql(start: datetime, end: datetime, interval: str) -> str:
+    return f"PARTITION {get_partition_name(start, interval)} VALUES LESS THAN ('{end:%Y-%m-%d %H:%M:%S}')"
+
+
+def list_partitions(model: type[Model]) -> list[tuple[str, datetime | None]]:
+    """Возвращает секции таблицы (имя, верхняя граница); для секции MAXVALUE граница None."""
+    with _get_connection(model).cursor() as cursor:
+        cursor.execute(
+            'SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL '
+            'ORDER BY PARTITION_ORDINAL_POSITION',
+            [model._meta.db_table],
+        )
+        rows = cursor.fetchall()
+    return [
+        (name, None if description == 'MAXVALUE' else datetime.fromisoformat(description.strip("'")))
+        for name, description in rows
+    ]
+
+
+def get_partition_bounds(model: type[Model], name: str) -> tuple[datetime | None, datetime | None] | None:
+    """
+    Возвращает границы секции по received_at [нижняя, верхняя) с часовым поясом UTC или None, если секции нет.
+
+    У первой секции нет нижней границы, у секции MAXVALUE - верхней.
+    """
+    lower = None
+    for partition, bound in list_partitions(model):
+        upper = bound.replace(tzinfo=UTC) if bound is not None else None
+        if partition == name:
+            return lower, upper
+        lower = upper
+    return None
+
+
+def build_partition_table_sql(model: type[Model], ahead: int) -> list[str]:
+    """
+    Возвращает SQL для перевода таблицы в секционированную.
+
+    Первичный ключ расширяется до (id, received_at): ключ секционирования должен входить в каждый
+    уникальный ключ. Секции создаются от самой старой записи до ahead периодов вперёд.
+    """
+    interval = get_interval()
+    table = model._meta.db_table
+    oldest = model.objects.aggregate(oldest=Min(PARTITION_KEY))['oldest'] or timezone.now()
+    periods = iter_periods(get_period_start(oldest, interval), _get_premake_until(ahead, interval), interval)
+    partitions = [_partition_sql(start, end, interval) for start, end in periods]
+    partitions.append(f'PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)')
+    return [
+        f'ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, {PARTITION_KEY})',
+        f'ALTER TABLE {table} PARTITION BY RANGE COLUMNS({PARTITION_KEY}) ({", ".join(partitions)})',
+    ]
+
+
+def build_add_partitions_sql(model: type[Model], ahead: int) -> list[str]:
+    """Возвращает SQL, который выделяет из секции MAXVALUE секции на ahead периодов вперёд."""
+    interval = get_interval()
+    bounds = [bound for _, bound in list_partitions(model) if bound is not None]
+    if not bounds:
+        return []
+
+    periods = iter_periods(max(bounds), _get_premake_until(ahead, interval), interval)
+    partitions = [_partition_sql(start, end, interval) for start, end in periods]
+    if not partitions:
+        return []
+
+    partitions.append(f'PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)')
+    return [
+        f'ALTER TABLE {model._meta.db_table} REORGANIZE PARTITION {MAX_PARTITION} INTO ({", ".join(partitions)})'
+    ]
+
+
+def get_expired_partitions(model: type[Model], cutoff: datetime) -> list[str]:
+    """Возвращает секции, все записи которых старше cutoff."""
+    cutoff = timezone.make_naive(cutoff, UTC) if timezone.is_aware(cutoff) else cutoff
+    return [name for name, bound in list_partitions(model) if bound is not None and bound <= cutoff]
+
+
+def purge_related(model: type[Model], ids: list[int]) -> None:
+    """Удаляет связанные с записями данные, которые не удаляются вместе с секцией."""
+    if model is LogEntry:
+        LogSearchIndex.objects.filter(entry_id__in=ids).delete()
+        rows = (
+            LogEntry.objects.filter(id__in=ids)
+            .exclude(employee='')
+            .order_by('employee')
+            .values('employee')
+            .annotate(count=Count('id'))
+        )
+        for row in rows:
+            count = row['count']
+            Employee.objects.filter(name=row['employee']).update(
+                entries_count=Case(When(entries_count__gt=count, then=F('entries_count') - count), default=0)
+            )
+    elif model is FailedLogEntry:
+        for failed_log_id in ids:
+            get_failed_log_file_path(failed_log_id).unlink(missing_ok=True)
+
+
+def drop_partitions(model: type[Model], names: list[str], batch_size: int) -> None:
+    """Удаляет секции таблицы, предварительно очищая связанные данные их записей."""
+    connection = _get_connection(model)
+    table = model._meta.db_table
+    for name in names:
+        last_id = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT id FROM {table} PARTITION ({name}) WHERE id > %s ORDER BY id LIMIT %s',
+                    [last_id, batch_size],
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            with transaction.atomic(using=model.objects.db):
+                purge_related(model, ids)
+            last_id = ids[-1]
+
+    if names:
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {table} DROP PARTITION {", ".join(names)}')
+
+
+def delete_expired_rows(model: type[Model], cutoff: datetime, batch_size: int) -> int:
+    """Удаляет записи старше cutoff пакетами (для несекционированных таблиц), возвращает количество."""
+    return delete_rows(model.objects.filter(**{f'{PARTITION_KEY}__lt': cutoff}), batch_size)
+
+
+def delete_rows(queryset: QuerySet, batch_size: int) -> int:
+    """Удаляет записи queryset пакетами вместе со связанными данными, возвращает количество."""
+    model = queryset.model
+    deleted = 0
+    queryset = queryset.order_by('id')
+    while ids := list(queryset.values_list('id', flat=True)[:batch_size]):
+        with transaction.atomic(using=model.objects.db):
+            purge_related(model, ids)
+            model.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+    return deleted
+
+
+def get_retention_days(model: type[Model]) -> int:
+    """Возвращает срок хранения записей модели в днях (0 - хранить всегда)."""
+    if model is FailedLogEntry:
+        return settings.FAILED_LOG_RETENTION_DAYS
+    return settings.LOG_RETENTION_DAYS
+
+
+def get_referenced_blobs(batch_size: int) -> set[bytes]:
+    """Возвращает sha256 (в двоичном виде) блобов, на которые ссылаются записи, читая таблицы пакетами по id."""
+    referenced = set()
+    for model, fields in BLOB_REFERENCE_FIELDS:
+        queryset = model.objects.order_by('id').values_list('id', *fields)
+        last_id = 0
+        while rows := list(queryset.filter(id__gt=last_id)[:batch_size]):
+            referenced.update(bytes.fromhex(digest) for row in rows for digest in row[1:] if digest)
+            last_id = rows[-1][0]
+    return referenced
+
+
+def collect_blob_garbage(batch_size: int) -> int:
+    """
+    Удаляет блобы, на которые не ссылается ни LogEntry, ни FailedLogEntry, возвращает количество.
+
+    Ссылки собираются до просмотра хранилища, а блобы моложе BLOB_STORE_GC_GRACE не удаляются,
+    поэтому блобы записей, сохраняемых во время сборки, не затрагиваются.
+    """
+    return delete_unreferenced_blobs(get_referenced_blobs(batch_size), settings.BLOB_STORE_GC_GRACE)
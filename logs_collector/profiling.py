@@ -0,0 +1,233 @@
+"""
+Профилирование медленных запросов: выборка стеков, cProfile и SQL с записью отчётов в локальный каталог.
+
+Для части запросов (PROFILING_SAMPLE_RATE) включается cProfile. Остальные запросы, если задан
+PROFILING_SLOW_THRESHOLD, регистрируются в общем фоновом потоке, который раз в PROFILING_SAMPLE_INTERVAL
+секунд снимает стек потока запроса; отчёт сохраняется только для запросов дольше порога. В каталоге
+хранится не больше PROFILING_MAX_FILES отчётов, более старые удаляются.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import reprlib
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.utils import timezone
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from types import FrameType
+
+
+REPORT_SUFFIX = '.txt'
+PSTATS_SUFFIX = '.prof'
+PROFILE_NAME_RE = re.compile(r'^[\w.-]+$')
+# Сколько SQL-запросов и строк статистики cProfile попадает в отчёт.
+MAX_QUERIES = 1000
+MAX_SQL_LENGTH = 2000
+# Сколько символов строки или значения и сколько элементов коллекции параметров SQL попадает в отчёт.
+MAX_PARAM_LENGTH = 200
+MAX_PARAM_ITEMS = 20
+PSTATS_LINES = 60
+
+
+class StackSampler:
+    """
+    Background thread that periodically records the stacks of registered request threads.
+
+    A request thread registers itself with start() and gets a Counter of folded stacks
+    ("outer;...;inner" -> number of samples), the thread stops sampling with stop().
+    The sampler thread is started on first use and sleeps while no thread is registered.
+    """
+
+    def __init__(self, interval: float) -> None:
+        """Initialize the sampler."""
+        self.interval = interval
+        self._stacks: dict[int, Counter[str]] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, stacks: Counter[str] | None = None) -> Counter[str]:
+        """Start sampling the current thread into stacks (a new counter by default) and return the counter."""
+        stacks = Counter() if stacks is None else stacks
+        with self._lock:
+            self._stacks[threading.get_ident()] = stacks
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+                self._thread.start()
+        return stacks
+
+    def stop(self) -> None:
+        """Stop sampling the current thread."""
+        with self._lock:
+            self._stacks.pop(threading.get_ident(), None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._stacks:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self._stacks.items():
+                    if (frame := frames.get(ident)) is not None:
+                        stacks[fold_stack(frame)] += 1
+
+
+@lru_cache(maxsize=1)
+def get_stack_sampler() -> StackSampler:
+    """Возвращает общий для процесса поток выборки стеков."""
+    return StackSampler(settings.PROFILING_SAMPLE_INTERVAL)
+
+
+def fold_stack(frame: FrameType) -> str:
+    """Возвращает стек в свёрнутом формате flamegraph: функции от внешней к внутренней через ';'."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_qualname} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class ParamsRepr(reprlib.Repr):
+    """Repr of SQL parameters that truncates every value before formatting it; bytes are shown by size only."""
+
+    def __init__(self) -> None:
+        """Initialize the limits."""
+        super().__init__()
+        self.maxstring = self.maxother = MAX_PARAM_LENGTH
+        self.maxlist = self.maxtuple = self.maxdict = self.maxset = self.maxfrozenset = MAX_PARAM_ITEMS
+
+    def repr_bytes(self, value: bytes | bytearray | memoryview, level: int) -> str:
+        """Describe binary data by type and length, payloads can be megabytes."""
+        return f'<{type(value).__name__} len={len(value)}>'
+
+    repr_bytearray = repr_memoryview = repr_bytes
+
+
+params_repr = ParamsRepr()
+
+
+class QueryLog:
+    """Database execute wrapper that records the SQL of a request with durations."""
+
+    def __init__(self) -> None:
+        """Initialize the log."""
+        self.queries: list[tuple[float, str]] = []
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:
+        """Execute the query and record it."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append((elapsed, f'{sql[:MAX_SQL_LENGTH]} {params_repr.repr(params)}'[:MAX_SQL_LENGTH]))
+
+
+def get_profile_dir() -> Path:
+    """Возвращает каталог отчётов профилирования."""
+    return Path(settings.PROFILING_DIR)
+
+
+def save_profile(
+    request_line: str,
+    status: int,
+    elapsed: float,
+    reason: str,
+    queries: QueryLog,
+    profiler: cProfile.Profile | None = None,
+    stacks: Counter[str] | None = None,
+) -> str:
+    """
+    Записывает отчёт о запросе: SQL, статистику cProfile или свёрнутые стеки; возвращает имя отчёта.
+
+    Для cProfile рядом сохраняется файл .prof для pstats/snakeviz.
+    """
+    directory = get_profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r'[^\w]+', '-', request_line.split('?', 1)[0]).strip('-')[:60] or 'root'
+    name = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{slug}-{elapsed * 1000:.0f}ms'
+
+    lines = [
+        request_line,
+        f'status={status} duration={elapsed * 1000:.1f}ms reason={reason} pid={os.getpid()}',
+        '',
+        f'== SQL: {queries.count} queries, {queries.duration * 1000:.1f}ms ==',
+        *(f'{duration * 1000:9.2f}ms  {sql}' for duration, sql in queries.queries),
+    ]
+    if queries.count > len(queries.queries):
+        lines.append(f'... {queries.count - len(queries.queries)} more queries')
+
+    if profiler is not None:
+        profiler.dump_stats(directory / f'{name}{PSTATS_SUFFIX}')
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PSTATS_LINES)
+        lines += ['', f'== cProfile, top {PSTATS_LINES} by cumulative time ==', output.getvalue()]
+    if stacks is not None:
+        lines += [
+            '',
+            f'== Stack samples every {settings.PROFILING_SAMPLE_INTERVAL * 1000:g}ms, {stacks.total()} samples '
+            '(folded: stack count) ==',
+            *(f'{stack} {count}' for stack, count in stacks.most_common()),
+        ]
+
+    (directory / f'{name}{REPORT_SUFFIX}').write_text('\n'.join(lines) + '\n')
+    rotate_profiles()
+    return name
+
+
+def list_profiles() -> list[dict[str, Any]]:
+    """Возвращает сохранённые отчёты от новых к старым: имя, размер, время и наличие файла .prof."""
+    directory = get_profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in sorted(directory.glob(f'*{REPORT_SUFFIX}'), reverse=True):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        profiles.append({
+            'name': path.stem,
+            'size': stat.st_size,
+            'created_at': datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone()),
+            'has_pstats': path.with_suffix(PSTATS_SUFFIX).exists(),
+        })
+    return profiles
+
+
+def get_profile_path(name: str, suffix: str) -> Path | None:
+    """Возвращает путь к файлу отчёта или None, если имя недопустимо или файла нет."""
+    if suffix not in (REPORT_SUFFIX, PSTATS_SUFFIX) or not PROFILE_NAME_RE.match(name):
+        return None
+    path = get_profile_dir() / f'{name}{suffix}'
+    return path if path.is_file() else None
+
+
+def rotate_profiles() -> None:
+    """Удаляет самые старые отчёты сверх PROFILING_MAX_FILES."""
+    reports = sorted(get_profile_dir().glob(f'*{REPORT_SUFFIX}'), reverse=True)
+    for path in reports[settings.PROFILING_MAX_FILES :]:
+        path.unlink(missing_ok=True)
+        path.with_suffix(PSTATS_SUFFIX).unlink(missing_ok=True)
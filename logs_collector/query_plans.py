@@ -0,0 +1,63 @@
+"""
+Проверка планов запросов страницы логов на регрессии: полный просмотр таблицы и сортировка без индекса.
+
+Сценарии повторяют сочетания фильтров и сортировок LogFilterForm; планы проверяются тестами
+(QueryPlanTestCase) и выводятся бенчмарком benchmark_queries на данных, близких к боевым.
+"""
+
+from django.db import connections
+from django.db.models import QuerySet
+
+from logs_collector.models import LogEntry
+
+
+# Сценарии фильтрации и сортировки страницы логов: (название, параметры запроса, читается ли в порядке индекса).
+# Для выборочных фильтров без подходящего составного индекса сортировка небольшого результата допустима.
+SCENARIOS = (
+    ('default', {}, True),
+    ('date range', {'date_from': '2024-01-01T00:00', 'date_to': '2024-01-02T00:00'}, True),
+    ('employee', {'employee': 'employee'}, True),
+    ('employee + date range', {'employee': 'employee', 'date_from': '2024-01-01T00:00'}, True),
+    ('sort by initiator', {'sort': 'initiator', 'order': 'asc'}, True),
+    ('employee + sort by initiator', {'employee': 'employee', 'sort': 'initiator', 'order': 'desc'}, True),
+    ('status', {'status_code': '500'}, True),
+    ('status class', {'status_code': '5xx'}, False),
+    ('exact url', {'url': 'https://example.com/', 'url_exact': 'on'}, True),
+    ('search', {'search': 'example'}, False),
+)
+
+
+def explain(queryset: QuerySet) -> list[dict]:
+    """Выполняет EXPLAIN для запроса и возвращает строки плана словарями."""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        columns = [column[0].lower() for column in cursor.description]
+        return [dict(zip(columns, row, strict=True)) for row in cursor.fetchall()]
+
+
+def find_plan_problems(plan: list[dict], vendor: str, ordered: bool = True) -> list[str]:
+    """
+    Возвращает описание проблем плана: полный просмотр таблицы логов и сортировка без индекса.
+
+    Сортировка считается проблемой только для запросов, которые должны читаться в порядке индекса (ordered).
+    """
+    table = LogEntry._meta.db_table
+    problems = []
+    if vendor == 'mysql':
+        for row in plan:
+            extra = row.get('extra') or ''
+            if row.get('table') == table and row.get('type') == 'ALL':
+                problems.append(f'full scan of {table}')
+            if ordered and 'Using filesort' in extra:
+                problems.append(f'filesort on {row.get("table")}')
+    elif vendor == 'sqlite':
+        for row in plan:
+            detail = row.get('detail') or ''
+            if detail.startswith(f'SCAN {table}') and 'INDEX' not in detail:
+                problems.append(f'full scan of {table}')
+            if ordered and 'TEMP B-TREE FOR ORDER BY' in detail:
+                problems.append('sort without index')
+    return problems
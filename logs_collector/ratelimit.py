@@ -0,0 +1,69 @@
+"""
+Локальное ограничение частоты запросов по алгоритму token bucket.
+
+Состояние хранится в памяти процесса: каждый рабочий процесс ограничивает клиентов независимо,
+поэтому общий предел равен настроенному, умноженному на количество процессов.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets per client key with a bounded number of tracked clients.
+
+    Each bucket holds up to burst tokens and refills at rate tokens per second; a request takes one token.
+    The least recently seen clients are forgotten when more than max_clients are tracked.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int) -> None:
+        """Initialize the limiter."""
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # Ключ клиента -> (остаток токенов, время последнего пополнения).
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str) -> float:
+        """Take a token for the client; return 0 if allowed, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+@lru_cache(maxsize=1)
+def get_receiver_rate_limiter() -> TokenBucketLimiter | None:
+    """Возвращает ограничитель частоты приёма логов или None, если ограничение выключено."""
+    if settings.RECEIVER_RATE_LIMIT <= 0:
+        return None
+    return TokenBucketLimiter(
+        settings.RECEIVER_RATE_LIMIT, settings.RECEIVER_RATE_LIMIT_BURST, settings.RECEIVER_RATE_LIMIT_MAX_CLIENTS
+    )
+
+
+@lru_cache(maxsize=1)
+def get_failed_log_rate_limiter() -> TokenBucketLimiter | None:
+    """Возвращает ограничитель частоты сохранения неудачных логов или None, если ограничение выключено."""
+    if settings.FAILED_LOG_RATE_LIMIT <= 0:
+        return None
+    return TokenBucketLimiter(
+        settings.FAILED_LOG_RATE_LIMIT, settings.FAILED_LOG_RATE_LIMIT_BURST, settings.RECEIVER_RATE_LIMIT_MAX_CLIENTS
+    )
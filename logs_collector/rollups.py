@@ -0,0 +1,242 @@
+"""
+Предагрегированная статистика логов (таблица LogRollup).
+
+Минутные агрегаты пересчитываются из LogEntry по диапазону received_at, часовые - из минутных.
+Пересчёт идемпотентен: агрегаты за диапазон заменяются целиком, поэтому последние
+ROLLUP_RECOMPUTE_WINDOW минут пересчитываются при каждом запуске. Логи, записанные позже этого окна
+со старым received_at (очередь drain_log_spool, load_logs_archive), помечают свои часы
+в LogRollupStaleHour, и эти часы пересчитываются отдельно.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncHour, TruncMinute
+from django.utils import timezone
+
+from logs_collector.models import LogEntry, LogRollup, LogRollupStaleHour
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from django.db.models import QuerySet
+
+
+RESPONSE_TIME_BOUNDS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+HISTOGRAM_FIELDS = (*(f'response_time_le_{bound}' for bound in RESPONSE_TIME_BOUNDS), 'response_time_le_inf')
+STATUS_FIELDS = ('status_2xx', 'status_3xx', 'status_4xx', 'status_5xx', 'status_other')
+COUNTER_FIELDS = (
+    'requests',
+    *STATUS_FIELDS,
+    'payload_bytes',
+    'response_time_count',
+    'response_time_sum',
+    *HISTOGRAM_FIELDS,
+)
+GROUP_FIELDS = ('employee', 'host', 'method')
+PERCENTILES = (50, 95, 99)
+MINUTE = timedelta(minutes=1)
+HOUR = timedelta(hours=1)
+
+
+def floor_minute(moment: datetime) -> datetime:
+    """Округляет время вниз до минуты."""
+    return moment.replace(second=0, microsecond=0)
+
+
+def floor_hour(moment: datetime) -> datetime:
+    """Округляет время вниз до часа."""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def get_entry_aggregates() -> dict[str, Any]:
+    """Возвращает агрегаты LogEntry для полей счётчиков LogRollup."""
+    aggregates = {
+        'requests': Count('id'),
+        'status_2xx': Count('id', filter=Q(http_status__range=(200, 299))),
+        'status_3xx': Count('id', filter=Q(http_status__range=(300, 399))),
+        'status_4xx': Count('id', filter=Q(http_status__range=(400, 499))),
+        'status_5xx': Count('id', filter=Q(http_status__range=(500, 599))),
+        'status_other': Count('id', filter=Q(http_status__isnull=True) | ~Q(http_status__range=(200, 599))),
+        'payload_bytes': Coalesce(Sum(F('request_body_size') + F('response_size') + F('html_size')), 0),
+        'response_time_count': Count('response_time_ms'),
+        'response_time_sum': Coalesce(Sum('response_time_ms'), Value(0.0), output_field=FloatField()),
+    }
+
+    lower = None
+    for bound, name in zip((*RESPONSE_TIME_BOUNDS, None), HISTOGRAM_FIELDS, strict=True):
+        q = Q(response_time_ms__isnull=False)
+        if lower is not None:
+            q &= Q(response_time_ms__gt=lower)
+        if bound is not None:
+            q &= Q(response_time_ms__lte=bound)
+        aggregates[name] = Count('id', filter=q)
+        lower = bound
+    return aggregates
+
+
+def get_counter_sums(prefix: str = '') -> dict[str, Sum]:
+    """Возвращает суммы счётчиков LogRollup (имена с префиксом, чтобы не совпадать с полями модели)."""
+    return {f'{prefix}{name}': Sum(name) for name in COUNTER_FIELDS}
+
+
+def compute_minute_rollups(start: datetime, end: datetime) -> list[LogRollup]:
+    """Считает минутные агрегаты по записям с received_at в [start, end)."""
+    rows = (
+        LogEntry.objects.filter(received_at__gte=start, received_at__lt=end)
+        .order_by()
+        .annotate(bucket=TruncMinute('received_at'), host=F('url_host'))
+        .values('bucket', *GROUP_FIELDS)
+        .annotate(**get_entry_aggregates())
+    )
+    return [LogRollup(period=LogRollup.Period.MINUTE, **row) for row in rows]
+
+
+def compute_hour_rollups(start: datetime, end: datetime) -> list[LogRollup]:
+    """Считает часовые агрегаты из минутных за часы в [start, end)."""
+    rows = (
+        LogRollup.objects.filter(period=LogRollup.Period.MINUTE, bucket__gte=start, bucket__lt=end)
+        .order_by()
+        .annotate(hour=TruncHour('bucket'))
+        .values('hour', *GROUP_FIELDS)
+        .annotate(**get_counter_sums('total_'))
+    )
+    return [
+        LogRollup(
+            period=LogRollup.Period.HOUR,
+            bucket=row['hour'],
+            **{name: row[name] for name in GROUP_FIELDS},
+            **{name: row[f'total_{name}'] for name in COUNTER_FIELDS},
+        )
+        for row in rows
+    ]
+
+
+def replace_rollups(period: str, start: datetime, end: datetime, rollups: list[LogRollup]) -> None:
+    """Заменяет агрегаты периода period за [start, end) новыми."""
+    with transaction.atomic():
+        LogRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end).delete()
+        LogRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+def get_refresh_start() -> datetime | None:
+    """
+    Возвращает начало пересчёта: последняя посчитанная минута минус ROLLUP_RECOMPUTE_WINDOW.
+
+    Если агрегатов ещё нет - самая старая запись лога, если нет и логов - None.
+    """
+    latest = LogRollup.objects.filter(period=LogRollup.Period.MINUTE).aggregate(latest=Max('bucket'))['latest']
+    if latest is not None:
+        return latest + MINUTE - timedelta(minutes=settings.ROLLUP_RECOMPUTE_WINDOW)
+    oldest = LogEntry.objects.aggregate(oldest=Min('received_at'))['oldest']
+    return floor_minute(oldest) if oldest is not None else None
+
+
+def refresh_rollups(start: datetime, end: datetime, step: timedelta = HOUR) -> Iterator[tuple[datetime, int]]:
+    """
+    Пересчитывает минутные и часовые агрегаты за [start, end) шагами по step.
+
+    После каждого шага возвращает (конец шага, количество минутных агрегатов).
+    """
+    start, end = floor_minute(start), floor_minute(end)
+    while start < end:
+        step_end = min(start + step, end)
+        minute_rollups = compute_minute_rollups(start, step_end)
+        replace_rollups(LogRollup.Period.MINUTE, start, step_end, minute_rollups)
+
+        # Часы, затронутые шагом; незаконченный час пересчитается на следующем шаге или запуске.
+        hour_start, hour_end = floor_hour(start), floor_hour(step_end - MINUTE) + HOUR
+        replace_rollups(LogRollup.Period.HOUR, hour_start, hour_end, compute_hour_rollups(hour_start, hour_end))
+
+        yield step_end, len(minute_rollups)
+        start = step_end
+
+
+def mark_stale_hours(received_at: Iterable[datetime]) -> None:
+    """Помечает для пересчёта часы записей, полученных раньше окна ROLLUP_RECOMPUTE_WINDOW."""
+    now = timezone.now()
+    cutoff = now - timedelta(minutes=settings.ROLLUP_RECOMPUTE_WINDOW)
+    hours = {floor_hour(moment) for moment in received_at if moment < cutoff}
+    if not hours:
+        return
+    LogRollupStaleHour.objects.bulk_create(
+        [LogRollupStaleHour(bucket=hour, marked_at=now) for hour in sorted(hours)],
+        update_conflicts=True,
+        update_fields=['marked_at'],
+        unique_fields=['bucket'] if connection.features.supports_update_conflicts_with_target else None,
+    )
+
+
+def refresh_stale_hours() -> Iterator[tuple[datetime, int]]:
+    """
+    Пересчитывает агрегаты часов, помеченных mark_stale_hours, и снимает пометки.
+
+    После каждого часа возвращает (конец часа, количество минутных агрегатов).
+    """
+    for stale in LogRollupStaleHour.objects.order_by('bucket'):
+        yield from refresh_rollups(stale.bucket, stale.bucket + HOUR)
+        # Час, помеченный заново во время пересчёта, пересчитается при следующем запуске.
+        LogRollupStaleHour.objects.filter(bucket=stale.bucket, marked_at__lte=stale.marked_at).delete()
+
+
+def get_percentile(histogram: list[int], percentile: float) -> float | None:
+    """
+    Оценивает перцентиль времени ответа по гистограмме: верхняя граница интервала, в который он попадает.
+
+    Для последнего (неограниченного) интервала возвращается последняя граница.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    target = total * percentile / 100
+    cumulative = 0
+    for count, bound in zip(histogram, (*RESPONSE_TIME_BOUNDS, RESPONSE_TIME_BOUNDS[-1]), strict=True):
+        cumulative += count
+        if cumulative >= target:
+            return float(bound)
+    return float(RESPONSE_TIME_BOUNDS[-1])
+
+
+def summarize(row: dict[str, Any], prefix: str = 'total_') -> dict[str, Any]:
+    """Переводит суммы счётчиков в показатели: доля ошибок, среднее время ответа, перцентили."""
+    counters = {name: row[f'{prefix}{name}'] or 0 for name in COUNTER_FIELDS}
+    requests = counters['requests']
+    errors = counters['status_4xx'] + counters['status_5xx']
+    histogram = [counters[name] for name in HISTOGRAM_FIELDS]
+    return {
+        'requests': requests,
+        **{name: counters[name] for name in STATUS_FIELDS},
+        'error_rate': errors / requests if requests else 0,
+        'payload_bytes': counters['payload_bytes'],
+        'avg_response_time_ms': (
+            counters['response_time_sum'] / counters['response_time_count'] if counters['response_time_count'] else None
+        ),
+        **{f'p{percentile}_response_time_ms': get_percentile(histogram, percentile) for percentile in PERCENTILES},
+    }
+
+
+def get_stats(queryset: QuerySet[LogRollup], group_by: str = '') -> dict[str, Any]:
+    """
+    Возвращает статистику по агрегатам queryset: итог, итоги по группам и ряд по интервалам.
+
+    group_by - одно из GROUP_FIELDS или пустая строка; значение группы возвращается в ключе group.
+    """
+    queryset = queryset.order_by()
+    sums = get_counter_sums('total_')
+    totals = summarize(queryset.aggregate(**sums))
+
+    groups = []
+    if group_by:
+        rows = queryset.values(group_by).annotate(**sums).order_by('-total_requests')
+        groups = [{'group': row[group_by], **summarize(row)} for row in rows]
+
+    series_fields = ('bucket', group_by) if group_by else ('bucket',)
+    rows = queryset.values(*series_fields).annotate(**sums).order_by(*series_fields)
+    series = [{'bucket': row['bucket'], 'group': row.get(group_by, ''), **summarize(row)} for row in rows]
+    return {'totals': totals, 'groups': groups, 'series': series}
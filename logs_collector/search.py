@@ -0,0 +1,197 @@
+"""Полнотекстовый поиск по записям логов через таблицу LogSearchIndex."""
+
+from __future__ import annotations
+
+import re
+from html import unescape
+from typing import TYPE_CHECKING, Any
+from urllib.parse import unquote_plus
+
+from django.conf import settings
+from django.db import NotSupportedError, connections
+from django.db.models import Lookup, Q
+
+from logs_collector.models import LogEntry, LogSearchIndex
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from django.db.backends.base.base import BaseDatabaseWrapper
+    from django.db.models import QuerySet
+    from django.db.models.sql.compiler import SQLCompiler
+
+
+# Поля записи, текст которых попадает в индекс.
+SEARCH_TEXT_FIELDS = (
+    'url',
+    'initiator',
+    'source',
+    'employee',
+    'method',
+    'type',
+    'status_code',
+    'time',
+    'tab_id',
+    'request_id',
+    'response_time',
+)
+# Текстовые поля индекса, по каждому на MySQL/MariaDB построен индекс FULLTEXT.
+SEARCH_INDEX_FIELDS = ('text', 'html_text', 'request_body_text')
+QUERY_TERM_RE = re.compile(r'"([^"]*)"?|(\S+)')
+WORD_RE = re.compile(r'\w+')
+HTML_COMMENT_RE = re.compile(r'<!--.*?(?:-->|$)', re.DOTALL)
+HTML_HIDDEN_BLOCK_RE = re.compile(
+    r'<(script|style|noscript|template)\b[^>]*>.*?(?:</\1\s*>|$)', re.DOTALL | re.IGNORECASE
+)
+HTML_TAG_RE = re.compile(r'<[^>]*>')
+WHITESPACE_RE = re.compile(r'\s+')
+FORM_URLENCODED_RE = re.compile(r'^[\w.%~+\-\[\]]+=[^\s]*$')
+
+
+class Match(Lookup):
+    """MATCH ... AGAINST lookup in boolean mode, backed by a FULLTEXT index on MySQL/MariaDB."""
+
+    lookup_name = 'match'
+
+    def as_mysql(self, compiler: SQLCompiler, connection: BaseDatabaseWrapper) -> tuple[str, list[Any]]:
+        """Compile to MATCH (column) AGAINST (query IN BOOLEAN MODE)."""
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'MATCH ({lhs}) AGAINST ({rhs} IN BOOLEAN MODE)', [*lhs_params, *rhs_params]
+
+    def as_sql(self, compiler: SQLCompiler, connection: BaseDatabaseWrapper) -> tuple[str, list[Any]]:
+        """Full-text match is available only on MySQL/MariaDB."""
+        raise NotSupportedError('Full-text match is supported only on MySQL/MariaDB')
+
+
+for field_name in SEARCH_INDEX_FIELDS:
+    LogSearchIndex._meta.get_field(field_name).register_lookup(Match)
+
+
+def _normalize_text(text: str) -> str:
+    """Схлопывает пробельные символы и обрезает текст до SEARCH_MAX_TEXT_LENGTH символов."""
+    return WHITESPACE_RE.sub(' ', text).strip()[: settings.SEARCH_MAX_TEXT_LENGTH]
+
+
+def extract_html_text(data: bytes) -> str:
+    """Извлекает видимый текст из HTML: без тегов, комментариев, скриптов и стилей."""
+    text = data.decode('utf-8', 'replace')
+    text = HTML_COMMENT_RE.sub(' ', text)
+    text = HTML_HIDDEN_BLOCK_RE.sub(' ', text)
+    text = HTML_TAG_RE.sub(' ', text)
+    return _normalize_text(unescape(text))
+
+
+def extract_body_text(data: bytes) -> str:
+    """
+    Извлекает текст из тела запроса.
+
+    Разметка обрабатывается как HTML, form-urlencoded раскодируется, двоичные тела пропускаются.
+    """
+    if not data or b'\x00' in data[:1024]:
+        return ''
+    text = data.decode('utf-8', 'replace')
+    if text.lstrip().startswith('<'):
+        return extract_html_text(data)
+    if FORM_URLENCODED_RE.match(text.split('&', 1)[0]):
+        text = ' '.join(unquote_plus(part) for part in text.split('&'))
+    return _normalize_text(text)
+
+
+def build_search_text(entry: LogEntry) -> str:
+    """Собирает текст записи для индекса из полей SEARCH_TEXT_FIELDS."""
+    return ' '.join(str(value) for value in (getattr(entry, name) for name in SEARCH_TEXT_FIELDS) if value)
+
+
+def build_search_index(entry: LogEntry) -> LogSearchIndex:
+    """Строит строку поискового индекса; из полезных нагрузок читаются первые SEARCH_MAX_PAYLOAD_SIZE байт."""
+    return LogSearchIndex(
+        entry=entry,
+        text=build_search_text(entry),
+        html_text=extract_html_text(entry.get_payload('html', settings.SEARCH_MAX_PAYLOAD_SIZE)),
+        request_body_text=extract_body_text(entry.get_payload('request_body', settings.SEARCH_MAX_PAYLOAD_SIZE)),
+    )
+
+
+def index_log_entries(entries: Iterable[LogEntry]) -> None:
+    """
+    Добавляет записи в поисковый индекс (существующие строки индекса перезаписываются).
+
+    Записи без первичного ключа пропускаются: на MySQL bulk_create не возвращает id,
+    такие записи индексирует команда rebuild_search_index --missing.
+    """
+    if not settings.SEARCH_INDEX_ENABLED:
+        return
+
+    rows = [build_search_index(entry) for entry in entries if entry.pk]
+    if not rows:
+        return
+
+    connection = connections[LogSearchIndex.objects.db]
+    LogSearchIndex.objects.bulk_create(
+        rows,
+        batch_size=settings.RECEIVER_BULK_CREATE_BATCH_SIZE,
+        update_conflicts=True,
+        update_fields=list(SEARCH_INDEX_FIELDS),
+        # MySQL обновляет по любому уникальному ключу и не принимает список полей.
+        unique_fields=['entry'] if connection.features.supports_update_conflicts_with_target else None,
+    )
+
+
+def parse_search_query(value: str) -> list[tuple[str, list[str]]]:
+    """
+    Разбирает строку поиска на условия (исходный текст, слова).
+
+    Условия объединяются по И. Текст в кавычках - фраза, остальное - отдельные слова,
+    каждое ищется как префикс (завершающая * допускается).
+    """
+    terms = []
+    for phrase, word in QUERY_TERM_RE.findall(value):
+        text = phrase.strip() if phrase else word.rstrip('*')
+        words = WORD_RE.findall(text)
+        if words:
+            terms.append((text, words))
+    return terms
+
+
+def build_boolean_query(terms: list[tuple[str, list[str]]]) -> str:
+    """
+    Строит запрос для MATCH ... AGAINST IN BOOLEAN MODE.
+
+    Слова короче SEARCH_MIN_TOKEN_SIZE в индекс FULLTEXT не попадают, такие условия в запрос не включаются.
+    """
+    parts = []
+    for _, words in terms:
+        if any(len(word) < settings.SEARCH_MIN_TOKEN_SIZE for word in words):
+            continue
+        if len(words) == 1:
+            parts.append(f'+{words[0]}*')
+        else:
+            # Слово с разделителями (например, домен из URL) ищем как фразу.
+            parts.append('+"{}"'.format(' '.join(words)))
+    return ' '.join(parts)
+
+
+def filter_search(queryset: QuerySet[LogEntry], value: str, field: str = 'text') -> QuerySet[LogEntry]:
+    """
+    Фильтрует записи логов по строке поиска через поле field поискового индекса.
+
+    На MySQL/MariaDB используется индекс FULLTEXT, на остальных базах (разработка) - icontains по тексту индекса.
+    Условия, которые FULLTEXT не обслуживает (короткие слова), проверяются через icontains.
+    """
+    terms = parse_search_query(value)
+    if not terms:
+        return queryset
+
+    index = LogSearchIndex.objects.all()
+    if connections[index.db].vendor == 'mysql':
+        boolean_query = build_boolean_query(terms)
+        if boolean_query:
+            index = index.filter(**{f'{field}__match': boolean_query})
+        terms = [term for term in terms if any(len(word) < settings.SEARCH_MIN_TOKEN_SIZE for word in term[1])]
+
+    q = Q()
+    for text, _ in terms:
+        q &= Q(**{f'{field}__icontains': text})
+    return queryset.filter(pk__in=index.filter(q).values('pk'))
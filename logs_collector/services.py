@@ -3,20 +3,81 @@
 from __future__ import annotations
 
 import base64
-from datetime import timezone
+import binascii
+import hashlib
+import json
+import re
+import threading
+from collections import Counter
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
 
-from logs_collector.models import FailedLogEntry, LogEntry
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from logs_collector.blob_store import put_blob
+from logs_collector.compression import compress_payload, is_snapshot_codec
+from logs_collector.dedup import claim_dedup_key, claim_dedup_keys, find_duplicates, get_dedup_key, remember_dedup_keys
+from logs_collector.metrics import FAILED_LOGS, INGESTED_ENTRIES, PAYLOAD_BYTES, observe_stage
+from logs_collector.models import Employee, FailedLogEntry, LogEntry
+from logs_collector.ratelimit import get_failed_log_rate_limiter
+from logs_collector.search import index_log_entries
+from logs_collector.snapshots import compress_html_snapshot
 
 
 if TYPE_CHECKING:
-    from django.http.request import HttpRequest
+    from collections.abc import Iterator
+
+    from django.db.models import QuerySet
+
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+RESPONSE_TIME_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(ms|s)?\s*$', re.IGNORECASE)
+TYPED_FIELDS = ('http_status', 'response_time_ms', 'client_time', 'url_hash', 'url_host')
+# Поля события клиента, из которых строится запись лога (pluginKey и ip к ним не относятся).
+LOG_EVENT_FIELDS = (
+    'time',
+    'url',
+    'method',
+    'type',
+    'initiator',
+    'tabId',
+    'requestId',
+    'statusCode',
+    'source',
+    'responseTime',
+    'employee',
+    'requestBody',
+    'response',
+    'html',
+)
+
+# Количество неудачных логов по IP, не сохранённых из-за ограничения частоты (в памяти процесса).
+_dropped_failures: Counter[str] = Counter()
+_dropped_failures_lock = threading.Lock()
+
 
+def decode_base64(field: str | bytes) -> bytes:
+    """
+    Decode a base64 encoded string.
 
-def decode_base64(field: str) -> bytes:
-    """Decode a base64 encoded string."""
+    Canonical base64 is decoded straight from the string without intermediate copies; whitespace,
+    line breaks and missing padding are handled by the slower fallback.
+    """
+    if isinstance(field, bytes):
+        # Поле уже декодировано при потоковом разборе тела.
+        return field
     if field and isinstance(field, str):
+        try:
+            return binascii.a2b_base64(field, strict_mode=True)
+        except (binascii.Error, ValueError):
+            pass
         # Удаляем пробелы и переносы строк
         field = field.strip().replace('\n', '').replace('\r', '')
         # Добавляем padding, если нужно
@@ -29,15 +90,86 @@ def decode_base64(field: str) -> bytes:
 
 
 def get_failed_log_file_path(failed_log_id: int) -> Path:
-    """Возвращает путь к файлу с нераспарсенным логом."""
-    error_dir_path = Path(FailedLogEntry.FOLDER_NAME)
-    error_dir_path.mkdir(parents=True, exist_ok=True)
-    return error_dir_path.joinpath(f'log_{failed_log_id}.txt')
+    """Возвращает путь к файлу с нераспарсенным логом (такие файлы есть только у старых записей)."""
+    return Path(FailedLogEntry.FOLDER_NAME).joinpath(f'log_{failed_log_id}.txt')
+
+
+def parse_status_code(value: Any) -> int | None:
+    """Возвращает HTTP-статус числом или None, если значение не похоже на статус."""
+    try:
+        status = int(str(value).strip())
+    except ValueError:
+        return None
+    return status if 0 < status < 1000 else None
+
+
+def parse_response_time(value: Any) -> float | None:
+    """Возвращает время ответа в миллисекундах: число, '120', '120ms' или '0.12s'."""
+    if isinstance(value, int | float) and not isinstance(value, bool):
+        return float(value)
+    match = RESPONSE_TIME_RE.match(str(value))
+    if not match:
+        return None
+    number = float(match[1])
+    return number * 1000 if (match[2] or '').lower() == 's' else number
+
+
+def parse_client_time(value: Any) -> datetime | None:
+    """Разбирает время клиента: ISO 8601 или метка времени Unix в секундах или миллисекундах."""
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        timestamp = float(text)
+    except ValueError:
+        try:
+            parsed = parse_datetime(text)
+        except ValueError:
+            return None
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, UTC)
+        return parsed
+
+    # Метки времени браузера (Date.now(), webRequest timeStamp) приходят в миллисекундах.
+    if timestamp > 1e11:
+        timestamp /= 1000
+    try:
+        return datetime.fromtimestamp(timestamp, UTC)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def get_url_hash(url: str) -> str:
+    """Возвращает sha256 от url для поиска по точному совпадению."""
+    return hashlib.sha256(url.encode()).hexdigest() if url else ''
+
+
+def get_url_host(url: str) -> str:
+    """Возвращает хост из url (пустая строка, если url не разбирается)."""
+    try:
+        return (urlsplit(url).hostname or '')[:255]
+    except ValueError:
+        return ''
+
+
+def fill_typed_fields(entry: LogEntry) -> None:
+    """Заполняет типизированные поля записи (TYPED_FIELDS) по строковым полям лога."""
+    entry.http_status = parse_status_code(entry.status_code)
+    entry.response_time_ms = parse_response_time(entry.response_time)
+    entry.client_time = parse_client_time(entry.time)
+    entry.url_hash = get_url_hash(entry.url)
+    entry.url_host = get_url_host(entry.url)
 
 
-def save_log_entry(data: dict) -> None:
-    """Сохраняет запись лога в базу данных."""
-    LogEntry.objects.create(
+def check_log_event(data: dict) -> None:
+    """Отклоняет событие без единого поля лога (пустое тело, {} или только ключ), чтобы не сохранять пустые записи."""
+    if not any(data.get(name) for name in LOG_EVENT_FIELDS):
+        raise ValueError('Log event has no fields')
+
+
+def build_log_entry(data: dict, received_at: datetime | None = None) -> LogEntry:
+    """Создаёт несохранённую запись лога из данных клиента."""
+    entry = LogEntry(
         time=data.get('time', ''),
         url=data.get('url', ''),
         method=data.get('method', ''),
@@ -45,33 +177,344 @@ def save_log_entry(data: dict) -> None:
         initiator=data.get('initiator', ''),
         tab_id=data.get('tabId', ''),
         request_id=data.get('requestId', ''),
-        request_body=decode_base64(data.get('requestBody', '')),
-        response=decode_base64(data.get('response', '')),
         status_code=data.get('statusCode') or '',
         source=data.get('source', ''),
-        html=decode_base64(data.get('html', '')),
         response_time=data.get('responseTime', ''),
         employee=data.get('employee', 'unauthorized'),
         ip_address=data['ip'],
+        received_at=received_at or timezone.now(),
     )
+    fill_typed_fields(entry)
+    with observe_stage('base64_decode'):
+        payloads = {
+            'request_body': decode_base64(data.get('requestBody', '')),
+            'response': decode_base64(data.get('response', '')),
+            'html': decode_base64(data.get('html', '')),
+        }
+    for name, payload in payloads.items():
+        PAYLOAD_BYTES.observe(len(payload), field=name)
+    set_entry_payloads(entry, payloads)
+    return entry
 
 
-def save_failed_log_entry(request: HttpRequest, exception: str, ip: str) -> None:
-    """Сохраняет запись неудачного лога в базу данных и файл."""
-    failed_log = FailedLogEntry.objects.create(
-        raw_data=request.body.decode(errors='ignore') or '', error_message=str(exception), ip_address=ip
-    )
+def set_entry_payloads(entry: LogEntry, payloads: dict[str, bytes]) -> None:
+    """Сохраняет полезные нагрузки записи; html - разницей с базовым снимком страницы, если это включено."""
+    for name, payload in payloads.items():
+        entry.set_payload(name, payload, compress_html_snapshot(entry.url_hash, payload) if name == 'html' else None)
+
+
+def register_employees(entries: list[LogEntry]) -> None:
+    """
+    Добавляет сотрудников записей в справочник и увеличивает их счётчики записей.
+
+    Один UPDATE на сотрудника в пакете; INSERT выполняется только для нового сотрудника.
+    """
+    counts = Counter(entry.employee for entry in entries if entry.employee)
+
+    # Фиксированный порядок обновления, чтобы параллельные пакеты не блокировали друг друга.
+    for name in sorted(counts):
+        received_at = max(entry.received_at for entry in entries if entry.employee == name)
+        changes = {
+            'entries_count': F('entries_count') + counts[name],
+            'last_seen_at': Greatest('last_seen_at', Value(received_at)),
+        }
+        if not Employee.objects.filter(name=name).update(**changes):
+            Employee.objects.bulk_create([Employee(name=name, entries_count=0)], ignore_conflicts=True)
+            Employee.objects.filter(name=name).update(**changes)
+
+
+def _count_ingested_entries(entries: list[LogEntry]) -> None:
+    """Учитывает сохранённые записи в метрике по сотрудникам."""
+    for name, count in Counter(entry.employee for entry in entries).items():
+        INGESTED_ENTRIES.inc(count, employee=name)
+
+
+def get_entry_dedup_key(entry: LogEntry) -> str:
+    """Возвращает ключ отбрасывания повторов для записи лога."""
+    return get_dedup_key(entry.employee, entry.tab_id, entry.request_id)
+
+
+def get_event_dedup_key(data: dict) -> str:
+    """Возвращает ключ отбрасывания повторов для данных события (как их разберёт build_log_entry)."""
+    return get_dedup_key(data.get('employee', 'unauthorized'), data.get('tabId', ''), data.get('requestId', ''))
+
+
+def store_log_entry(entry: LogEntry) -> bool:
+    """
+    Сохраняет подготовленную запись лога вместе со строкой поискового индекса и справочником сотрудников.
+
+    Возвращает False, если событие с тем же ключом уже сохранено (запись не сохраняется).
+    """
+    key = get_entry_dedup_key(entry)
+    with observe_stage('db_insert'), transaction.atomic():
+        if key and not claim_dedup_key(key):
+            return False
+        entry.save(force_insert=True)
+        index_log_entries([entry])
+        register_employees([entry])
+    remember_dedup_keys([key])
+    _count_ingested_entries([entry])
+    return True
+
+
+def save_log_entry(data: dict) -> bool:
+    """
+    Сохраняет запись лога в базу данных; возвращает False для повтора уже сохранённого события.
+
+    Повтор распознаётся до декодирования и записи полезных нагрузок.
+    """
+    key = get_event_dedup_key(data)
+    if key and find_duplicates([key]):
+        return False
+    return store_log_entry(build_log_entry(data))
+
 
-    # Сохраняем нераспарсенный лог в файл.
-    file_path = get_failed_log_file_path(failed_log.id)
+def iter_ndjson_items(body: bytes) -> Iterator[tuple[bytes, Any]]:
+    """
+    Разбирает тело в формате NDJSON построчно.
 
-    with file_path.open('w', encoding='utf-8') as f:
-        f.write(f'Failed log ID: {failed_log.id}\n')
-        f.write(f'Time: {timezone.now().strftime("%d-%m-%Y %HH:%MM:%SS")}\n')
-        f.write(f'IP: {ip}\n')
-        f.write(f'Error: {exception!s}\n')
-        f.write('Raw data:\n')
+    Для каждой непустой строки возвращает пару (сырая строка, объект). Если строку не удалось
+    распарсить, вместо объекта возвращается исключение - ошибка одной строки не ломает весь пакет.
+    """
+    for line in body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
         try:
-            f.write(request.body.decode('utf-8', errors='replace'))
-        except Exception:
-            f.write(str(request.body))
+            yield line, json.loads(line)
+        except ValueError as e:
+            yield line, e
+
+
+def iter_json_array_items(items: list) -> Iterator[tuple[bytes, Any]]:
+    """Возвращает пары (сырые данные, объект) для элементов JSON-массива."""
+    for item in items:
+        yield json.dumps(item).encode(), item
+
+
+def _error_result(index: int, message: str) -> dict:
+    """Результат обработки элемента пакета с ошибкой."""
+    return {'index': index, 'status': 'error', 'message': message}
+
+
+def _duplicate_result(index: int) -> dict:
+    """Результат обработки повтора уже сохранённого элемента пакета."""
+    return {'index': index, 'status': 'ok', 'duplicate': True}
+
+
+def iter_body_items(body: bytes, content_type: str) -> Iterator[tuple[bytes, Any]]:
+    """Возвращает пары (сырые данные, объект) для тела запроса с одним событием или пакетом."""
+    if content_type in NDJSON_CONTENT_TYPES:
+        yield from iter_ndjson_items(body)
+        return
+
+    try:
+        payload = json.loads(body.decode())
+    except ValueError as e:
+        yield body, e
+        return
+
+    if isinstance(payload, list):
+        yield from iter_json_array_items(payload)
+    else:
+        yield body, payload
+
+
+def prepare_log_batch(
+    items: Iterator[tuple[bytes, Any]], ip: str, received_at: datetime | None = None, key_verified: bool = False
+) -> tuple[list[dict], list[tuple[int, bytes, LogEntry]]]:
+    """
+    Проверяет элементы пакета и создаёт для них несохранённые записи.
+
+    Элементы с неверным ключом отклоняются (если ключ не проверен по заголовку запроса - key_verified),
+    элементы, которые не удалось разобрать, сохраняются в FailedLogEntry. Повторы уже сохранённых
+    событий и повторы внутри пакета подтверждаются без записи. Возвращает статусы по каждому элементу
+    и список (индекс, сырые данные, запись) для вставки.
+    """
+    results = []
+    # Проверенные элементы: (индекс, сырые данные, событие, ключ повторов).
+    accepted = []
+
+    for index, (raw_data, item) in enumerate(items):
+        if index >= settings.RECEIVER_MAX_BATCH_SIZE:
+            results.append(_error_result(index, 'Batch size limit exceeded'))
+            continue
+        try:
+            if isinstance(item, Exception):
+                raise item
+            if not isinstance(item, dict):
+                raise ValueError('Log item must be a JSON object')
+
+            # Проверяем ключ для каждого элемента отдельно.
+            plugin_key = item.get('pluginKey')
+            if not key_verified and plugin_key is None:
+                results.append(_error_result(index, 'Invalid request'))
+                continue
+            if not key_verified and plugin_key != settings.PLUGIN_KEY:
+                results.append(_error_result(index, 'Invalid key'))
+                continue
+            check_log_event(item)
+
+            accepted.append((index, raw_data, item, get_event_dedup_key(item)))
+            results.append({'index': index, 'status': 'ok'})
+        except Exception as e:
+            save_failed_log_entry(raw_data, e, ip)
+            results.append(_error_result(index, str(e)))
+
+    # Повторы ищутся одним запросом до декодирования и записи полезных нагрузок.
+    duplicates = find_duplicates(key for *_, key in accepted)
+    pending = []
+    for index, raw_data, item, key in accepted:
+        if key in duplicates:
+            results[index] = _duplicate_result(index)
+            continue
+        if key:
+            duplicates.add(key)
+        try:
+            pending.append((index, raw_data, build_log_entry({**item, 'ip': ip}, received_at)))
+        except Exception as e:
+            save_failed_log_entry(raw_data, e, ip)
+            results[index] = _error_result(index, str(e))
+
+    return results, pending
+
+
+def bulk_save_log_entries(entries: list[tuple[bytes, LogEntry]]) -> tuple[dict[int, str], set[int]]:
+    """
+    Сохраняет записи одной многострочной вставкой.
+
+    Возвращает ошибки по позициям записей, которые не удалось сохранить, и позиции повторов уже
+    сохранённых событий (они не сохраняются).
+    """
+    errors = {}
+    duplicates = set()
+    if not entries:
+        return errors, duplicates
+
+    keys = [get_entry_dedup_key(entry) for _, entry in entries]
+    try:
+        with observe_stage('db_insert'), transaction.atomic():
+            duplicates = claim_dedup_keys(keys)
+            created = LogEntry.objects.bulk_create(
+                [entry for position, (_, entry) in enumerate(entries) if position not in duplicates],
+                batch_size=settings.RECEIVER_BULK_CREATE_BATCH_SIZE,
+            )
+            index_log_entries(created)
+            register_employees(created)
+        remember_dedup_keys(key for position, key in enumerate(keys) if position not in duplicates)
+        _count_ingested_entries(created)
+    except Exception:
+        # Многострочная вставка не прошла - сохраняем по одной, чтобы найти виноватые элементы.
+        duplicates = set()
+        for position, (raw_data, entry) in enumerate(entries):
+            entry.pk = None
+            try:
+                if not store_log_entry(entry):
+                    duplicates.add(position)
+            except Exception as e:
+                save_failed_log_entry(raw_data, e, entry.ip_address)
+                errors[position] = str(e)
+
+    return errors, duplicates
+
+
+def save_log_batch(items: Iterator[tuple[bytes, Any]], ip: str, key_verified: bool = False) -> list[dict]:
+    """
+    Сохраняет пакет логов одной многострочной вставкой.
+
+    Каждый элемент проверяется отдельно. Возвращает статус по каждому элементу.
+    """
+    results, pending = prepare_log_batch(items, ip, key_verified=key_verified)
+    errors, duplicates = bulk_save_log_entries([(raw_data, entry) for _, raw_data, entry in pending])
+    for position, message in errors.items():
+        index = pending[position][0]
+        results[index] = _error_result(index, message)
+    for position in duplicates:
+        index = pending[position][0]
+        results[index] = _duplicate_result(index)
+
+    return results
+
+
+def rewrite_payloads(queryset: QuerySet[LogEntry], batch_size: int) -> Iterator[tuple[int, int]]:
+    """
+    Пересохраняет полезные нагрузки записей по текущим настройкам хранилища и сжатия.
+
+    Записи обрабатываются пакетами по возрастанию id, после каждого пакета возвращается
+    (количество обработанных записей, последний id).
+    """
+    payload_columns = [
+        column for name in LogEntry.PAYLOAD_FIELDS for column in (name, f'{name}_hash', f'{name}_size', f'{name}_codec')
+    ]
+    last_id = 0
+    processed = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id').only('id', *payload_columns)[:batch_size])
+        if not batch:
+            return
+
+        for entry in batch:
+            for name in LogEntry.PAYLOAD_FIELDS:
+                # Разница html с базовым снимком не пересохраняется: полный html занял бы больше места.
+                if not is_snapshot_codec(getattr(entry, f'{name}_codec')):
+                    entry.set_payload(name, entry.get_payload(name))
+        LogEntry.objects.bulk_update(batch, payload_columns)
+
+        processed += len(batch)
+        last_id = batch[-1].id
+        yield processed, last_id
+
+
+def save_failed_log_entry(raw_data: bytes, exception: Exception | str, ip: str) -> None:
+    """
+    Сохраняет неудачный лог: тело сжимается во внешнее хранилище, в базу - начало тела и метаданные.
+
+    Одинаковые тела хранятся в хранилище один раз. Повтор того же тела с той же ошибкой с того же IP
+    в течение FAILED_LOG_DEDUP_WINDOW секунд только увеличивает repeat_count существующей записи.
+    Ошибки с одного IP сверх FAILED_LOG_RATE_LIMIT не сохраняются, их количество попадает
+    в dropped_count следующей сохранённой записи с этого IP.
+    """
+    limiter = get_failed_log_rate_limiter()
+    if limiter is not None and limiter.consume(ip):
+        with _dropped_failures_lock:
+            _dropped_failures[ip] += 1
+        FAILED_LOGS.inc(outcome='dropped')
+        return
+    with _dropped_failures_lock:
+        dropped = _dropped_failures.pop(ip, 0)
+
+    error_message = str(exception)
+    body_digest = hashlib.sha256(raw_data).hexdigest()
+    now = timezone.now()
+    if settings.FAILED_LOG_DEDUP_WINDOW:
+        repeated_id = (
+            FailedLogEntry.objects.filter(
+                body_digest=body_digest,
+                received_at__gte=now - timedelta(seconds=settings.FAILED_LOG_DEDUP_WINDOW),
+                ip_address=ip or None,
+                error_message=error_message,
+            )
+            .values_list('id', flat=True)
+            .first()
+        )
+        if repeated_id is not None:
+            FailedLogEntry.objects.filter(id=repeated_id).update(
+                repeat_count=F('repeat_count') + 1, dropped_count=F('dropped_count') + dropped, last_seen_at=now
+            )
+            FAILED_LOGS.inc(outcome='repeated')
+            return
+
+    codec, stored = compress_payload('raw_data', raw_data)
+    FailedLogEntry.objects.create(
+        raw_data=raw_data[: settings.FAILED_LOG_PREVIEW_SIZE].decode(errors='ignore'),
+        raw_data_hash=put_blob(stored),
+        raw_data_size=len(raw_data),
+        raw_data_codec=codec,
+        body_digest=body_digest,
+        error_message=error_message,
+        received_at=now,
+        ip_address=ip,
+        last_seen_at=now,
+        dropped_count=dropped,
+    )
+    FAILED_LOGS.inc(outcome='stored')
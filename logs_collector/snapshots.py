@@ -0,0 +1,88 @@
+"""
+Хранение html как двоичной разницы с базовым снимком той же страницы.
+
+Сотрудники весь день перезагружают одни и те же страницы, и снимки html одного url отличаются на несколько
+байт. Для url хранится базовый снимок (HtmlSnapshotBase и файл в HTML_SNAPSHOT_DIR), а html записи сжимается
+с базовым снимком в качестве словаря: в записи остаётся только разница, её кодек - 'zstd+s:<id снимка>'.
+Распаковка идёт через compression.decompress, поэтому просмотр html, выгрузка CSV и поиск читают такие записи
+как обычные. Первый снимок url сразу становится базовым, а запись хранит разницу с ним (несколько байт).
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from logs_collector.compression import compress, delete_snapshot_base, get_codec, save_snapshot_base, split_codec
+from logs_collector.metrics import HTML_SNAPSHOTS, observe_stage
+from logs_collector.models import HtmlSnapshotBase, LogEntry
+
+
+def get_snapshot_base(url_hash: str, codec: str) -> HtmlSnapshotBase | None:
+    """Возвращает последний базовый снимок url моложе HTML_SNAPSHOT_BASE_MAX_AGE, сжатый кодеком codec."""
+    created_after = timezone.now() - timedelta(seconds=settings.HTML_SNAPSHOT_BASE_MAX_AGE)
+    return (
+        HtmlSnapshotBase.objects.filter(url_hash=url_hash, codec=codec, created_at__gte=created_after)
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def create_snapshot_base(url_hash: str, codec: str, data: bytes) -> HtmlSnapshotBase:
+    """Сохраняет html базовым снимком url."""
+    base_id = save_snapshot_base(codec, data)
+    return HtmlSnapshotBase.objects.create(url_hash=url_hash, base_id=base_id, codec=codec, size=len(data))
+
+
+def compress_html_snapshot(url_hash: str, data: bytes) -> tuple[str, bytes] | None:
+    """
+    Сжимает html разницей с базовым снимком url, возвращает (кодек, данные) или None - хранить как обычно.
+
+    Если базового снимка нет, он устарел или разница больше HTML_SNAPSHOT_REBASE_RATIO от размера html
+    (страница сильно изменилась), этот html становится новым базовым снимком.
+    """
+    if not settings.HTML_SNAPSHOT_DELTA_ENABLED or not url_hash or len(data) < settings.HTML_SNAPSHOT_MIN_SIZE:
+        return None
+    codec, _ = split_codec(get_codec('html'))
+    if not codec:
+        return None
+
+    with observe_stage('html_delta'):
+        base = get_snapshot_base(url_hash, codec)
+        if base is not None:
+            delta = compress(base.delta_codec, data)
+            if len(delta) <= len(data) * settings.HTML_SNAPSHOT_REBASE_RATIO:
+                HTML_SNAPSHOTS.inc(result='delta')
+                return base.delta_codec, delta
+
+        base = create_snapshot_base(url_hash, codec, data)
+        HTML_SNAPSHOTS.inc(result='new_base')
+        return base.delta_codec, compress(base.delta_codec, data)
+
+
+def delete_expired_snapshot_bases(batch_size: int) -> int:
+    """
+    Удаляет базовые снимки, на которые не может ссылаться ни одна запись лога, возвращает количество.
+
+    Снимок используется для новых записей не дольше HTML_SNAPSHOT_BASE_MAX_AGE, поэтому снимки, созданные
+    раньше самой старой записи лога больше чем на этот срок, больше не нужны.
+    """
+    now = timezone.now()
+    oldest = LogEntry.objects.order_by('received_at').values_list('received_at', flat=True).first()
+    cutoff = min(oldest or now, now) - timedelta(seconds=settings.HTML_SNAPSHOT_BASE_MAX_AGE)
+
+    deleted = 0
+    queryset = HtmlSnapshotBase.objects.filter(created_at__lt=cutoff).order_by('created_at')
+    while bases := list(queryset.values_list('id', 'codec', 'base_id')[:batch_size]):
+        HtmlSnapshotBase.objects.filter(id__in=[base[0] for base in bases]).delete()
+        # Файл удаляется, только если его не использует снимок другого url.
+        in_use = set(
+            HtmlSnapshotBase.objects.filter(base_id__in={base[2] for base in bases}).values_list('codec', 'base_id')
+        )
+        for _, codec, base_id in bases:
+            if (codec, base_id) not in in_use:
+                delete_snapshot_base(codec, base_id)
+        deleted += len(bases)
+    return deleted
@@ -0,0 +1,136 @@
+"""Локальная очередь (spool) для отложенной записи логов в базу данных."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+
+SPOOL_SUFFIX = '.event'
+TMP_DIR_NAME = 'tmp'
+# Сюда drain_log_spool переносит события, которые не удалось прочитать.
+QUARANTINE_DIR_NAME = 'quarantine'
+# Как долго процесс использует подсчитанную глубину очереди, прежде чем снова читать директорию, секунд.
+SPOOL_DEPTH_TTL = 1.0
+
+# (глубина очереди, время подсчёта по time.monotonic) или None, если ещё не считали.
+_depth: tuple[int, float] | None = None
+_depth_lock = threading.Lock()
+
+
+class SpoolFullError(Exception):
+    """Очередь заполнена, новые события не принимаются."""
+
+
+def get_spool_dir() -> Path:
+    """Возвращает директорию очереди, создавая её при необходимости."""
+    spool_dir = Path(settings.RECEIVER_SPOOL_DIR)
+    spool_dir.joinpath(TMP_DIR_NAME).mkdir(parents=True, exist_ok=True)
+    return spool_dir
+
+
+def get_spool_depth() -> int:
+    """Возвращает количество событий в очереди, читая директорию."""
+    try:
+        with os.scandir(settings.RECEIVER_SPOOL_DIR) as entries:
+            return sum(1 for entry in entries if entry.name.endswith(SPOOL_SUFFIX))
+    except FileNotFoundError:
+        return 0
+
+
+def get_cached_spool_depth() -> int:
+    """
+    Возвращает количество событий в очереди, читая директорию не чаще раза в SPOOL_DEPTH_TTL секунд.
+
+    События, добавленные этим процессом, учитываются сразу, а вынутые drain_log_spool - при следующем
+    подсчёте, поэтому между подсчётами глубина может быть только завышена.
+    """
+    global _depth
+    now = time.monotonic()
+    with _depth_lock:
+        if _depth is None or now - _depth[1] >= SPOOL_DEPTH_TTL:
+            _depth = (get_spool_depth(), now)
+        return _depth[0]
+
+
+def _count_spooled_event() -> None:
+    global _depth
+    with _depth_lock:
+        if _depth is not None:
+            _depth = (_depth[0] + 1, _depth[1])
+
+
+def spool_log_event(body: bytes, ip: str, content_type: str, key_verified: bool = False) -> Path:
+    """
+    Атомарно добавляет сырое тело запроса в очередь.
+
+    Файл сначала пишется во временную директорию и синхронизируется с диском, затем переносится
+    в очередь через os.replace, поэтому потребитель никогда не увидит недописанное событие.
+    key_verified - ключ плагина уже проверен по заголовку запроса, в теле он не нужен.
+    Заполненность проверяется по глубине очереди, подсчитанной не дольше SPOOL_DEPTH_TTL секунд назад.
+    """
+    if get_cached_spool_depth() >= settings.RECEIVER_SPOOL_MAX_EVENTS:
+        raise SpoolFullError('Spool is full')
+
+    spool_dir = get_spool_dir()
+    # Имя начинается с времени в наносекундах, чтобы сортировка по имени давала порядок поступления.
+    name = f'{time.time_ns():020d}-{uuid.uuid4().hex}{SPOOL_SUFFIX}'
+    meta = {
+        'ip': ip,
+        'content_type': content_type,
+        'received_at': timezone.now().isoformat(),
+        'key_verified': key_verified,
+    }
+
+    tmp_path = spool_dir.joinpath(TMP_DIR_NAME, name)
+    with tmp_path.open('wb') as f:
+        f.write(json.dumps(meta).encode())
+        f.write(b'\n')
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+
+    path = spool_dir.joinpath(name)
+    os.replace(tmp_path, path)
+    _count_spooled_event()
+    return path
+
+
+def list_spool_files(limit: int) -> list[Path]:
+    """Возвращает самые старые события очереди, не больше limit."""
+    with os.scandir(get_spool_dir()) as entries:
+        names = sorted(entry.name for entry in entries if entry.name.endswith(SPOOL_SUFFIX))
+    return [get_spool_dir().joinpath(name) for name in names[:limit]]
+
+
+def read_spool_file(path: Path) -> tuple[dict, bytes]:
+    """Читает событие из очереди, возвращает метаданные и сырое тело запроса."""
+    meta_line, _, body = path.read_bytes().partition(b'\n')
+    meta = json.loads(meta_line)
+    meta['received_at'] = datetime.fromisoformat(meta['received_at'])
+    return meta, body
+
+
+def quarantine_spool_file(path: Path) -> Path:
+    """Переносит событие в поддиректорию QUARANTINE_DIR_NAME очереди, возвращает новый путь."""
+    quarantine_dir = path.parent.joinpath(QUARANTINE_DIR_NAME)
+    quarantine_dir.mkdir(exist_ok=True)
+    target = quarantine_dir.joinpath(path.name)
+    os.replace(path, target)
+    return target
+
+
+def get_oldest_event_age(paths: list[Path]) -> float:
+    """Возвращает возраст самого старого события в секундах (по имени файла)."""
+    if not paths:
+        return 0.0
+    oldest_ns = int(paths[0].name.split('-', 1)[0])
+    return max(time.time_ns() - oldest_ns, 0) / 1e9
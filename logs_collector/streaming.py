@@ -0,0 +1,270 @@
+"""Потоковый разбор тела запроса с событием лога."""
+
+from __future__ import annotations
+
+import binascii
+import json
+from typing import Any
+
+from logs_collector.services import decode_base64
+
+
+BASE64_FIELDS = frozenset({'html', 'response', 'requestBody'})
+WHITESPACE = b' \t\r\n'
+
+
+class NotAnObjectError(ValueError):
+    """Тело запроса не является JSON-объектом (например, пакет событий)."""
+
+
+class StreamingEventParser:
+    """
+    Incremental parser for a single flat JSON log event.
+
+    Bytes are fed in arbitrary chunks. Base64 fields (html, response, requestBody) are decoded
+    on the fly in 4-character groups straight from memoryview slices of the chunk, so neither the raw
+    body nor the base64 text is kept in memory, only the decoded bytes. Other values are small and are
+    decoded with json.loads once complete.
+    """
+
+    def __init__(self, base64_fields: frozenset[str] = BASE64_FIELDS) -> None:
+        """Initialize the parser state."""
+        self.base64_fields = base64_fields
+        self.data: dict[str, Any] = {}
+        self._state = 'start'
+        self._key: str | None = None
+        self._buffer = bytearray()
+        self._escape = False
+        self._depth = 0
+        self._in_string = False
+        # Состояние декодирования base64-поля: декодированные части и незавершённая группа символов.
+        self._decoded: list[bytes] = []
+        self._pending = bytearray()
+        self._lenient = False
+
+    def feed(self, chunk: bytes) -> None:
+        """Consume the next chunk of the body."""
+        pos = 0
+        end = len(chunk)
+        while pos < end:
+            pos = getattr(self, f'_parse_{self._state}')(chunk, pos)
+
+    def close(self) -> dict[str, Any]:
+        """Finish parsing and return the event with decoded base64 fields."""
+        if self._state == 'start':
+            raise NotAnObjectError('Body is empty')
+        if self._state != 'end':
+            raise ValueError('Unexpected end of JSON body')
+        return self.data
+
+    def _skip_whitespace(self, chunk: bytes, pos: int) -> int:
+        while pos < len(chunk) and chunk[pos] in WHITESPACE:
+            pos += 1
+        return pos
+
+    def _expect(self, chunk: bytes, pos: int, expected: bytes) -> int:
+        pos = self._skip_whitespace(chunk, pos)
+        if pos < len(chunk) and chunk[pos : pos + 1] not in expected:
+            raise ValueError(f'Unexpected character {chunk[pos : pos + 1]!r} in JSON body')
+        return pos
+
+    def _parse_start(self, chunk: bytes, pos: int) -> int:
+        pos = self._skip_whitespace(chunk, pos)
+        if pos < len(chunk):
+            if chunk[pos : pos + 1] != b'{':
+                raise NotAnObjectError('Body is not a JSON object')
+            self._state = 'key_or_end'
+            pos += 1
+        return pos
+
+    def _parse_key_or_end(self, chunk: bytes, pos: int) -> int:
+        pos = self._expect(chunk, pos, b'"}' if not self.data else b'"')
+        if pos < len(chunk):
+            self._state = 'end' if chunk[pos : pos + 1] == b'}' else 'key'
+            pos += 1
+        return pos
+
+    def _parse_key(self, chunk: bytes, pos: int) -> int:
+        end, closed = self._scan_string(chunk, pos)
+        self._buffer += chunk[pos:end]
+        if closed:
+            self._key = self._decode_json(b'"' + self._buffer + b'"')
+            self._buffer.clear()
+            self._state = 'colon'
+            end += 1
+        return end
+
+    def _parse_colon(self, chunk: bytes, pos: int) -> int:
+        pos = self._expect(chunk, pos, b':')
+        if pos < len(chunk):
+            self._state = 'value'
+            pos += 1
+        return pos
+
+    def _parse_value(self, chunk: bytes, pos: int) -> int:
+        pos = self._skip_whitespace(chunk, pos)
+        if pos >= len(chunk):
+            return pos
+
+        char = chunk[pos : pos + 1]
+        if char == b'"':
+            self._state = 'base64' if self._key in self.base64_fields else 'string'
+            return pos + 1
+        if char in b'{[':
+            self._state = 'nested'
+            return pos
+        self._state = 'scalar'
+        return pos
+
+    def _parse_string(self, chunk: bytes, pos: int) -> int:
+        end, closed = self._scan_string(chunk, pos)
+        self._buffer += chunk[pos:end]
+        if closed:
+            self._finish_value(self._decode_json(b'"' + self._buffer + b'"'))
+            end += 1
+        return end
+
+    def _parse_base64(self, chunk: bytes, pos: int) -> int:
+        end, closed = self._scan_string(chunk, pos)
+        segment = memoryview(chunk)[pos:end]
+
+        if not self._lenient:
+            try:
+                self._decode_segment(segment)
+            except binascii.Error:
+                # Экранирование, padding или посторонние символы: остаток поля разбираем как в decode_base64.
+                self._lenient = True
+        if self._lenient:
+            self._buffer += segment
+
+        if closed:
+            self._finish_base64()
+            end += 1
+        return end
+
+    def _decode_segment(self, segment: memoryview) -> None:
+        """
+        Decode complete 4-character groups of the segment straight from the chunk and keep the rest.
+
+        a2b_base64 in strict mode validates the alphabet while decoding; on error the state is unchanged.
+        """
+        head = b''
+        if self._pending:
+            # Дополняем группу, начатую в предыдущем фрагменте.
+            take = min(-len(self._pending) % 4, len(segment))
+            group = bytes(self._pending) + segment[:take]
+            if len(group) < 4:
+                self._pending[:] = group
+                return
+            head = binascii.a2b_base64(group, strict_mode=True)
+            segment = segment[take:]
+
+        aligned = len(segment) - len(segment) % 4
+        decoded = binascii.a2b_base64(segment[:aligned], strict_mode=True) if aligned else b''
+        if head:
+            self._decoded.append(head)
+        if decoded:
+            self._decoded.append(decoded)
+        self._pending[:] = segment[aligned:]
+
+    def _finish_base64(self) -> None:
+        tail = bytes(self._pending) + bytes(self._buffer)
+        if tail:
+            self._decoded.append(decode_base64(self._decode_json(b'"' + tail + b'"')))
+        self._finish_value(b''.join(self._decoded))
+        self._decoded = []
+        self._pending.clear()
+        self._lenient = False
+
+    def _parse_scalar(self, chunk: bytes, pos: int) -> int:
+        start = pos
+        while pos < len(chunk) and chunk[pos : pos + 1] not in b',}' and chunk[pos] not in WHITESPACE:
+            pos += 1
+        self._buffer += chunk[start:pos]
+        if pos < len(chunk):
+            self._finish_value(self._decode_json(self._buffer))
+        return pos
+
+    def _parse_nested(self, chunk: bytes, pos: int) -> int:
+        # Вложенные значения в событиях редки и невелики, разбираем их посимвольно.
+        start = pos
+        while pos < len(chunk):
+            char = chunk[pos : pos + 1]
+            pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == b'\\':
+                    self._escape = True
+                elif char == b'"':
+                    self._in_string = False
+            elif char == b'"':
+                self._in_string = True
+            elif char in b'{[':
+                self._depth += 1
+            elif char in b'}]':
+                self._depth -= 1
+                if not self._depth:
+                    self._buffer += chunk[start:pos]
+                    self._finish_value(self._decode_json(self._buffer))
+                    return pos
+        self._buffer += chunk[start:pos]
+        return pos
+
+    def _parse_after_value(self, chunk: bytes, pos: int) -> int:
+        pos = self._expect(chunk, pos, b',}')
+        if pos < len(chunk):
+            self._state = 'key_or_end' if chunk[pos : pos + 1] == b',' else 'end'
+            pos += 1
+        return pos
+
+    def _parse_end(self, chunk: bytes, pos: int) -> int:
+        pos = self._skip_whitespace(chunk, pos)
+        if pos < len(chunk):
+            raise ValueError('Extra data after JSON object')
+        return pos
+
+    def _finish_value(self, value: Any) -> None:
+        self.data[self._key] = value
+        self._buffer.clear()
+        self._state = 'after_value'
+
+    def _scan_string(self, chunk: bytes, pos: int) -> tuple[int, bool]:
+        """Find the closing quote of a JSON string, return (end, closed)."""
+        end = len(chunk)
+        if self._escape:
+            if pos >= end:
+                return pos, False
+            pos += 1
+            self._escape = False
+
+        quote = chunk.find(b'"', pos)
+        while True:
+            backslash = chunk.find(b'\\', pos, quote if quote != -1 else end)
+            if backslash == -1:
+                return (quote, True) if quote != -1 else (end, False)
+            if backslash + 1 >= end:
+                self._escape = True
+                return end, False
+            pos = backslash + 2
+            if quote != -1 and quote < pos:
+                quote = chunk.find(b'"', pos)
+
+    @staticmethod
+    def _decode_json(raw: bytes) -> Any:
+        return json.loads(bytes(raw))
+
+
+def parse_log_body(body: bytes) -> Any:
+    """
+    Разбирает тело запроса с событием или пакетом событий.
+
+    Событие разбирается StreamingEventParser: base64-поля декодируются из байтов тела без построения
+    строк. Пакет событий разбирается json.loads.
+    """
+    parser = StreamingEventParser()
+    try:
+        parser.feed(body)
+    except NotAnObjectError:
+        return json.loads(body)
+    return parser.close()
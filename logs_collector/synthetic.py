@@ -0,0 +1,90 @@
+"""Генерация синтетических данных, похожих на логи расширения, для бенчмарков."""
+
+from __future__ import annotations
+
+import base64
+import math
+import random
+from datetime import UTC, datetime
+from urllib.parse import urlencode
+
+
+WORDS = (
+    'order client invoice report status employee account payment delivery contract manager total '
+    'department request approve reject comment attachment history search filter export profile'
+).split()
+TAGS = ('div', 'span', 'td', 'li', 'p', 'a', 'label', 'button')
+HOSTS = ('crm.example.com', 'erp.example.com', 'mail.example.com', 'wiki.example.com')
+METHODS = ('GET', 'GET', 'GET', 'POST', 'POST', 'PUT')
+STATUS_CODES = (200, 200, 200, 200, 201, 204, 302, 304, 400, 403, 404, 500, 502)
+# Распределения размера html: медиана в байтах и sigma логнормального распределения.
+SIZE_PROFILES = {
+    'small': (16 * 1024, 0.8),
+    'mixed': (256 * 1024, 1.2),
+    'large': (2 * 1024 * 1024, 0.5),
+}
+
+
+def generate_html(size: int, rng: random.Random) -> bytes:
+    """Возвращает html примерно заданного размера с повторяющейся разметкой, как у внутренних страниц."""
+    parts = [
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8"><title>',
+        ' '.join(rng.choices(WORDS, k=4)),
+        '</title><link rel="stylesheet" href="/static/css/app.css"></head><body><div class="container">',
+    ]
+    length = sum(len(part) for part in parts)
+    while length < size:
+        tag = rng.choice(TAGS)
+        css_class = rng.choice(WORDS)
+        text = ' '.join(rng.choices(WORDS, k=rng.randint(1, 8)))
+        number = rng.randint(1, 10**6)
+        part = f'<{tag} class="{css_class}" data-id="{number}">{text} #{number}</{tag}>\n'
+        parts.append(part)
+        length += len(part)
+    parts.append('</div></body></html>')
+    return ''.join(parts).encode()[:size]
+
+
+def mutate_html(html: bytes, rng: random.Random, changes: int) -> bytes:
+    """Возвращает html с changes мелкими правками (счётчики, время, токены), как при перезагрузке страницы."""
+    data = bytearray(html)
+    for _ in range(changes):
+        offset = rng.randrange(len(data) + 1)
+        data[offset:offset] = f'<span data-updated="{rng.randint(1, 10**9)}"></span>'.encode()
+    return bytes(data)
+
+
+def sample_size(rng: random.Random, median: int, sigma: float, limit: int) -> int:
+    """Возвращает размер из логнормального распределения с медианой median, не больше limit."""
+    if median <= 0:
+        return 0
+    return min(limit, int(rng.lognormvariate(math.log(median), sigma)))
+
+
+def generate_event(rng: random.Random, html: bytes, sequence: int, employee: str) -> dict:
+    """
+    Возвращает событие в формате расширения: поля запроса и base64 html/response/requestBody.
+
+    html подставляется как есть с уникальным комментарием в начале, чтобы одинаковые страницы
+    не объединялись хранилищем блобов. Ответ - десятая часть html, тело запроса - форма.
+    """
+    host = rng.choice(HOSTS)
+    path = '/'.join(rng.choices(WORDS, k=rng.randint(1, 3)))
+    method = rng.choice(METHODS)
+    form = {word: f'{word}-{rng.randint(1, 10**6)}' for word in rng.sample(WORDS, k=rng.randint(1, 6))}
+    return {
+        'time': datetime.now(UTC).isoformat(),
+        'url': f'https://{host}/{path}?id={rng.randint(1, 10**6)}',
+        'method': method,
+        'type': rng.choice(('main_frame', 'xmlhttprequest', 'xmlhttprequest')),
+        'initiator': f'https://{host}',
+        'tabId': str(rng.randint(1, 500)),
+        'requestId': str(sequence),
+        'statusCode': rng.choice(STATUS_CODES),
+        'source': 'webRequest',
+        'responseTime': f'{rng.lognormvariate(math.log(120), 1):.0f}ms',
+        'employee': employee,
+        'html': base64.b64encode(f'<!-- {sequence} -->'.encode() + html).decode(),
+        'response': base64.b64encode(html[: len(html) // 10]).decode(),
+        'requestBody': base64.b64encode(urlencode(form).encode() if method != 'GET' else b'').decode(),
+    }
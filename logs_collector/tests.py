@@ -1,3 +1,1066 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.db.models import Sum
+from django.http import HttpRequest, HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import path
+from django.utils import timezone
+
+from logs_collector import dedup, middleware, spool, views
+from logs_collector.blob_store import get_blob_path, put_blob
+from logs_collector.compression import (
+    CODECS,
+    DICT_SEPARATOR,
+    bytes_lru_cache,
+    is_snapshot_codec,
+    load_snapshot_base,
+    save_dict,
+)
+from logs_collector.dedup import RecentKeys, get_recent_keys
+from logs_collector.forms import PER_PAGE, LogFilterForm
+from logs_collector.metrics import render_metrics
+from logs_collector.models import FailedLogEntry, HtmlSnapshotBase, LogDedupKey, LogEntry, LogRollup, LogRollupStaleHour
+from logs_collector.pagination import CURSOR_AFTER, CURSOR_LAST, KeysetPage, encode_cursor
+from logs_collector.profiling import MAX_SQL_LENGTH, REPORT_SUFFIX, QueryLog, get_profile_path, list_profiles
+from logs_collector.query_plans import SCENARIOS, explain, find_plan_problems
+from logs_collector.ratelimit import get_failed_log_rate_limiter, get_receiver_rate_limiter
+from logs_collector.rollups import mark_stale_hours
+from logs_collector.search import index_log_entries
+from logs_collector.services import decode_base64, fill_typed_fields, register_employees, set_entry_payloads
+from logs_collector.spool import QUARANTINE_DIR_NAME, SPOOL_SUFFIX, SpoolFullError, get_spool_dir, spool_log_event
+from logs_collector.streaming import BASE64_FIELDS, NotAnObjectError, StreamingEventParser, parse_log_body
+from logs_collector.synthetic import generate_html, mutate_html
+
+
+PROXY_ADDR = '172.18.0.5'
+
+# Конфигурация URL с асинхронным приёмом логов (RECEIVER_ASYNC_ENABLED читается при импорте urls).
+urlpatterns = [path('receiver', views.areceive_log, name='receive_log')]
+
+
+@override_settings(CUSTOM_HEADER='header', PLUGIN_KEY='key', RECEIVER_SPOOL_ENABLED=False)
+class ReceiverTestCase(TestCase):
+    """Base for the receiver tests: a temporary blob store and fresh rate limiters for every test."""
+
+    def setUp(self) -> None:
+        """Use a temporary blob store and fresh rate limiters."""
+        blob_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(blob_dir.cleanup)
+        blob_settings = override_settings(BLOB_STORE_DIR=blob_dir.name)
+        blob_settings.enable()
+        self.addCleanup(blob_settings.disable)
+        for limiter in (get_failed_log_rate_limiter, get_receiver_rate_limiter):
+            limiter.cache_clear()
+            self.addCleanup(limiter.cache_clear)
+
+
+class ClientIpTestCase(ReceiverTestCase):
+    """Clients behind the bundled nginx proxy are told apart by X-Real-IP when USE_X_REAL_IP is enabled."""
+
+    def post_event(self, real_ip: str) -> int:
+        """Send a valid event through the proxy on behalf of the client and return the status code."""
+        response = self.client.post(
+            '/receiver',
+            '{"pluginKey": "key", "employee": "e"}',
+            content_type='application/json',
+            REMOTE_ADDR=PROXY_ADDR,
+            HTTP_X_REAL_IP=real_ip,
+            HTTP_X_CUSTOM_HEADER='header',
+        )
+        return response.status_code
+
+    def post_invalid_body(self, real_ip: str, number: int) -> int:
+        """Send an unparsable body through the proxy on behalf of the client and return the status code."""
+        response = self.client.post(
+            '/receiver',
+            f'not json {number}',
+            content_type='application/json',
+            REMOTE_ADDR=PROXY_ADDR,
+            HTTP_X_REAL_IP=real_ip,
+            HTTP_X_CUSTOM_HEADER='header',
+        )
+        return response.status_code
+
+    @override_settings(USE_X_REAL_IP=True, FAILED_LOG_RATE_LIMIT=0.001, FAILED_LOG_RATE_LIMIT_BURST=1)
+    def test_failed_log_rate_limit_per_client(self) -> None:
+        """Only the noisy client loses failed bodies over the limit."""
+        self.post_invalid_body('10.0.0.1', 1)
+        self.post_invalid_body('10.0.0.1', 2)
+        self.post_invalid_body('10.0.0.2', 3)
+
+        self.assertEqual(sorted(FailedLogEntry.objects.values_list('ip_address', flat=True)), ['10.0.0.1', '10.0.0.2'])
+
+    @override_settings(USE_X_REAL_IP=False, FAILED_LOG_RATE_LIMIT=0.001, FAILED_LOG_RATE_LIMIT_BURST=1)
+    def test_failed_log_proxy_header_ignored_without_setting(self) -> None:
+        """Without USE_X_REAL_IP the header is not trusted and all clients share the proxy address."""
+        self.post_invalid_body('10.0.0.1', 1)
+        self.post_invalid_body('10.0.0.2', 2)
+
+        self.assertEqual(list(FailedLogEntry.objects.values_list('ip_address', flat=True)), [PROXY_ADDR])
+
+    @override_settings(USE_X_REAL_IP=True, RECEIVER_RATE_LIMIT=0.001, RECEIVER_RATE_LIMIT_BURST=1)
+    def test_receiver_rate_limit_per_client(self) -> None:
+        """A client over the receiver limit gets 429 while another client behind the same proxy is accepted."""
+        self.assertEqual(self.post_event('10.0.0.1'), 200)
+        self.assertEqual(self.post_event('10.0.0.1'), 429)
+        self.assertEqual(self.post_event('10.0.0.2'), 200)
+
+    @override_settings(USE_X_REAL_IP=False, RECEIVER_RATE_LIMIT=0.001, RECEIVER_RATE_LIMIT_BURST=1)
+    def test_receiver_rate_limit_shared_without_setting(self) -> None:
+        """Without USE_X_REAL_IP all clients behind the proxy share one receiver bucket."""
+        self.assertEqual(self.post_event('10.0.0.1'), 200)
+        self.assertEqual(self.post_event('10.0.0.2'), 429)
+
+
+class PluginKeyHeaderTestCase(ReceiverTestCase):
+    """With the key in the X-Plugin-Key header the request is checked before the body and empty events are refused."""
+
+    def post(self, body: str, key: str = 'key', content_type: str = 'application/json') -> HttpResponse:
+        """Send the body with the plugin key in the header."""
+        return self.client.post(
+            '/receiver', body, content_type=content_type, HTTP_X_CUSTOM_HEADER='header', HTTP_X_PLUGIN_KEY=key
+        )
+
+    def test_wrong_key_rejected_before_body(self) -> None:
+        """A wrong header key is refused without reading the body."""
+        with mock.patch.object(HttpRequest, 'body', new_callable=mock.PropertyMock) as body:
+            response = self.post('{"employee": "e"}', key='wrong')
+
+        self.assertEqual(response.status_code, 403)
+        body.assert_not_called()
+        self.assertFalse(LogEntry.objects.exists())
+
+    def test_header_key_accepts_event(self) -> None:
+        """An event without pluginKey in the body is stored when the header key is valid."""
+        self.assertEqual(self.post('{"employee": "e"}').status_code, 200)
+        self.assertTrue(LogEntry.objects.filter(employee='e').exists())
+
+    def test_empty_events_rejected(self) -> None:
+        """An empty body, {} or a body with the key only are refused instead of stored as blank entries."""
+        for body in ('', '{}', '{"pluginKey": "key"}'):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(LogEntry.objects.exists())
+
+    def test_empty_batch_item_rejected(self) -> None:
+        """An empty object in a batch fails on its own."""
+        response = self.post('{}\n{"employee": "e"}\n', content_type='application/x-ndjson')
+
+        self.assertEqual(response.json()['status'], 'partial')
+        self.assertEqual([result['status'] for result in response.json()['results']], ['error', 'ok'])
+        self.assertEqual(list(LogEntry.objects.values_list('employee', flat=True)), ['e'])
+
+
+class BatchReceiverTestCase(ReceiverTestCase):
+    """A batch is stored in one insert and every item is checked on its own."""
+
+    def post(self, body: str, content_type: str = 'application/json') -> dict:
+        """Send the batch and return the response data."""
+        response = self.client.post('/receiver', body, content_type=content_type, HTTP_X_CUSTOM_HEADER='header')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_json_array_per_item_errors(self) -> None:
+        """Items without a key, with a wrong key or not objects fail, the rest of the array is stored."""
+        data = self.post(
+            json.dumps(
+                [
+                    {'pluginKey': 'key', 'employee': 'a'},
+                    {'employee': 'b'},
+                    {'pluginKey': 'wrong', 'employee': 'c'},
+                    'not an object',
+                    {'pluginKey': 'key', 'employee': 'd'},
+                ]
+            )
+        )
+
+        self.assertEqual((data['status'], data['accepted'], data['failed']), ('partial', 2, 3))
+        self.assertEqual(
+            [result.get('message') for result in data['results']],
+            [None, 'Invalid request', 'Invalid key', 'Log item must be a JSON object', None],
+        )
+        self.assertEqual(sorted(LogEntry.objects.values_list('employee', flat=True)), ['a', 'd'])
+        self.assertEqual(FailedLogEntry.objects.count(), 1)
+
+    def test_ndjson_broken_line(self) -> None:
+        """A line that is not JSON fails alone and is kept in FailedLogEntry; blank lines are skipped."""
+        data = self.post(
+            '{"pluginKey": "key", "employee": "a"}\n\n'
+            '{"pluginKey": "key", broken\n'
+            '{"pluginKey": "key", "employee": "b"}\n',
+            content_type='application/x-ndjson',
+        )
+
+        self.assertEqual([result['status'] for result in data['results']], ['ok', 'error', 'ok'])
+        self.assertEqual(sorted(LogEntry.objects.values_list('employee', flat=True)), ['a', 'b'])
+        self.assertEqual(FailedLogEntry.objects.get().raw_data, '{"pluginKey": "key", broken')
+
+    @override_settings(RECEIVER_MAX_BATCH_SIZE=2)
+    def test_batch_size_limit(self) -> None:
+        """Items over RECEIVER_MAX_BATCH_SIZE are refused."""
+        data = self.post(json.dumps([{'pluginKey': 'key', 'employee': str(number)} for number in range(3)]))
+
+        self.assertEqual(
+            [result.get('message') for result in data['results']], [None, None, 'Batch size limit exceeded']
+        )
+        self.assertEqual(LogEntry.objects.count(), 2)
+
+    def test_all_items_failed(self) -> None:
+        """The batch status is error when no item was stored."""
+        data = self.post('[{"employee": "a"}, {"employee": "b"}]')
+
+        self.assertEqual((data['status'], data['accepted'], data['failed']), ('error', 0, 2))
+        self.assertFalse(LogEntry.objects.exists())
+
+
+class StreamingEventParserTestCase(SimpleTestCase):
+    """The streaming parser gives the same event as json.loads and decode_base64 however the body is chunked."""
+
+    payload = bytes(range(256)) * 3
+
+    def build_body(self, encoded: str) -> bytes:
+        """Return an event body with the payload in every base64 field encoded as given."""
+        event = {
+            'pluginKey': 'key',
+            'url': 'https://example.com/a?b="c"\\d',
+            'employee': 'сотрудник ☃',
+            'statusCode': 200,
+            'responseTime': None,
+            'extra': {'nested': ['}', '"', {'a': 1}]},
+            'html': encoded,
+            'response': encoded,
+            'requestBody': '',
+        }
+        return json.dumps(event, ensure_ascii=False).encode()
+
+    def assert_parsed(self, body: bytes) -> None:
+        """Compare the parser result for every chunk size with json.loads and decode_base64."""
+        expected = json.loads(body)
+        for name in BASE64_FIELDS:
+            expected[name] = decode_base64(expected[name])
+        for size in (1, 2, 3, 5, 7, 64, len(body)):
+            with self.subTest(size=size):
+                parser = StreamingEventParser()
+                for start in range(0, len(body), size):
+                    parser.feed(body[start : start + size])
+                self.assertEqual(parser.close(), expected)
+
+    def test_canonical_base64(self) -> None:
+        """Canonical base64 is decoded group by group across chunk borders."""
+        self.assert_parsed(self.build_body(base64.b64encode(self.payload).decode()))
+
+    def test_escaped_slash(self) -> None:
+        """A JSON escaped slash in base64 falls back to the lenient decoding."""
+        encoded = base64.b64encode(self.payload).decode()
+        self.assertIn('/', encoded)
+        body = self.build_body(encoded).replace(b'/', b'\\/')
+        self.assert_parsed(body)
+        self.assertEqual(parse_log_body(body)['html'], self.payload)
+
+    def test_missing_padding(self) -> None:
+        """Base64 without the trailing padding is accepted."""
+        encoded = base64.b64encode(self.payload[:-1]).decode()
+        self.assertTrue(encoded.endswith('='))
+        self.assert_parsed(self.build_body(encoded.rstrip('=')))
+
+    def test_line_breaks(self) -> None:
+        """MIME style base64 with escaped line breaks is accepted."""
+        self.assert_parsed(self.build_body(base64.encodebytes(self.payload).decode()))
+
+    def test_invalid_bodies(self) -> None:
+        """Truncated bodies, extra data and arrays are refused."""
+        body = self.build_body(base64.b64encode(self.payload).decode())
+        for invalid in (body[:-1], body + b'{}', b'{"url": "a",}'):
+            with self.subTest(body=invalid[-20:]), self.assertRaises(ValueError):
+                parser = StreamingEventParser()
+                parser.feed(invalid)
+                parser.close()
+        with self.assertRaises(NotAnObjectError):
+            StreamingEventParser().feed(b' [{}]')
+
+
+@override_settings(RECEIVER_DEDUP_ENABLED=True, RECEIVER_DEDUP_WINDOW=600)
+class DedupTestCase(ReceiverTestCase):
+    """A replayed event is acknowledged without a second entry within RECEIVER_DEDUP_WINDOW and stored after it."""
+
+    def setUp(self) -> None:
+        """Start with an empty LRU of recent keys."""
+        super().setUp()
+        get_recent_keys.cache_clear()
+        self.addCleanup(get_recent_keys.cache_clear)
+
+    def post(self, events: dict | list[dict]) -> dict:
+        """Send one event or a batch and return the response data."""
+        response = self.client.post(
+            '/receiver', json.dumps(events), content_type='application/json', HTTP_X_CUSTOM_HEADER='header'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def event(self, request_id: str, employee: str = 'e', **fields: str) -> dict:
+        """Return an event of the employee's tab with the request id."""
+        return {'pluginKey': 'key', 'employee': employee, 'tabId': '1', 'requestId': request_id, **fields}
+
+    def test_replay_within_window(self) -> None:
+        """A replay is a duplicate whether it is found in memory or only in LogDedupKey."""
+        self.assertEqual(self.post(self.event('1')), {'status': 'ok'})
+        self.assertEqual(self.post(self.event('1')), {'status': 'ok', 'duplicate': True})
+        # Другой процесс не видит LRU первого, повтор находится по таблице.
+        get_recent_keys.cache_clear()
+        self.assertEqual(self.post(self.event('1')), {'status': 'ok', 'duplicate': True})
+
+        self.assertEqual(LogEntry.objects.count(), 1)
+
+    def test_replay_after_window(self) -> None:
+        """An event repeated after the window is stored again and its key is claimed anew."""
+        self.post(self.event('1'))
+        LogDedupKey.objects.update(created_at=timezone.now() - timedelta(seconds=601))
+        get_recent_keys.cache_clear()
+
+        self.assertEqual(self.post(self.event('1')), {'status': 'ok'})
+        self.assertEqual(LogEntry.objects.count(), 2)
+        self.assertGreater(LogDedupKey.objects.get().created_at, timezone.now() - timedelta(seconds=60))
+
+    def test_recent_keys_window(self) -> None:
+        """The in-memory LRU forgets keys older than the window."""
+        recent = RecentKeys(max_size=10)
+        recent.add(['key'])
+
+        self.assertTrue(recent.contains('key', 600))
+        with mock.patch.object(dedup.time, 'monotonic', return_value=time.monotonic() + 601):
+            self.assertFalse(recent.contains('key', 600))
+
+    def test_batch(self) -> None:
+        """Replays of stored events and within the batch are duplicates; events of others or without ids are not."""
+        self.post(self.event('1'))
+
+        data = self.post(
+            [
+                self.event('1'),
+                self.event('2'),
+                self.event('2'),
+                self.event('2', employee='other'),
+                self.event('', url='https://example.test/'),
+                self.event('', url='https://example.test/'),
+            ]
+        )
+
+        duplicates = [result.get('duplicate', False) for result in data['results']]
+        self.assertEqual(duplicates, [True, False, True, False, False, False])
+        self.assertEqual(LogEntry.objects.count(), 5)
+
+    @override_settings(RECEIVER_DEDUP_ENABLED=False)
+    def test_disabled(self) -> None:
+        """With RECEIVER_DEDUP_ENABLED off every replay is stored."""
+        self.post(self.event('1'))
+        self.post([self.event('1'), self.event('1')])
+
+        self.assertEqual(LogEntry.objects.count(), 3)
+        self.assertFalse(LogDedupKey.objects.exists())
+
+
+@override_settings(RECEIVER_SPOOL_MAX_EVENTS=2, METRICS_MODE='basic')
+class SpoolDepthTestCase(SimpleTestCase):
+    """The spool bound is checked against a cached depth, and the depth is exported on /metrics."""
+
+    def setUp(self) -> None:
+        """Use a temporary spool directory and forget the cached depth."""
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        spool_settings = override_settings(RECEIVER_SPOOL_DIR=spool_dir.name)
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+        depth_patch = mock.patch.object(spool, '_depth', None)
+        depth_patch.start()
+        self.addCleanup(depth_patch.stop)
+
+    def test_full_spool_rejected_without_scanning(self) -> None:
+        """Events spooled by the process count towards the bound until the directory is read again."""
+        spool_log_event(b'{}', '10.0.0.1', 'application/json')
+        with mock.patch.object(spool.os, 'scandir', wraps=spool.os.scandir) as scandir:
+            spool_log_event(b'{}', '10.0.0.1', 'application/json')
+            with self.assertRaises(SpoolFullError):
+                spool_log_event(b'{}', '10.0.0.1', 'application/json')
+        scandir.assert_not_called()
+
+    def test_depth_gauge(self) -> None:
+        """The spool depth is rendered as a gauge."""
+        spool_log_event(b'{}', '10.0.0.1', 'application/json')
+        self.assertIn('logs_collector_spool_depth 1\n', render_metrics())
+
+
+@override_settings(ROLLUP_RECOMPUTE_WINDOW=15)
+class StaleRollupHourTestCase(TestCase):
+    """Entries inserted after the recompute window has passed their hour are counted once the hour is marked."""
+
+    def get_hour_requests(self) -> int:
+        """Refresh the rollups and return the requests counted in hour rollups."""
+        call_command('refresh_log_rollups', stdout=StringIO())
+        hours = LogRollup.objects.filter(period=LogRollup.Period.HOUR)
+        return hours.aggregate(requests=Sum('requests'))['requests'] or 0
+
+    def test_late_entry_counted_after_marking(self) -> None:
+        """A late entry is missed by the recompute window and counted after mark_stale_hours."""
+        received_at = timezone.now() - timedelta(hours=3)
+        LogEntry.objects.create(employee='e', received_at=received_at)
+        LogEntry.objects.create(employee='e', received_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.get_hour_requests(), 2)
+
+        late = LogEntry.objects.create(employee='e', received_at=received_at)
+        self.assertEqual(self.get_hour_requests(), 2)
+
+        mark_stale_hours([late.received_at])
+        self.assertEqual(self.get_hour_requests(), 3)
+        self.assertFalse(LogRollupStaleHour.objects.exists())
+
+    def test_recent_entries_not_marked(self) -> None:
+        """Entries inside the recompute window are left to the regular refresh."""
+        mark_stale_hours([timezone.now()])
+        self.assertFalse(LogRollupStaleHour.objects.exists())
+
+
+@override_settings(CUSTOM_HEADER='header', PLUGIN_KEY='key', RECEIVER_SPOOL_ENABLED=False, METRICS_MODE='full')
+class AsyncMetricsTestCase(TestCase):
+    """Under the async handler chain the metrics middleware sees the SQL views run in worker threads."""
+
+    async def test_queries_counted(self) -> None:
+        """The queries of a sync view called from the async chain are counted for the request."""
+        with mock.patch.object(middleware.DB_QUERIES, 'observe') as observe:
+            response = await self.async_client.post(
+                '/receiver',
+                '{"pluginKey": "key", "employee": "e"}',
+                content_type='application/json',
+                headers={'X-Custom-Header': 'header'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        observe.assert_called_once()
+        self.assertGreater(observe.call_args.args[0], 0)
+        self.assertEqual(observe.call_args.kwargs, {'view': 'receive_log'})
+
+
+@override_settings(
+    CUSTOM_HEADER='header',
+    PLUGIN_KEY='key',
+    RECEIVER_SPOOL_ENABLED=False,
+    PROFILING_ENABLED=True,
+    PROFILING_SAMPLE_RATE=1,
+)
+class ProfilingTestCase(TestCase):
+    """Sampled requests are saved with their SQL, with cProfile statistics only under the sync handler chain."""
+
+    def setUp(self) -> None:
+        """Use a temporary profile directory."""
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        profile_settings = override_settings(PROFILING_DIR=profile_dir.name)
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+
+    def test_sync_request_profiled(self) -> None:
+        """The report of a sync request has cProfile statistics and a .prof file."""
+        response = self.client.post(
+            '/receiver',
+            '{"pluginKey": "key", "employee": "e"}',
+            content_type='application/json',
+            HTTP_X_CUSTOM_HEADER='header',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        [profile] = list_profiles()
+        self.assertTrue(profile['has_pstats'])
+        self.assertIn('== cProfile', get_profile_path(profile['name'], REPORT_SUFFIX).read_text())
+
+    def test_large_params_truncated(self) -> None:
+        """Binary parameters are logged by size and long strings are cut before formatting."""
+        queries = QueryLog()
+        queries(lambda *args: None, 'INSERT INTO t VALUES (%s, %s)', (b'x' * 10**6, 'y' * 10**6), False, {})
+
+        [(_, sql)] = queries.queries
+        self.assertIn('<bytes len=1000000>', sql)
+        self.assertLessEqual(len(sql), MAX_SQL_LENGTH)
+
+    async def test_async_request_saved_without_cprofile(self) -> None:
+        """The report of an async request lists the SQL of the sync view and has no .prof file."""
+        response = await self.async_client.post(
+            '/receiver',
+            '{"pluginKey": "key", "employee": "e"}',
+            content_type='application/json',
+            headers={'X-Custom-Header': 'header'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        [profile] = list_profiles()
+        self.assertFalse(profile['has_pstats'])
+        report = get_profile_path(profile['name'], REPORT_SUFFIX).read_text()
+        self.assertIn('reason=sampled', report)
+        self.assertIn('INSERT INTO "logs_collector_logentry"', report)
+
+
+# DEBUG включает в журнале django.request сообщения о переводе обработчиков между режимами.
+@override_settings(
+    DEBUG=True,
+    ROOT_URLCONF='logs_collector.tests',
+    CUSTOM_HEADER='header',
+    PLUGIN_KEY='key',
+    RECEIVER_SPOOL_ENABLED=False,
+    METRICS_MODE='full',
+    PROFILING_ENABLED=True,
+    PROFILING_SLOW_THRESHOLD=60,
+)
+class AsyncReceiverTestCase(TestCase):
+    """The async receiver runs on the event loop: no middleware in the chain moves the request to a thread."""
+
+    async def test_view_runs_on_event_loop(self) -> None:
+        """areceive_log runs on the event loop thread and no middleware is adapted to the sync mode."""
+        view_threads = []
+
+        def check_request_headers(request: object) -> None:
+            view_threads.append(threading.get_ident())
+
+        with (
+            mock.patch.object(views, '_check_request_headers', side_effect=check_request_headers),
+            self.assertNoLogs('django.request', 'DEBUG'),
+        ):
+            response = await self.async_client.post(
+                '/receiver',
+                '{"pluginKey": "key", "employee": "e"}',
+                content_type='application/json',
+                headers={'X-Custom-Header': 'header'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(view_threads, [threading.get_ident()])
+        self.assertTrue(await LogEntry.objects.filter(employee='e').aexists())
+
+    @override_settings(CUSTOM_HEADER='header', PLUGIN_KEY='key')
+    async def test_empty_event_rejected(self) -> None:
+        """The streaming parser path refuses {} accepted by the header key."""
+        with self.assertLogs('django.request', 'WARNING'):
+            response = await self.async_client.post(
+                '/receiver',
+                '{}',
+                content_type='application/json',
+                headers={'X-Custom-Header': 'header', 'X-Plugin-Key': 'key'},
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await LogEntry.objects.aexists())
+
+
+@override_settings(BASIC_AUTH_CACHE_TIMEOUT=300, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BasicAuthCacheTestCase(TestCase):
+    """Verified basic auth credentials are reused until the password changes, the user is disabled or logs out."""
+
+    def setUp(self) -> None:
+        """Create a staff user and count the password checks."""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user('user', password='password', is_staff=True)
+        patcher = mock.patch.object(middleware, 'authenticate', wraps=middleware.authenticate)
+        self.authenticate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, password: str = 'password', client: Client | None = None) -> int:
+        """Request the log list with basic auth credentials and return the status code."""
+        credentials = base64.b64encode(f'user:{password}'.encode()).decode()
+        return (client or self.client).get('/', HTTP_AUTHORIZATION=f'Basic {credentials}').status_code
+
+    def test_password_checked_once(self) -> None:
+        """Repeated requests, also from a new session, reuse the verified credentials."""
+        self.assertEqual(self.get(), 200)
+        self.assertEqual(self.get(), 200)
+        self.assertEqual(self.get(client=Client()), 200)
+
+        self.assertEqual(self.authenticate.call_count, 1)
+
+    def test_wrong_password_not_cached(self) -> None:
+        """Failed attempts are verified every time."""
+        self.assertEqual(self.get('wrong'), 401)
+        self.assertEqual(self.get('wrong'), 401)
+
+        self.assertEqual(self.authenticate.call_count, 2)
+
+    def test_password_change(self) -> None:
+        """After a password change the old credentials are refused and the new ones are verified."""
+        self.assertEqual(self.get(), 200)
+        self.user.set_password('new password')
+        self.user.save()
+
+        self.assertEqual(self.get(client=Client()), 401)
+        self.assertEqual(self.get('new password', client=Client()), 200)
+        self.assertEqual(self.authenticate.call_count, 3)
+
+    def test_password_change_existing_session(self) -> None:
+        """A session logged in with the old password does not keep access."""
+        self.assertEqual(self.get(), 200)
+        self.user.set_password('new password')
+        self.user.save()
+
+        self.assertNotEqual(self.get(), 200)
+        self.assertEqual(self.get(), 401)
+
+    def test_deactivated_user(self) -> None:
+        """A deactivated user is refused despite the cached credentials."""
+        self.assertEqual(self.get(), 200)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.get(client=Client()), 401)
+
+    def test_logout(self) -> None:
+        """Logging out drops the cached credentials, so the next request verifies the password again."""
+        self.assertEqual(self.get(), 200)
+        credentials = base64.b64encode(b'user:password').decode()
+        self.client.post('/admin/logout/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+        self.assertEqual(self.get(), 200)
+        self.assertEqual(self.authenticate.call_count, 2)
+
+    @override_settings(BASIC_AUTH_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self) -> None:
+        """With BASIC_AUTH_CACHE_TIMEOUT=0 the password is checked on every request."""
+        self.get()
+        self.get()
+
+        self.assertEqual(self.authenticate.call_count, 2)
+
+
+@override_settings(METRICS_MODE='basic')
+class MetricsAuthTestCase(TestCase):
+    """/metrics is never exposed without a credential."""
+
+    @override_settings(METRICS_TOKEN='')
+    def test_basic_auth_without_token(self) -> None:
+        """Without METRICS_TOKEN the endpoint is behind basic auth."""
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+    @override_settings(METRICS_TOKEN='token')
+    def test_bearer_token(self) -> None:
+        """With METRICS_TOKEN the endpoint skips basic auth and requires the token."""
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer token').status_code, 200)
+
+
+@override_settings(KEYSET_PAGINATION_ENABLED=True, PAGINATION_SHOW_COUNT=False)
+class KeysetPaginationTestCase(TestCase):
+    """Keyset pages cover every row exactly once, in order, even when many rows share the sort value."""
+
+    SORTS = (('received_at', 'desc'), ('received_at', 'asc'), ('initiator', 'asc'), ('initiator', 'desc'))
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """Create rows in groups sharing received_at and initiator, longer than a page."""
+        started = timezone.now()
+        LogEntry.objects.bulk_create(
+            LogEntry(
+                employee='e',
+                initiator=f'initiator-{number % 3}',
+                received_at=started - timedelta(minutes=number // 30),
+            )
+            for number in range(PER_PAGE * 3 + 5)
+        )
+
+    def get_page(self, sort: str, order: str, cursor: str = '') -> KeysetPage:
+        """Return the log list page addressed by the cursor."""
+        request = RequestFactory().get('/', {'sort': sort, 'order': order, 'cursor': cursor})
+        return LogFilterForm(request, request.GET).get_page()
+
+    def get_expected_ids(self, sort: str, order: str) -> list[int]:
+        """Return all ids in the order of the log list."""
+        prefix = '-' if order == 'desc' else ''
+        return list(LogEntry.objects.order_by(f'{prefix}{sort}', f'{prefix}id').values_list('id', flat=True))
+
+    def test_next_pages(self) -> None:
+        """Following the next cursors from the first page lists every row once."""
+        for sort, order in self.SORTS:
+            with self.subTest(sort=sort, order=order):
+                ids = []
+                page = self.get_page(sort, order)
+                ids += [entry.id for entry in page]
+                while page.has_next():
+                    page = self.get_page(sort, order, page.next_cursor)
+                    ids += [entry.id for entry in page]
+
+                self.assertEqual(ids, self.get_expected_ids(sort, order))
+
+    def test_previous_pages(self) -> None:
+        """Following the previous cursors from the last page lists every row once."""
+        for sort, order in self.SORTS:
+            with self.subTest(sort=sort, order=order):
+                page = self.get_page(sort, order, encode_cursor(CURSOR_LAST))
+                ids = [entry.id for entry in page]
+                while page.has_previous():
+                    page = self.get_page(sort, order, page.previous_cursor)
+                    ids = [entry.id for entry in page] + ids
+
+                self.assertEqual(ids, self.get_expected_ids(sort, order))
+
+    def test_back_and_forth(self) -> None:
+        """The previous cursor of the second page leads back to the first page."""
+        first = self.get_page('initiator', 'asc')
+        second = self.get_page('initiator', 'asc', first.next_cursor)
+        back = self.get_page('initiator', 'asc', second.previous_cursor)
+
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor(self) -> None:
+        """A damaged cursor or a cursor value of the wrong type gives the first page."""
+        first = list(self.get_page('received_at', 'desc'))
+        for cursor in ('not a cursor', encode_cursor(CURSOR_AFTER, 'not a date', 1)):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(list(self.get_page('received_at', 'desc', cursor)), first)
+
+    def test_iter_items_chunks(self) -> None:
+        """Export chunks split inside groups of equal sort values do not lose or repeat rows."""
+        for sort, order in self.SORTS:
+            with self.subTest(sort=sort, order=order):
+                request = RequestFactory().get('/', {'sort': sort, 'order': order})
+                form = LogFilterForm(request, request.GET)
+
+                ids = [entry.id for entry in form.iter_items(chunk_size=7)]
+
+                self.assertEqual(ids, self.get_expected_ids(sort, order))
+
+
+def filter_logs(**params: str) -> list[LogEntry]:
+    """Filter all log entries with LogFilterForm built from the query parameters."""
+    request = RequestFactory().get('/', params)
+    form = LogFilterForm(request, request.GET)
+    assert form.is_valid(), form.errors
+    return list(form.filter_queryset(LogEntry.objects.order_by('id')))
+
+
+@override_settings(SEARCH_INDEX_ENABLED=False)
+class SearchFallbackTestCase(TestCase):
+    """Without the search index the search box looks only at the text columns of the entry."""
+
+    def test_text_columns_only(self) -> None:
+        """The entry is found by its URL but not by its payload codec or URL hash."""
+        entry = LogEntry.objects.create(url='https://example.test/path', html_codec='zstd', url_hash='abc123')
+
+        self.assertEqual(filter_logs(search='example.test'), [entry])
+        self.assertEqual(filter_logs(search='zstd'), [])
+        self.assertEqual(filter_logs(search='abc123'), [])
+
+
+@override_settings(PAYLOAD_COMPRESSION='zlib')
+class PayloadFilterTestCase(TestCase):
+    """The html and request body filters search the extracted text in the index, payloads are stored compressed."""
+
+    def setUp(self) -> None:
+        """Store an entry with compressed payloads."""
+        self.entry = LogEntry(url='https://example.test/')
+        set_entry_payloads(
+            self.entry, {'html': b'<p>' + b'hello world ' * 50 + b'</p>', 'request_body': b'query=needle' * 30}
+        )
+        self.entry.save()
+        self.other = LogEntry.objects.create(url='https://example.test/other')
+
+    @override_settings(SEARCH_INDEX_ENABLED=True)
+    def test_filters_use_index(self) -> None:
+        """Entries are found by the text of their compressed payloads."""
+        self.assertEqual(self.entry.html_codec, 'zlib')
+        index_log_entries([self.entry, self.other])
+
+        self.assertEqual(filter_logs(html='hello world'), [self.entry])
+        self.assertEqual(filter_logs(request_body='needle'), [self.entry])
+        self.assertEqual(filter_logs(html='missing'), [])
+
+    @override_settings(SEARCH_INDEX_ENABLED=False)
+    def test_filters_require_index(self) -> None:
+        """Without the index the payload filters are not offered and their parameters are ignored."""
+        form = LogFilterForm(RequestFactory().get('/'))
+
+        self.assertNotIn('html', form.fields)
+        self.assertNotIn('request_body', form.fields)
+        self.assertEqual(filter_logs(html='hello world'), [self.entry, self.other])
+
+
+@override_settings(PLUGIN_KEY='key', RECEIVER_SPOOL_MAX_EVENTS=100)
+class SpoolDrainTestCase(TestCase):
+    """Spooled events are inserted by drain_log_spool, unreadable event files are quarantined."""
+
+    def setUp(self) -> None:
+        """Use a temporary spool directory and forget the cached depth."""
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        spool_settings = override_settings(RECEIVER_SPOOL_DIR=spool_dir.name)
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+        depth_patch = mock.patch.object(spool, '_depth', None)
+        depth_patch.start()
+        self.addCleanup(depth_patch.stop)
+
+    def drain(self) -> str:
+        """Drain the spool once and return the command output."""
+        stdout = StringIO()
+        call_command('drain_log_spool', '--once', stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_spooled_events_drained(self) -> None:
+        """A single event and an NDJSON batch are inserted and their files removed."""
+        spool_log_event(b'{"pluginKey": "key", "employee": "a"}', '10.0.0.1', 'application/json')
+        spool_log_event(
+            b'{"pluginKey": "key", "employee": "b"}\n{"pluginKey": "wrong", "employee": "c"}\n',
+            '10.0.0.2',
+            'application/x-ndjson',
+        )
+        spool_log_event(b'{"employee": "d"}', '10.0.0.3', 'application/json', key_verified=True)
+
+        output = self.drain()
+
+        self.assertIn('inserted=3 duplicates=0 rejected=1', output)
+        self.assertEqual(
+            sorted(LogEntry.objects.values_list('employee', 'ip_address')),
+            [('a', '10.0.0.1'), ('b', '10.0.0.2'), ('d', '10.0.0.3')],
+        )
+        self.assertEqual(list(get_spool_dir().glob(f'*{SPOOL_SUFFIX}')), [])
+
+    def test_unreadable_file_quarantined(self) -> None:
+        """A corrupt event file is moved aside and counted as rejected, the rest of the batch is inserted."""
+        corrupt = get_spool_dir().joinpath(f'{time.time_ns()}-corrupt{SPOOL_SUFFIX}')
+        corrupt.write_bytes(b'not json\n{}')
+        spool_log_event(b'{"pluginKey": "key", "employee": "a"}', '10.0.0.1', 'application/json')
+
+        output = self.drain()
+
+        self.assertIn('inserted=1 duplicates=0 rejected=1', output)
+        self.assertFalse(corrupt.exists())
+        self.assertTrue(get_spool_dir().joinpath(QUARANTINE_DIR_NAME, corrupt.name).exists())
+        self.assertEqual(self.drain(), '')
+
+
+@override_settings(BLOB_STORE_ENABLED=True, BLOB_STORE_THRESHOLD=1024, PAYLOAD_COMPRESSION='')
+class PayloadStorageTestCase(TestCase):
+    """Payloads read back unchanged wherever and however they are stored."""
+
+    def setUp(self) -> None:
+        """Use temporary directories for blobs, dictionaries and html snapshot bases."""
+        storage_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(storage_dir.cleanup)
+        storage_settings = override_settings(
+            BLOB_STORE_DIR=os.path.join(storage_dir.name, 'blobs'),
+            PAYLOAD_COMPRESSION_DICT_DIR=os.path.join(storage_dir.name, 'dicts'),
+            HTML_SNAPSHOT_DIR=os.path.join(storage_dir.name, 'snapshots'),
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+
+    def store(self, payloads: dict[str, bytes], url: str = 'https://example.test/') -> LogEntry:
+        """Save an entry with the payloads and load it back from the database."""
+        entry = LogEntry(url=url, employee='e')
+        fill_typed_fields(entry)
+        set_entry_payloads(entry, payloads)
+        entry.save()
+        return LogEntry.objects.get(id=entry.id)
+
+    def assert_payload(self, entry: LogEntry, name: str, data: bytes) -> None:
+        """Check the whole payload, its beginning and the streamed payload."""
+        self.assertEqual(getattr(entry, f'{name}_size'), len(data))
+        self.assertEqual(entry.get_payload(name), data)
+        self.assertEqual(entry.get_payload(name, limit=100), data[:100])
+        with entry.open_payload(name) as f:
+            self.assertEqual(f.read(), data)
+
+    def test_blob_round_trip(self) -> None:
+        """Payloads over the threshold go to the blob store once, smaller ones stay in the table."""
+        large = os.urandom(4096)
+        small = b'small response'
+
+        first = self.store({'response': large, 'request_body': small})
+        second = self.store({'response': large})
+
+        self.assertIsNone(first.response)
+        self.assertTrue(get_blob_path(first.response_hash).is_file())
+        self.assertEqual(second.response_hash, first.response_hash)
+        self.assertEqual((first.request_body_hash, bytes(first.request_body)), ('', small))
+        self.assert_payload(first, 'response', large)
+        self.assert_payload(first, 'request_body', small)
+
+    @override_settings(BLOB_STORE_ENABLED=False)
+    def test_blob_store_disabled(self) -> None:
+        """With the blob store disabled large payloads stay in the table."""
+        large = os.urandom(4096)
+        entry = self.store({'response': large})
+
+        self.assertEqual(entry.response_hash, '')
+        self.assert_payload(entry, 'response', large)
+
+    @override_settings(HTML_SNAPSHOT_DELTA_ENABLED=False, PAYLOAD_COMPRESSION_MIN_SIZE=256)
+    def test_compression_round_trip(self) -> None:
+        """Compressed payloads read back in the table and in the blob store, incompressible ones are kept raw."""
+        text = generate_html(64 * 1024, random.Random(1))
+        for codec in CODECS:
+            with self.subTest(codec=codec), override_settings(PAYLOAD_COMPRESSION=codec):
+                entry = self.store({'html': text, 'response': text[:512], 'request_body': os.urandom(512)})
+
+                self.assertEqual((entry.html_codec, entry.response_codec, entry.request_body_codec), (codec, codec, ''))
+                self.assertLess(get_blob_path(entry.html_hash).stat().st_size, len(text) // 2)
+                self.assertEqual(entry.response_hash, '')
+                for name, data in (('html', text), ('response', text[:512])):
+                    self.assert_payload(entry, name, data)
+
+    @override_settings(HTML_SNAPSHOT_DELTA_ENABLED=False, PAYLOAD_COMPRESSION_MIN_SIZE=0)
+    def test_html_dictionary(self) -> None:
+        """Html compressed with the shared dictionary is read back with it."""
+        rng = random.Random(2)
+        dict_id = save_dict(generate_html(16 * 1024, rng))
+        html = generate_html(2048, rng)
+        for codec in CODECS:
+            with (
+                self.subTest(codec=codec),
+                override_settings(PAYLOAD_COMPRESSION=codec, PAYLOAD_COMPRESSION_HTML_DICT=dict_id),
+            ):
+                entry = self.store({'html': html})
+
+                self.assertEqual(entry.html_codec, f'{codec}{DICT_SEPARATOR}{dict_id}')
+                self.assert_payload(entry, 'html', html)
+
+    @override_settings(
+        PAYLOAD_COMPRESSION='zstd',
+        PAYLOAD_COMPRESSION_HTML_DICT='',
+        HTML_SNAPSHOT_DELTA_ENABLED=True,
+        HTML_SNAPSHOT_MIN_SIZE=4096,
+        HTML_SNAPSHOT_REBASE_RATIO=0.1,
+    )
+    def test_html_snapshot_delta(self) -> None:
+        """Reloads of a page are stored as small deltas against its base and read back after the cache is cleared."""
+        rng = random.Random(3)
+        html = generate_html(64 * 1024, rng)
+        reloaded = mutate_html(html, rng, 3)
+        changed = generate_html(64 * 1024, rng)
+
+        first = self.store({'html': html})
+        second = self.store({'html': reloaded})
+        third = self.store({'html': changed})
+
+        self.assertTrue(is_snapshot_codec(first.html_codec))
+        self.assertEqual(second.html_codec, first.html_codec)
+        self.assertEqual(second.html_hash, '')
+        self.assertLess(len(second.html), len(reloaded) * 0.1)
+        # Страница изменилась целиком - она становится новым базовым снимком.
+        self.assertNotEqual(third.html_codec, first.html_codec)
+        self.assertEqual(HtmlSnapshotBase.objects.count(), 2)
+
+        load_snapshot_base.cache_clear()
+        for entry, data in ((first, html), (second, reloaded), (third, changed)):
+            self.assert_payload(entry, 'html', data)
+
+
+@override_settings(BLOB_STORE_THRESHOLD=10, PAYLOAD_COMPRESSION='', BLOB_STORE_GC_GRACE=3600)
+class BlobGarbageCollectionTestCase(TestCase):
+    """manage_log_partitions deletes blobs no entry refers to once they are older than the grace period."""
+
+    def setUp(self) -> None:
+        """Use a temporary blob store."""
+        blob_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(blob_dir.cleanup)
+        blob_settings = override_settings(BLOB_STORE_DIR=blob_dir.name)
+        blob_settings.enable()
+        self.addCleanup(blob_settings.disable)
+
+    def put_old_blob(self, data: bytes) -> str:
+        """Store a blob last modified two hours ago."""
+        digest = put_blob(data)
+        old = time.time() - 2 * 3600
+        os.utime(get_blob_path(digest), (old, old))
+        return digest
+
+    def test_unreferenced_blobs_deleted(self) -> None:
+        """Only old blobs without LogEntry or FailedLogEntry references are deleted."""
+        entry = LogEntry(url='https://example.test/')
+        entry.set_payload('html', b'<p>referenced html</p>')
+        entry.save()
+        os.utime(get_blob_path(entry.html_hash), (0, 0))
+        failed = FailedLogEntry.objects.create(raw_data_hash=self.put_old_blob(b'failed body'), error_message='e')
+        orphan = self.put_old_blob(b'orphan payload')
+        recent = put_blob(b'recent payload')
+
+        stdout = StringIO()
+        call_command('manage_log_partitions', stdout=stdout)
+
+        self.assertIn('blob store: deleted 1 unreferenced blobs', stdout.getvalue())
+        self.assertFalse(get_blob_path(orphan).exists())
+        for digest in (entry.html_hash, failed.raw_data_hash, recent):
+            self.assertTrue(get_blob_path(digest).exists())
+
+    def test_reused_blob_refreshed(self) -> None:
+        """Storing the same data again renews an old blob, so a pending entry does not lose it."""
+        digest = self.put_old_blob(b'reused payload')
+        put_blob(b'reused payload')
+
+        call_command('manage_log_partitions', stdout=StringIO())
+
+        self.assertTrue(get_blob_path(digest).exists())
+
+
+class BytesLruCacheTestCase(SimpleTestCase):
+    """The snapshot base cache is bounded by the total size of the cached values."""
+
+    def test_evicts_least_recently_used(self) -> None:
+        """Values are evicted in LRU order once their total size exceeds the bound; oversized values are not kept."""
+        calls = []
+
+        @bytes_lru_cache(10)
+        def load(key: str) -> bytes:
+            calls.append(key)
+            return key.encode() * 4
+
+        for key in ('a', 'b', 'a', 'c', 'a', 'b', 'large', 'large'):
+            load(key)
+
+        self.assertEqual(calls, ['a', 'b', 'c', 'b', 'large', 'large'])
+
+
+class QueryPlanTestCase(TestCase):
+    """The log list queries are served by indexes: no full scan of LogEntry and no sort for index-ordered shapes."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """Fill the table with enough varied rows for the optimizer to prefer the indexes."""
+        started = timezone.now()
+        entries = []
+        for number in range(2000):
+            entry = LogEntry(
+                url=f'https://example.com/{number % 100}',
+                initiator=f'initiator-{number % 20}',
+                status_code=str(200 + number % 4 * 100),
+                employee=f'employee-{number % 50}',
+                received_at=started - timedelta(minutes=number),
+            )
+            fill_typed_fields(entry)
+            entries.append(entry)
+        LogEntry.objects.bulk_create(entries)
+        register_employees(entries)
+        connection = connections[LogEntry.objects.db]
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE TABLE {LogEntry._meta.db_table}' if connection.vendor == 'mysql' else 'ANALYZE')
+
+    def test_scenarios(self) -> None:
+        """Every filter and sort shape of the log list has a plan without regressions."""
+        vendor = connections[LogEntry.objects.db].vendor
+        for name, params, ordered in SCENARIOS:
+            with self.subTest(name):
+                params = {key: 'employee-1' if value == 'employee' else value for key, value in params.items()}
+                request = RequestFactory().get('/', params)
+                form = LogFilterForm(request, request.GET or None)
+                self.assertTrue(not params or form.is_valid(), form.errors)
+
+                plan = explain(form.get_items()[: PER_PAGE + 1])
+                self.assertEqual(find_plan_problems(plan, vendor, ordered), [], plan)
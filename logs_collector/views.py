@@ -1,20 +1,79 @@
 """Представления приложения logs_collector."""
 
 import csv
-import json
+import math
+import re
+import time
+from collections.abc import AsyncIterator, Iterator
 from typing import Any
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.http.request import HttpRequest
 from django.http.response import FileResponse, Http404
 from django.shortcuts import get_object_or_404, render
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.text import compress_sequence
 from django.views.decorators.csrf import csrf_exempt
 
-from logs_collector.forms import FailedLogEntryForm, LogFilterForm
+from logs_collector import archive
+from logs_collector.forms import FailedLogEntryForm, LogFilterForm, StatsForm
+from logs_collector.metrics import (
+    BODY_BYTES,
+    CONTENT_TYPE,
+    STAGE_SECONDS,
+    is_enabled,
+    observe_stage,
+    render_metrics,
+    timed_iterator,
+)
 from logs_collector.models import FailedLogEntry, LogEntry
-from logs_collector.services import get_failed_log_file_path, save_failed_log_entry, save_log_entry
+from logs_collector.profiling import PSTATS_SUFFIX, REPORT_SUFFIX, get_profile_path, list_profiles
+from logs_collector.ratelimit import get_receiver_rate_limiter
+from logs_collector.services import (
+    NDJSON_CONTENT_TYPES,
+    check_log_event,
+    get_failed_log_file_path,
+    iter_json_array_items,
+    iter_ndjson_items,
+    save_failed_log_entry,
+    save_log_batch,
+    save_log_entry,
+)
+from logs_collector.spool import SpoolFullError, spool_log_event
+from logs_collector.streaming import NotAnObjectError, StreamingEventParser, parse_log_body
+
+
+EXPORT_CSV_HEADER = (
+    'employee',
+    'received_at',
+    'time',
+    'url',
+    'method',
+    'type',
+    'initiator',
+    'tab_id',
+    'request_id',
+    'request_body',
+    'response',
+    'status_code',
+    'source',
+    'html',
+    'response_time',
+    'ip_address',
+)
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+PAYLOAD_CONTENT_TYPES = {
+    'request_body': 'text/plain; charset=utf-8',
+    'response': 'text/plain; charset=utf-8',
+    'html': 'text/html; charset=utf-8',
+}
 
 
 @csrf_exempt
@@ -23,105 +82,370 @@ def receive_log(request: HttpRequest, *args: Any, **kwargs: Any) -> JsonResponse
     if request.method != 'POST':
         raise Http404
 
+    if (rejection := _check_request_headers(request)) is not None:
+        return rejection
+
+    with observe_stage('body_read'):
+        body = request.body
+    return _process_log_body(request, body)
+
+
+@csrf_exempt
+async def areceive_log(request: HttpRequest, *args: Any, **kwargs: Any) -> JsonResponse:
+    """
+    Receive log data under ASGI, parsing the body incrementally.
+
+    The body is read in chunks and base64 fields are decoded on the fly, so a large event is never
+    held as raw bytes, text and parsed JSON at the same time. Batches and the spool mode need the
+    whole body and are handed over to the regular processing.
+    """
+    if request.method != 'POST':
+        raise Http404
+
+    if (rejection := _check_request_headers(request)) is not None:
+        return rejection
+
+    if int(request.META.get('CONTENT_LENGTH') or 0) > settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+        return JsonResponse({'status': 'error', 'message': 'Request body too large'}, status=413)
+
+    # Под WSGI тело нельзя перечитать при ошибке, поэтому потоковый разбор только для ASGI.
+    if (
+        not _is_rereadable(request)
+        or request.content_type in NDJSON_CONTENT_TYPES
+        or settings.RECEIVER_SPOOL_ENABLED
+    ):
+        with observe_stage('body_read'):
+            body = request.read()
+        return await sync_to_async(_process_log_body)(request, body)
+
+    ip = _get_client_ip(request)
+    parser = StreamingEventParser()
+    chunk = b''
+    # Чтение и разбор чередуются по фрагментам; base64 декодируется при разборе и входит в json_parse.
+    read_time = parse_time = 0.0
+    size = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            chunk = request.read(settings.RECEIVER_STREAM_CHUNK_SIZE)
+            read_at = time.perf_counter()
+            read_time += read_at - started
+            if not chunk:
+                break
+            size += len(chunk)
+            parser.feed(chunk)
+            parse_time += time.perf_counter() - read_at
+        data = parser.close()
+    except NotAnObjectError:
+        # Пакет событий: разбор в начале тела, прочитан только первый фрагмент.
+        return await sync_to_async(_process_log_body)(request, chunk + request.read())
+    except Exception as e:
+        await sync_to_async(save_failed_log_entry)(_reread_body(request), e, ip)
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    STAGE_SECONDS.observe(read_time, stage='body_read')
+    STAGE_SECONDS.observe(parse_time, stage='json_parse')
+    BODY_BYTES.observe(size)
+
+    if not _has_plugin_key_header(request) and (rejection := _check_plugin_key(data)) is not None:
+        return rejection
+
+    try:
+        check_log_event(data)
+        stored = await sync_to_async(save_log_entry)({**data, 'ip': ip})
+    except Exception as e:
+        await sync_to_async(save_failed_log_entry)(_reread_body(request), e, ip)
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return _stored_response(stored)
+
+
+def _get_client_ip(request: HttpRequest) -> str:
+    """Return the client address: X-Real-IP set by the reverse proxy if USE_X_REAL_IP is enabled, else REMOTE_ADDR."""
+    if settings.USE_X_REAL_IP and (real_ip := request.META.get('HTTP_X_REAL_IP', '').strip()):
+        return real_ip
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _check_request_headers(request: HttpRequest) -> JsonResponse | None:
+    """
+    Reject a request by its headers and the client rate limit before the body is read.
+
+    The plugin key may be sent in the X-Plugin-Key header; then it is checked here and the pluginKey
+    field of the body is not required.
+    """
+    limiter = get_receiver_rate_limiter()
+    if limiter is not None and (wait := limiter.consume(_get_client_ip(request))):
+        response = JsonResponse({'status': 'error', 'message': 'Too many requests'}, status=429)
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
+
     custom_header = request.META.get('HTTP_X_CUSTOM_HEADER')
     if custom_header != settings.CUSTOM_HEADER:
         return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
 
-    data = {'ip': request.META.get('REMOTE_ADDR', '')}
+    plugin_key = request.META.get('HTTP_X_PLUGIN_KEY')
+    if plugin_key is None:
+        if settings.RECEIVER_PLUGIN_KEY_HEADER_REQUIRED:
+            return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    elif settings.PLUGIN_KEY is None or not constant_time_compare(plugin_key, settings.PLUGIN_KEY):
+        return JsonResponse({'status': 'error', 'message': 'Invalid key'}, status=403)
+    return None
+
+
+def _has_plugin_key_header(request: HttpRequest) -> bool:
+    """Check that the plugin key came in the header (it has been validated by _check_request_headers)."""
+    return 'HTTP_X_PLUGIN_KEY' in request.META
+
+
+def _check_plugin_key(data: dict) -> JsonResponse | None:
+    """Check the pluginKey field of the event body."""
+    # Проверяем наличи ключа в запросе.
+    plugin_key = data.get('pluginKey')
+    if plugin_key is None:
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    if plugin_key != settings.PLUGIN_KEY:
+        return JsonResponse({'status': 'error', 'message': 'Invalid key'}, status=403)
+    return None
+
+
+def _stored_response(stored: bool) -> JsonResponse:
+    """Acknowledge a single event; a replay of an already stored event is marked as a duplicate."""
+    if not stored:
+        return JsonResponse({'status': 'ok', 'duplicate': True})
+    return JsonResponse({'status': 'ok'})
+
+
+def _is_rereadable(request: HttpRequest) -> bool:
+    """Check that the body is backed by the ASGI spooled file and can be read again."""
+    return isinstance(request, ASGIRequest) and request._stream.seekable()
+
+
+def _reread_body(request: ASGIRequest) -> bytes:
+    """Read the whole body again from the ASGI spooled body file, used only on the failure path."""
+    request._stream.seek(0)
+    return request._stream.read()
+
+
+def _process_log_body(request: HttpRequest, body: bytes) -> JsonResponse:
+    """Parse the body with one event or a batch of events and store it."""
+    data = {'ip': _get_client_ip(request)}
+    key_verified = _has_plugin_key_header(request)
+    BODY_BYTES.observe(len(body))
+    if request.content_type in NDJSON_CONTENT_TYPES:
+        if settings.RECEIVER_SPOOL_ENABLED:
+            return _spool_response(body, data['ip'], request.content_type, key_verified)
+        return _batch_response(save_log_batch(iter_ndjson_items(body), data['ip'], key_verified))
+
     try:
-        if request.body:
-            data.update(json.loads(request.body.decode()))
+        if body:
+            with observe_stage('json_parse'):
+                payload = parse_log_body(body)
+            # Пакетный режим: массив событий в одном запросе.
+            if isinstance(payload, list):
+                if settings.RECEIVER_SPOOL_ENABLED:
+                    return _spool_response(body, data['ip'], request.content_type, key_verified)
+                return _batch_response(save_log_batch(iter_json_array_items(payload), data['ip'], key_verified))
+            data.update(payload)
 
-        # Проверяем наличи ключа в запросе.
-        plugin_key = data.get('pluginKey')
-        if plugin_key is None:
-            return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
-        if plugin_key != settings.PLUGIN_KEY:
-            return JsonResponse({'status': 'error', 'message': 'Invalid key'}, status=403)
+        if not key_verified and (rejection := _check_plugin_key(data)) is not None:
+            return rejection
+        # С ключом в заголовке пустое тело или {} проходят проверку ключа, но записи из них не строятся.
+        check_log_event(data)
+
+        if settings.RECEIVER_SPOOL_ENABLED:
+            return _spool_response(body, data['ip'], request.content_type, key_verified)
 
-        save_log_entry(data)
-        return JsonResponse({'status': 'ok'})
+        return _stored_response(save_log_entry(data))
 
     except Exception as e:
-        save_failed_log_entry(request, e, data['ip'])
+        save_failed_log_entry(body, e, data['ip'])
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
 
+def _spool_response(body: bytes, ip: str, content_type: str, key_verified: bool = False) -> JsonResponse:
+    """Put the raw request body on the write-behind spool and acknowledge it immediately."""
+    try:
+        spool_log_event(body, ip, content_type, key_verified)
+    except SpoolFullError as e:
+        # Очередь переполнена - просим клиента повторить позже.
+        response = JsonResponse({'status': 'error', 'message': str(e)}, status=503)
+        response['Retry-After'] = str(settings.RECEIVER_SPOOL_RETRY_AFTER)
+        return response
+    return JsonResponse({'status': 'queued'}, status=202)
+
+
+def _batch_response(results: list[dict]) -> JsonResponse:
+    """Build a response with per-item statuses for a batch of log events."""
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    if not failed:
+        status = 'ok'
+    elif failed == len(results):
+        status = 'error'
+    else:
+        status = 'partial'
+    return JsonResponse({'status': status, 'accepted': len(results) - failed, 'failed': failed, 'results': results})
+
+
 @login_required
 def log_list(request: HttpRequest) -> HttpResponse:
     """View to list logs with filtering and sorting."""
     form = LogFilterForm(request, request.GET or None)
+    with observe_stage('list_query'):
+        page_obj = form.get_page()
 
-    return render(
-        request,
-        'log_list.html',
-        {
-            'form': form,
-            'page_obj': form.get_page(),
-        },
-    )
+    with observe_stage('template_render'):
+        return render(
+            request,
+            'log_list.html',
+            {
+                'form': form,
+                'page_obj': page_obj,
+            },
+        )
+
+
+def _payload_response(pk: int, name: str) -> FileResponse:
+    """Stream one payload of a log entry, loading only the columns needed to read it."""
+    columns = (name, f'{name}_hash', f'{name}_codec', f'{name}_size')
+    log = get_object_or_404(LogEntry.objects.only('id', *columns), pk=pk)
+    response = FileResponse(log.open_payload(name), content_type=PAYLOAD_CONTENT_TYPES[name])
+    # Длину потока распаковки FileResponse не знает, а несжатый размер сохранён при приёме лога.
+    if getattr(log, f'{name}_codec'):
+        response['Content-Length'] = str(getattr(log, f'{name}_size'))
+    return response
 
 
 @login_required
-def view_log_html(request: HttpRequest, pk: int) -> HttpResponse:
+def view_log_html(request: HttpRequest, pk: int) -> FileResponse:
     """View to view log html."""
-    log = get_object_or_404(LogEntry, pk=pk)
-    html_content = log.html.decode('utf-8', errors='replace')
-    return HttpResponse(html_content)
+    return _payload_response(pk, 'html')
 
 
 @login_required
-def export_logs_csv(request: HttpRequest) -> HttpResponse:
-    """Export logs to CSV file."""
+def view_log_payload(request: HttpRequest, pk: int, name: str) -> FileResponse:
+    """View to view the request body or the response of a log entry as plain text."""
+    return _payload_response(pk, name)
+
+
+class _Echo:
+    """Pseudo-buffer for csv.writer that returns written rows instead of storing them."""
+
+    def write(self, value: str) -> str:
+        """Return the value to the caller."""
+        return value
+
+
+def _iter_csv_chunks(logs: Iterator[LogEntry]) -> Iterator[bytes]:
+    """Render log entries as CSV, yielding encoded chunks of EXPORT_CHUNK_SIZE rows."""
     excel_cell_max_length = 32760
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_CSV_HEADER).encode()
+
+    rows = []
+    for log in logs:
+        html = log.get_payload('html', excel_cell_max_length + 1)
+        rows.append(
+            writer.writerow([
+                log.employee,
+                log.received_at,
+                log.time,
+                log.url,
+                log.method,
+                log.type,
+                log.initiator,
+                log.tab_id,
+                log.request_id,
+                log.get_payload('request_body'),
+                log.get_payload('response'),
+                log.status_code,
+                log.source,
+                f'{html[:excel_cell_max_length]}...' if len(html) > excel_cell_max_length else html,
+                log.response_time,
+                log.ip_address,
+            ])
+        )
+        if len(rows) >= settings.EXPORT_CHUNK_SIZE:
+            yield ''.join(rows).encode()
+            rows = []
+
+    if rows:
+        yield ''.join(rows).encode()
+
+
+async def _aiter_sync(iterator: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Consume a synchronous iterator in the sync thread one item at a time."""
+    sentinel = object()
+    while (item := await sync_to_async(next)(iterator, sentinel)) is not sentinel:
+        yield item
+
+
+@login_required
+def export_logs_csv(request: HttpRequest) -> StreamingHttpResponse:
+    """Export logs to CSV file, streaming rows as they are read from the database."""
     form = LogFilterForm(request, request.GET or None)
-    logs = form.get_items()
-    response = HttpResponse(content_type='text/csv')
+    payload_columns = [f'{name}_{suffix}' for name in LogEntry.PAYLOAD_FIELDS for suffix in ('hash', 'codec')]
+    fields = [*EXPORT_CSV_HEADER, *payload_columns]
+    content = timed_iterator(_iter_csv_chunks(form.iter_items(settings.EXPORT_CHUNK_SIZE, fields)), 'csv_export')
+
+    use_gzip = bool(ACCEPTS_GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    if use_gzip:
+        content = compress_sequence(content)
+    # Под ASGI синхронный итератор был бы собран целиком в список, поэтому отдаём асинхронный.
+    if isinstance(request, ASGIRequest):
+        content = _aiter_sync(content)
+
+    response = StreamingHttpResponse(content, content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="logs.csv"'
+    if use_gzip:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
 
-    writer = csv.writer(response)
-    writer.writerow([
-        'employee',
-        'received_at',
-        'time',
-        'url',
-        'method',
-        'type',
-        'initiator',
-        'tab_id',
-        'request_id',
-        'request_body',
-        'response',
-        'status_code',
-        'source',
-        'html',
-        'response_time',
-        'ip_address',
-    ])
 
-    for log in logs:
-        writer.writerow([
-            log.employee,
-            log.received_at,
-            log.time,
-            log.url,
-            log.method,
-            log.type,
-            log.initiator,
-            log.tab_id,
-            log.request_id,
-            log.request_body,
-            log.response,
-            log.status_code,
-            log.source,
-            f'{log.html[:excel_cell_max_length]}...' if len(log.html) > excel_cell_max_length else log.html,
-            log.response_time,
-            log.ip_address,
-        ])
+@login_required
+def export_logs_archive(request: HttpRequest) -> StreamingHttpResponse:
+    """
+    Export filtered logs to a compressed Parquet or Arrow IPC file, streaming one row group per chunk.
+
+    Use ?format=arrow for Arrow IPC and ?payloads=0 to leave out the html, response and request_body columns.
+    """
+    if archive.pyarrow is None:
+        raise Http404('pyarrow is not installed')
+    archive_format = request.GET.get('format', archive.FORMAT_PARQUET)
+    if archive_format not in archive.FORMATS:
+        raise Http404(f'Unknown archive format: {archive_format}')
+    payloads = request.GET.get('payloads') != '0'
 
+    form = LogFilterForm(request, request.GET or None)
+    entries = form.iter_items(settings.EXPORT_CHUNK_SIZE, archive.get_entry_columns(payloads))
+    content = timed_iterator(
+        archive.iter_archive(entries, archive_format, payloads, settings.EXPORT_CHUNK_SIZE), 'archive_export'
+    )
+    if isinstance(request, ASGIRequest):
+        content = _aiter_sync(content)
+
+    response = StreamingHttpResponse(content, content_type=archive.CONTENT_TYPES[archive_format])
+    filename = f'logs{archive.FILE_EXTENSIONS[archive_format]}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
+@login_required
+def log_stats(request: HttpRequest) -> HttpResponse:
+    """View to show statistics from pre-aggregated rollups."""
+    form = StatsForm(request.GET or None)
+    return render(request, 'log_stats.html', {'form': form, 'stats': form.get_stats()})
+
+
+@login_required
+def log_stats_api(request: HttpRequest) -> JsonResponse:
+    """Return statistics from pre-aggregated rollups as JSON."""
+    form = StatsForm(request.GET or None)
+    if form.is_bound and not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+    return JsonResponse({'status': 'ok', **form.get_stats()})
+
+
 @login_required()
 def failed_log_list(request: HttpRequest) -> HttpResponse:
     """View to list failed logs."""
@@ -138,9 +462,60 @@ def failed_log_list(request: HttpRequest) -> HttpResponse:
 
 @login_required
 def download_unparsed_log(request: HttpRequest, failed_log_id: int) -> FileResponse:
-    """Download unparsed log file."""
-    failed_log = get_object_or_404(FailedLogEntry, pk=failed_log_id)
+    """Download the raw body of a failed log, streaming it from the blob store."""
+    failed_log = get_object_or_404(FailedLogEntry.objects.defer('raw_data'), pk=failed_log_id)
+    filename = f'log_{failed_log.id}.txt'
+    if failed_log.raw_data_hash:
+        response = FileResponse(
+            failed_log.open_raw_data(), as_attachment=True, filename=filename, content_type='text/plain'
+        )
+        if failed_log.raw_data_codec:
+            response['Content-Length'] = str(failed_log.raw_data_size)
+        return response
+
+    # Записи, сохранённые до перехода на внешнее хранилище, хранят тело в отдельном файле.
     file_path = get_failed_log_file_path(failed_log.id)
     if not file_path.exists():
         raise Http404('Файл не найден')
-    return FileResponse(file_path.open('rb'), as_attachment=True, filename=file_path.name, content_type='text/plain')
+    return FileResponse(file_path.open('rb'), as_attachment=True, filename=filename, content_type='text/plain')
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Expose metrics in the Prometheus text format.
+
+    If METRICS_TOKEN is set, the endpoint is not behind basic auth and requires the
+    `Authorization: Bearer <token>` header instead.
+    """
+    if not is_enabled():
+        raise Http404
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        return HttpResponse('Forbidden', status=403)
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
+
+
+@staff_member_required
+def profile_list(request: HttpRequest) -> HttpResponse:
+    """List the request profiles captured by ProfilingMiddleware."""
+    return render(
+        request,
+        'admin/profile_list.html',
+        {
+            **admin.site.each_context(request),
+            'title': 'Request profiles',
+            'profiles': list_profiles(),
+            'enabled': settings.PROFILING_ENABLED,
+        },
+    )
+
+
+@staff_member_required
+def download_profile(request: HttpRequest, name: str, pstats: bool = False) -> FileResponse:
+    """Download a profile report or its cProfile stats file."""
+    suffix = PSTATS_SUFFIX if pstats else REPORT_SUFFIX
+    path = get_profile_path(name, suffix)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=f'{name}{suffix}', content_type='text/plain')